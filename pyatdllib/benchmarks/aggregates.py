@@ -0,0 +1,60 @@
+"""Benchmarks the per-Container Aggregates behind 'lsprj --json' and 'complete'.
+
+We count each Prj's shown Actions, as 'lsprj --json' does, both one Action at a
+time with ViewFilter.ShowAction and with ViewFilter.CountShownActions, which
+reads the Prj's Aggregates. We time the latter after a small mutation, which
+makes us recount only the Containers above the mutated Action.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import time
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import uid
+from ..core import view_filter
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+  projects = [p for p, unused_path in todolist.Projects()]
+
+  def ActionToProject(an_action):
+    return todolist.ActionByUID(an_action.uid)[1]
+
+  def ActionToContext(an_action):
+    return None if an_action.ctx_uid is None else todolist.ContextByUID(an_action.ctx_uid)
+
+  start = time.time()
+  todolist.root.Aggregates()
+  first_seconds = time.time() - start
+  print(f'{FLAGS.num_actions} actions; first Aggregates of the root Folder: {first_seconds:.3f}s')
+  a = projects[-1].items[0]
+  for cls in view_filter._VIEW_FILTER_CLASSES:  # pylint: disable=protected-access
+    vf = cls(ActionToProject, ActionToContext)
+
+    def OneAtATime():
+      return [sum(1 for an_action in p.items if vf.ShowAction(an_action)) for p in projects]
+
+    def FromAggregates():
+      a.is_complete = not a.is_complete
+      a.is_complete = not a.is_complete
+      return [vf.CountShownActions(p) for p in projects]
+
+    slow_seconds, slow_result = common.BestTime(OneAtATime)
+    fast_seconds, fast_result = common.BestTime(FromAggregates)
+    assert slow_result == fast_result, cls
+    print(f'{cls.ViewFilterUINames()[0]:24} ShowAction: {slow_seconds:.3f}s  '
+          f'CountShownActions: {fast_seconds:.4f}s ({slow_seconds / fast_seconds:.0f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
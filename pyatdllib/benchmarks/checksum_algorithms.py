@@ -0,0 +1,42 @@
+"""Benchmarks serialization.Checksum for each pyatdl.ChecksumAlgorithm across payload sizes.
+
+Saving, loading, and every call to the mergeprotobufs API checksum the whole
+serialized to-do list, which can be as large as the protobuf library allows
+(64MiB). The fastest algorithm depends on the CPU: OpenSSL's SHA1 uses the SHA
+extensions of recent x86 and ARM CPUs; BLAKE2b has no such help. Run this to choose
+FLAGS.pyatdl_checksum_algorithm.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import pyatdl_pb2
+from ..ui import serialization
+from . import common
+
+FLAGS = flags.FLAGS
+
+_SIZES = [1 << 10, 64 << 10, 1 << 20, 10 << 20, 60 << 20]
+
+
+def main(_):
+  algorithms = [pyatdl_pb2.SHA1, pyatdl_pb2.BLAKE2B_160, pyatdl_pb2.BLAKE2B_256]
+  print('bytes     ' + ''.join(f'{pyatdl_pb2.ChecksumAlgorithm.Name(a):>14s}' for a in algorithms) + '  (MB/s)')
+  for size in _SIZES:
+    payload = os.urandom(size)
+    repetitions = max(FLAGS.repetitions, (1 << 20) // size)
+    row = []
+    for algorithm in algorithms:
+      seconds, unused_cksum = common.BestTime(lambda: serialization.Checksum(payload, algorithm), repetitions)
+      row.append(size / seconds / 1e6)
+    print(f'{size:<10d}' + ''.join(f'{mbps:14.0f}' for mbps in row))
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,76 @@
+"""Routines common to all benchmarks in this directory.
+
+Run a benchmark from the parent directory of pyatdllib like so:
+
+  PYTHONPATH=. python -m pyatdllib.benchmarks.deserialization --num_actions=50000
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import time
+
+from typing import Callable, Tuple
+
+from absl import flags  # type: ignore
+
+from ..core import action
+from ..core import folder
+from ..core import prj
+from ..core import tdl
+from ..core import uid
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('num_actions', 50000, 'How many Actions the benchmark ToDoList has')
+flags.DEFINE_integer('repetitions', 3, 'We report the best of this many timings')
+
+
+def BigToDoList(num_actions: int,
+                *,
+                actions_per_project: int = 50,
+                projects_per_folder: int = 10,
+                num_contexts: int = 20) -> tdl.ToDoList:
+  """Returns a ToDoList shaped like a heavy user's: Folders of Prjs of Actions, most Actions in a Ctx.
+
+  Call uid.ResetNotesOfExistingUIDs() first.
+  """
+  todolist = tdl.ToDoList()
+  ctx_uids = [todolist.AddContext('@context%d' % i) for i in range(num_contexts)]
+  current_folder = None
+  current_project = None
+  for i in range(num_actions):
+    if i % (actions_per_project * projects_per_folder) == 0:
+      current_folder = folder.Folder(name='Folder %d' % i, note='A note about folder %d' % i)
+      todolist.AddProjectOrFolder(current_folder)
+    if i % actions_per_project == 0:
+      assert current_folder is not None
+      current_project = prj.Prj(name='Project %d' % i, default_context_uid=ctx_uids[i % num_contexts])
+      current_folder.items.append(current_project)
+    assert current_project is not None
+    a = action.Action(
+      name='Action %d: buy more milk and orange juice' % i,
+      note='' if i % 10 else 'A note about action %d' % i,
+      ctx_uid=ctx_uids[i % num_contexts] if i % 4 else None)
+    if i % 3 == 0:
+      a.is_complete = True
+    current_project.items.append(a)
+  return todolist
+
+
+def BigSerializedToDoList(num_actions: int) -> bytes:
+  """Returns the serialization of BigToDoList(num_actions)."""
+  uid.ResetNotesOfExistingUIDs()
+  return BigToDoList(num_actions).AsProto().SerializeToString()
+
+
+def BestTime(func: Callable[[], object], repetitions: int = None) -> Tuple[float, object]:
+  """Returns (the fastest of several wall-clock timings in seconds, the last return value of func)."""
+  best = float('inf')
+  result = None
+  for _ in range(FLAGS.repetitions if repetitions is None else repetitions):
+    start = time.perf_counter()
+    result = func()
+    best = min(best, time.perf_counter() - start)
+  return best, result
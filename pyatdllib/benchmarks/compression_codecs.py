@@ -0,0 +1,58 @@
+"""Benchmarks each pyatdl.CompressionCodec at several levels, for a small to-do list and a big one.
+
+Every save compresses the whole serialized to-do list and every load
+decompresses it. Most to-do lists are small, and for them a preset dictionary
+(see ui/train_zlib_dictionary.py) beats any level; for big ones the time spent
+at high levels buys little. Run this to revisit
+serialization._AUTO_COMPRESSION_LEVELS and FLAGS.pyatdl_compression_codec.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import action
+from ..core import pyatdl_pb2
+from ..core import tdl
+from ..ui import serialization
+from . import common
+
+FLAGS = flags.FLAGS
+
+_CODECS = [pyatdl_pb2.ZLIB, pyatdl_pb2.ZLIB_WITH_DICTIONARY_1, pyatdl_pb2.LZMA]
+_LEVELS = [1, 2, 6, 9]
+
+
+def _SmallSerializedToDoList():
+  lst = tdl.ToDoList()
+  lst.AddContext('@home')
+  lst.AddContext('@computer')
+  for i in range(10):
+    lst.inbox.items.append(action.Action(name=f'Action {i}'))
+  return lst.AsProto().SerializeToString()
+
+
+def _Report(title, payload):
+  print(f'{title}: {len(payload)} bytes uncompressed (automatic level: {serialization._CompressionLevel(len(payload))})')
+  print(f'{"codec":<24s}{"level":>6s}{"bytes":>12s}{"compress s":>14s}{"decompress s":>14s}')
+  for codec in _CODECS:
+    for level in _LEVELS:
+      compress_seconds, compressed = common.BestTime(lambda: serialization._Compressed(payload, codec, level))
+      pb = pyatdl_pb2.ChecksumAndData(payload=compressed, codec=codec)
+      decompress_seconds, decompressed = common.BestTime(lambda: serialization._Decompressed(pb))
+      assert decompressed == payload
+      print(f'{pyatdl_pb2.CompressionCodec.Name(codec):<24s}{level:6d}{len(compressed):12d}'
+            f'{compress_seconds:14.4f}{decompress_seconds:14.4f}')
+
+
+def main(_):
+  FLAGS.pyatdl_zlib_compression_level = -1
+  _Report('small', _SmallSerializedToDoList())
+  _Report(f'{FLAGS.num_actions} actions', common.BigSerializedToDoList(FLAGS.num_actions))
+
+
+if __name__ == '__main__':
+  app.run(main)
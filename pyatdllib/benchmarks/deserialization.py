@@ -0,0 +1,110 @@
+"""Benchmarks tdl.ToDoList.DeserializedProtobuf against the legacy approach.
+
+The legacy approach reserialized every submessage at every level of nesting and
+built each object with its constructor, which calls time.time() and
+os.environ.get() for every attribute via AuditableObject.__setattr__.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import action
+from ..core import ctx
+from ..core import folder
+from ..core import note
+from ..core import prj
+from ..core import pyatdl_pb2
+from ..core import tdl
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def _LegacyAction(bytestring: bytes) -> action.Action:
+  pb = pyatdl_pb2.Action.FromString(bytestring)
+  a = action.Action(the_uid=pb.common.uid,
+                    name=pb.common.metadata.name,
+                    note=pb.common.metadata.note,
+                    ctx_uid=pb.ctx_uid if pb.HasField('ctx_uid') else None)
+  a.is_complete = pb.is_complete
+  a.SetFieldsBasedOnProtobuf(pb.common)
+  return a
+
+
+def _LegacyPrj(bytestring: bytes) -> prj.Prj:
+  pb = pyatdl_pb2.Project.FromString(bytestring)
+  p = prj.Prj(the_uid=pb.common.uid,
+              name=pb.common.metadata.name,
+              note=pb.common.metadata.note,
+              is_complete=pb.is_complete,
+              is_active=pb.is_active,
+              default_context_uid=pb.default_context_uid,
+              max_seconds_before_review=(pb.max_seconds_before_review if pb.HasField('max_seconds_before_review')
+                                         else prj.DEFAULT_MAX_SECONDS_BEFORE_REVIEW),
+              last_review_epoch_sec=pb.last_review_epoch_seconds)
+  for pb_action in pb.actions:
+    p.items.append(_LegacyAction(pb_action.SerializeToString()))
+  p.SetFieldsBasedOnProtobuf(pb.common)
+  return p
+
+
+def _LegacyFolder(bytestring: bytes) -> folder.Folder:
+  pb = pyatdl_pb2.Folder.FromString(bytestring)
+  f = folder.Folder(the_uid=pb.common.uid, name=pb.common.metadata.name, note=pb.common.metadata.note)
+  for pb_folder in pb.folders:
+    f.items.append(_LegacyFolder(pb_folder.SerializeToString()))
+  for pb_project in pb.projects:
+    f.items.append(_LegacyPrj(pb_project.SerializeToString()))
+  f.SetFieldsBasedOnProtobuf(pb.common)
+  return f
+
+
+def _LegacyCtxList(bytestring: bytes) -> ctx.CtxList:
+  pb = pyatdl_pb2.ContextList.FromString(bytestring)
+  cl = ctx.CtxList(deserializing=True)
+  for pbc in pb.contexts:
+    pbc = pyatdl_pb2.Context.FromString(pbc.SerializeToString())
+    c = ctx.Ctx(the_uid=pbc.common.uid, name=pbc.common.metadata.name, is_active=pbc.is_active,
+                note=pbc.common.metadata.note)
+    c.SetFieldsBasedOnProtobuf(pbc.common)
+    cl.items.append(c)
+  return cl
+
+
+def LegacyDeserializedProtobuf(bytestring: bytes) -> tdl.ToDoList:
+  """Deserializes the way we did before FromProtobufMessage existed."""
+  pb = pyatdl_pb2.ToDoList.FromString(bytestring)
+  rv = tdl.ToDoList(inbox=_LegacyPrj(pb.inbox.SerializeToString()),
+                    root=_LegacyFolder(pb.root.SerializeToString()),
+                    ctx_list=_LegacyCtxList(pb.ctx_list.SerializeToString()),
+                    note_list=note.NoteList.DeserializedProtobuf(pb.note_list.SerializeToString()))
+  rv.CheckIsWellFormed()
+  return rv
+
+
+def main(_):
+  bytestring = common.BigSerializedToDoList(FLAGS.num_actions)
+  print(f'{FLAGS.num_actions} actions; {len(bytestring)} bytes serialized')
+
+  def Legacy():
+    uid.ResetNotesOfExistingUIDs()
+    return LegacyDeserializedProtobuf(bytestring)
+
+  def Fast():
+    uid.ResetNotesOfExistingUIDs()
+    return tdl.ToDoList.DeserializedProtobuf(bytestring)
+
+  legacy_seconds, legacy_todolist = common.BestTime(Legacy)
+  fast_seconds, fast_todolist = common.BestTime(Fast)
+  assert legacy_todolist.AsProto() == fast_todolist.AsProto()
+  print(f'legacy: {legacy_seconds:.3f}s')
+  print(f'fast:   {fast_seconds:.3f}s ({legacy_seconds / fast_seconds:.2f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
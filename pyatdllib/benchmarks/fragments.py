@@ -0,0 +1,53 @@
+"""Benchmarks rendering a freshly loaded ToDoList as hypertext with and without the fragment cache.
+
+Each web request loads the ToDoList afresh, so only fragment_cache.FRAGMENTS,
+which lives as long as the worker, can remember how we rendered an unchanged
+Prj last time. We time the rendering alone, as in the 'hypertext' command.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import html
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from typing import List
+
+from ..core import fragment_cache
+from ..core import tdl
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def _Render(todolist: tdl.ToDoList, *, cached: bool):
+  if not cached:
+    fragment_cache.FRAGMENTS.Clear()
+  lines: List[str] = []
+  todolist.AsTaskPaper(lines, hypertext_prefix='/todo', html_escaper=html.escape, cache_key='all notes')
+  return lines
+
+
+def main(_):
+  FLAGS.pyatdl_fragment_cache_size = max(FLAGS.pyatdl_fragment_cache_size, FLAGS.num_actions)
+  uid.ResetNotesOfExistingUIDs()
+  bytestring = common.BigToDoList(FLAGS.num_actions).AsProto().SerializeToString()
+  uid.ResetNotesOfExistingUIDs()
+  todolist = tdl.ToDoList.DeserializedProtobuf(bytestring)
+  print(f'{FLAGS.num_actions} actions')
+  cold_seconds, cold_result = common.BestTime(lambda: _Render(todolist, cached=False))
+  _Render(todolist, cached=True)
+  uid.ResetNotesOfExistingUIDs()
+  todolist = tdl.ToDoList.DeserializedProtobuf(bytestring)  # the next request
+  warm_seconds, warm_result = common.BestTime(lambda: _Render(todolist, cached=True))
+  assert cold_result == warm_result
+  print(f'empty cache: {cold_seconds:.3f}s')
+  print(f'warm cache:  {warm_seconds:.3f}s ({cold_seconds / warm_seconds:.1f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,47 @@
+"""Benchmarks a read-mostly request, e.g. /todo/action/<uid>, with and without lazy deserialization.
+
+The request loads the ToDoList, looks up one Action and its Ctx and Prj, and
+serializes the ToDoList again (as ApplyBatchOfCommands always does).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import tdl
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def _ReadOneAction(bytestring: bytes, action_uid: int, *, lazy: bool) -> bytes:
+  uid.ResetNotesOfExistingUIDs()
+  todolist = tdl.ToDoList.DeserializedProtobuf(bytestring, lazy=lazy)
+  found = todolist.ActionByUID(action_uid)
+  assert found is not None
+  a, p = found
+  assert a.ctx_uid is not None
+  context = todolist.ContextByUID(a.ctx_uid)
+  assert p.name and context is not None and context.name
+  return todolist.AsProto().SerializeToString()
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+  bytestring = todolist.AsProto().SerializeToString()
+  action_uid = [a for a, _ in todolist.Actions() if a.ctx_uid is not None][-1].uid
+  print(f'{FLAGS.num_actions} actions; {len(bytestring)} bytes serialized')
+  eager_seconds, eager_result = common.BestTime(lambda: _ReadOneAction(bytestring, action_uid, lazy=False))
+  lazy_seconds, lazy_result = common.BestTime(lambda: _ReadOneAction(bytestring, action_uid, lazy=True))
+  assert eager_result == lazy_result
+  print(f'eager: {eager_seconds:.3f}s')
+  print(f'lazy:  {lazy_seconds:.3f}s ({eager_seconds / lazy_seconds:.1f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,61 @@
+"""Measures the memory that a deserialized ToDoList costs per Action.
+
+We report the total memory allocated by tdl.ToDoList.DeserializedProtobuf (and
+still held by the resulting ToDoList) divided by the number of Actions, and
+the size of one Action object including the values it alone references.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import gc
+import sys
+import tracemalloc
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import tdl
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def _ShallowSize(obj: object) -> int:
+  """Returns the size of obj, its __dict__ if any, and the attribute values that nothing else shares."""
+  size = sys.getsizeof(obj)
+  d = getattr(obj, '__dict__', None)
+  if d is not None:
+    size += sys.getsizeof(d)
+    values = list(d.values())
+  else:
+    values = [getattr(obj, attr, None) for attr in type(obj).__slots__]
+  for value in values:
+    # 4 == the references from obj, from the list, from the loop variable, and from getrefcount's argument:
+    if value is not None and not isinstance(value, bool) and sys.getrefcount(value) <= 4:
+      size += sys.getsizeof(value)
+  return size
+
+
+def main(_):
+  bytestring = common.BigSerializedToDoList(FLAGS.num_actions)
+  uid.ResetNotesOfExistingUIDs()
+  gc.collect()
+  tracemalloc.start()
+  before, _ = tracemalloc.get_traced_memory()
+  todolist = tdl.ToDoList.DeserializedProtobuf(bytestring)
+  gc.collect()
+  after, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  actions = [a for a, _ in todolist.Actions()]
+  assert len(actions) == FLAGS.num_actions
+  print(f'{FLAGS.num_actions} actions; {len(bytestring)} bytes serialized '
+        f'({len(bytestring) / FLAGS.num_actions:.0f} bytes per action)')
+  print(f'ToDoList: {(after - before) / FLAGS.num_actions:.0f} bytes per action')
+  print(f'one Action: {sum(_ShallowSize(a) for a in actions) / len(actions):.0f} bytes')
+
+
+if __name__ == '__main__':
+  app.run(main)
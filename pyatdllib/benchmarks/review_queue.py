@@ -0,0 +1,49 @@
+"""Benchmarks ProjectsToReview with and without the ReviewQueue.
+
+A scan calls Prj.NeedsReview on every Prj for every query. The ReviewQueue
+costs one scan and sort to build and then answers each query in time
+proportional to the number of Prjs due.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import time
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions, actions_per_project=5)
+  projects = [p for p, _ in todolist.Projects()]
+  for i, p in enumerate(projects):
+    p.MarkAsReviewed(1e9 + i)
+  now = 1e9 + 604800.0 + 100  # about 100 Prjs are due
+
+  def Scan():
+    return [(p, path) for p, path in todolist.Projects() if p.NeedsReview(now)]
+
+  start = time.time()
+  todolist._index.ReviewQueue()  # pylint: disable=protected-access
+  build_seconds = time.time() - start
+  scan_seconds, scan_result = common.BestTime(Scan)
+  index_seconds, index_result = common.BestTime(lambda: list(todolist.ProjectsToReview(now)))
+  assert scan_result == index_result and 90 <= len(index_result) <= 110, len(index_result)
+  print(f'{len(projects)} Prjs; building the ReviewQueue: {build_seconds:.3f}s')
+  print(f'{len(index_result)} due: scan {scan_seconds:.4f}s  queue {index_seconds:.6f}s')
+  start = time.time()
+  for p in projects[:1000]:
+    p.MarkAsReviewed(now)
+  print(f'1000 reviews with the ReviewQueue up to date: {time.time() - start:.4f}s')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,45 @@
+"""Benchmarks serialization.SerializeToDoList2 with and without FLAGS.pyatdl_paranoid_about_saving.
+
+Every CLI command and every change made via the Django app saves the whole
+to-do list. Paranoid saving parses what it is about to save, verifying its
+checksum; otherwise we compare its size and nesting depth with the limits of
+the protobuf library.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import io
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import uid
+from ..ui import serialization
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+  todolist.SerializedProtobuf()  # warms the caches of the Folders and Prjs, as after an earlier save
+  print(f'{FLAGS.num_actions} actions')
+
+  def Save():
+    writer = io.BytesIO()
+    serialization.SerializeToDoList2(todolist, writer)
+    return writer.getvalue()
+
+  results = {}
+  for paranoid in (True, False):
+    FLAGS.pyatdl_paranoid_about_saving = paranoid
+    seconds, results[paranoid] = common.BestTime(Save)
+    print(f'paranoid={paranoid!s:5s} {seconds:.4f}s')
+  assert results[True] == results[False]
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,76 @@
+"""Benchmarks SearchFilter, i.e. the work behind 'hypertext --search_query'.
+
+'hypertext' evaluates four SearchFilters, one per combination of show_active
+and show_done, for the same query. We time evaluating all four with the
+TextIndex of the ToDoList (see Index.TextIndex), reporting the cost of building
+the TextIndex separately, and without it, i.e. lowercasing and scanning every
+name and note.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import time
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import uid
+from ..core import view_filter
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+class _ScanningSearchFilter(view_filter.SearchFilter):
+  """A SearchFilter that ignores the TextIndex."""
+
+  def ActionMask(self, columns):
+    return columns.Mask(self.ShowAction)
+
+  def _MatchesQuery(self, item):
+    return self.compiled_query.MatchesText(item)  # every query below is only about text
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+
+  def ActionToProject(an_action):
+    return todolist.ActionByUID(an_action.uid)[1]
+
+  def ActionToContext(an_action):
+    return None if an_action.ctx_uid is None else todolist.ContextByUID(an_action.ctx_uid)
+
+  def Search(cls, query):
+    evaluations = []
+    for show_active in (True, False):
+      for show_done in (True, False):
+        vf = cls(ActionToProject, ActionToContext, query=query, show_active=show_active, show_done=show_done)
+        evaluations.append(vf.Evaluate(todolist))
+    return evaluations
+
+  def Shown(evaluations):
+    return [[item.uid for item in todolist.Items() if e.Show(item)] for e in evaluations]
+
+  start = time.time()
+  todolist._index.TextIndex()  # pylint: disable=protected-access
+  print(f'{FLAGS.num_actions} actions; building the TextIndex: {time.time() - start:.3f}s')
+  for query in ('action 1234', 'note about action 77', 'no such text', 'MILK'):
+    slow_seconds, slow_result = common.BestTime(lambda: Search(_ScanningSearchFilter, query))
+
+    def FreshMatching():
+      the_text_index = todolist._index.TextIndex()  # pylint: disable=protected-access
+      the_text_index._matches_by_query.clear()  # pylint: disable=protected-access
+      return the_text_index.Matching(query)
+
+    matching_seconds, _ = common.BestTime(FreshMatching)
+    fast_seconds, fast_result = common.BestTime(lambda: Search(view_filter.SearchFilter, query))
+    assert Shown(slow_result) == Shown(fast_result), query
+    print(f'{query!r:24} scanning: {slow_seconds:.3f}s  TextIndex: {fast_seconds:.3f}s '
+          f'(of which matching a fresh query: {matching_seconds * 1000:.1f}ms)')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,46 @@
+"""Benchmarks saving a ToDoList after a small edit, with and without the cached serializations of unchanged
+Folders and Prjs (see tdl.ToDoList.SerializedProtobuf).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+  actions = [a for a, _ in todolist.Actions()]
+  todolist.SerializedProtobuf()  # warms the caches
+  edits = iter(range(10**9))
+
+  def EditOneAction():
+    a = actions[next(edits) % len(actions)]
+    a.is_complete = not a.is_complete
+
+  def Full():
+    EditOneAction()
+    return todolist.AsProto().SerializeToString()
+
+  def Cached():
+    EditOneAction()
+    return todolist.SerializedProtobuf()
+
+  full_seconds, _ = common.BestTime(Full)
+  cached_seconds, _ = common.BestTime(Cached)
+  assert todolist.SerializedProtobuf() == todolist.AsProto().SerializeToString()
+  print(f'{FLAGS.num_actions} actions; one action changed before each save')
+  print(f'AsProto().SerializeToString(): {full_seconds:.4f}s')
+  print(f'SerializedProtobuf():          {cached_seconds:.4f}s ({full_seconds / cached_seconds:.0f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,43 @@
+"""Benchmarks learning the checksum of the pyatdl.ToDoList inside a saved ChecksumAndData.
+
+The mergeprotobufs API asks this on every sync to see if the client is up to
+date. Old rows require decompressing the payload and hashing the result; new
+rows store the answer in ChecksumAndData.uncompressed_sha1_checksum.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import pyatdl_pb2
+from ..ui import serialization
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  saved = serialization.SerializedWithChecksum(common.BigSerializedToDoList(FLAGS.num_actions), algorithm=pyatdl_pb2.SHA1)
+  old_pb = pyatdl_pb2.ChecksumAndData.FromString(saved)
+  old_pb.ClearField('uncompressed_sha1_checksum')
+  old_row = old_pb.SerializeToString()
+  print(f'{FLAGS.num_actions} actions; {len(saved)} bytes saved')
+
+  def Old():
+    sha1_checksum_list = []
+    serialization._GetPayloadAfterVerifyingChecksum(  # pylint: disable=protected-access
+      old_row, 'benchmark', sha1_checksum_list=sha1_checksum_list)
+    return sha1_checksum_list[0]
+
+  old_seconds, old_checksum = common.BestTime(Old)
+  new_seconds, new_checksum = common.BestTime(lambda: serialization.UncompressedChecksum(saved, 'benchmark', pyatdl_pb2.SHA1))
+  assert old_checksum == new_checksum
+  print(f'verify, decompress, and hash: {old_seconds:.4f}s')
+  print(f'read the stored checksum:     {new_seconds:.6f}s ({old_seconds / new_seconds:.0f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
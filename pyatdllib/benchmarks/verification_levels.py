@@ -0,0 +1,40 @@
+"""Benchmarks serialization.DeserializeToDoList2 at each FLAGS.pyatdl_verification_level.
+
+Every page load of the Django app deserializes the whole to-do list. 'paranoid'
+renders it as text and as a text-format protocol buffer on top of checking that
+it is well-formed; 'trusted' skips even the well-formedness check.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import io
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..ui import serialization
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  saved = serialization.SerializedWithChecksum(common.BigSerializedToDoList(FLAGS.num_actions))
+  print(f'{FLAGS.num_actions} actions; {len(saved)} bytes saved')
+
+  def Load(level):
+    reader = io.BytesIO(saved)
+    reader.name = 'benchmark'
+    return serialization.DeserializeToDoList2(reader, tdl_factory=None, verification_level=level)
+
+  results = {}
+  for level in ('paranoid', 'standard', 'trusted'):
+    seconds, results[level] = common.BestTime(lambda level=level: Load(level))
+    print(f'{level:9s} {seconds:.3f}s')
+  assert results['paranoid'].AsProto() == results['trusted'].AsProto()
+
+
+if __name__ == '__main__':
+  app.run(main)
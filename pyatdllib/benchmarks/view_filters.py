@@ -0,0 +1,58 @@
+"""Benchmarks the built-in view filters one Action at a time versus a column at a time.
+
+We time the work behind 'lsctx --json', i.e. counting the shown Actions in
+each Ctx, both with ViewFilter.ShowAction and with ViewFilter.ActionMask. We
+report the cost of building the ActionColumns snapshot separately because one
+snapshot serves any number of view filters.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import uid
+from ..core import view_filter
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+  for i, c in enumerate(todolist.ctx_list.items):
+    if i % 5 == 0:
+      c.is_active = False
+  ctx_uids = [None] + [c.uid for c in todolist.ctx_list.items]
+
+  def ActionToProject(an_action):
+    return todolist.ActionByUID(an_action.uid)[1]
+
+  def ActionToContext(an_action):
+    return None if an_action.ctx_uid is None else todolist.ContextByUID(an_action.ctx_uid)
+
+  def OneAtATime(vf):
+    return [sum(1 for a, _ in todolist.ActionsInContext(ctx_uid, ordered=False) if vf.ShowAction(a))
+            for ctx_uid in ctx_uids]
+
+  build_seconds, columns = common.BestTime(todolist.ActionColumns)
+
+  def ColumnAtATime(vf):
+    shown = vf.ActionMask(columns)
+    return [columns.Count(shown & columns.InContext(ctx_uid)) for ctx_uid in ctx_uids]
+
+  print(f'{FLAGS.num_actions} actions; building ActionColumns: {build_seconds:.3f}s')
+  for cls in view_filter._VIEW_FILTER_CLASSES:  # pylint: disable=protected-access
+    vf = cls(ActionToProject, ActionToContext)
+    slow_seconds, slow_result = common.BestTime(lambda: OneAtATime(vf))
+    fast_seconds, fast_result = common.BestTime(lambda: ColumnAtATime(vf))
+    assert slow_result == fast_result, (slow_result, fast_result)
+    print(f'{cls.ViewFilterUINames()[0]:24} ShowAction: {slow_seconds:.3f}s  '
+          f'ActionMask: {fast_seconds:.4f}s ({slow_seconds / fast_seconds:.0f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,48 @@
+"""Benchmarks the check that --pyatdl_paranoia runs before and after every command.
+
+We time a full ToDoList.CheckIsWellFormed and an incremental
+ToDoList.CheckChangesAreWellFormed, each after the same small mutation.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from absl import app  # type: ignore
+from absl import flags  # type: ignore
+
+from ..core import action
+from ..core import uid
+from . import common
+
+FLAGS = flags.FLAGS
+
+
+def main(_):
+  uid.ResetNotesOfExistingUIDs()
+  todolist = common.BigToDoList(FLAGS.num_actions)
+  ctx_uid = todolist.ctx_list.items[0].uid
+  FLAGS.pyatdl_full_wellformedness_check_interval = 0
+
+  def Mutate():
+    a = action.Action(name='new action', ctx_uid=ctx_uid)
+    todolist.inbox.items.append(a)
+    todolist.inbox.items[0].is_complete = True
+
+  def Full():
+    Mutate()
+    todolist.CheckIsWellFormed()
+
+  def Incremental():
+    Mutate()
+    todolist.CheckChangesAreWellFormed()
+
+  full_seconds, _ = common.BestTime(Full)
+  incremental_seconds, _ = common.BestTime(Incremental)
+  print(f'{FLAGS.num_actions} actions')
+  print(f'CheckIsWellFormed:         {full_seconds:.4f}s')
+  print(f'CheckChangesAreWellFormed: {incremental_seconds:.6f}s ({full_seconds / incremental_seconds:.0f}x)')
+
+
+if __name__ == '__main__':
+  app.run(main)
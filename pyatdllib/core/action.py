@@ -8,7 +8,7 @@ from __future__ import print_function
 
 from absl import flags  # type: ignore
 from google.protobuf import message
-from typing import Type, TypeVar
+from typing import Any, Dict, Optional, Type, TypeVar
 
 from . import auditable_object
 from . import common
@@ -19,6 +19,22 @@ FLAGS = flags.FLAGS
 
 T = TypeVar('T', bound='Action')
 
+# Thousands of Actions share each context, and each ctx_uid read from a protobuf is a fresh 32-byte int, so Actions
+# share one int object per ctx_uid. We forget them all if there are implausibly many.
+_MAX_INTERNED_CTX_UIDS = 10000
+_interned_ctx_uids: Dict[int, int] = {}
+
+
+def _InternedCtxUid(ctx_uid: Optional[int]) -> Optional[int]:
+  if ctx_uid is None:
+    return None
+  interned = _interned_ctx_uids.get(ctx_uid)
+  if interned is None:
+    if len(_interned_ctx_uids) >= _MAX_INTERNED_CTX_UIDS:
+      _interned_ctx_uids.clear()
+    interned = _interned_ctx_uids[ctx_uid] = ctx_uid
+  return interned
+
 
 class Action(auditable_object.AuditableObject):
   """The smallest unit of work, something to do that can be checked
@@ -36,6 +52,16 @@ class Action(auditable_object.AuditableObject):
     ctx_uid: None|int  # UID of the Context, e.g. -5983155992228943816 which might refer to "@the store"
   """
 
+  # A ToDoList may hold tens of thousands of Actions, so they have no __dict__.
+  __slots__ = ('uid', 'ctime', 'mtime', 'dtime', 'is_deleted', 'is_complete', 'name', 'note', 'ctx_uid', 'parent',
+               '_index')
+
+  def __new__(cls, *args: Any, **kwargs: Any) -> 'Action':
+    a = super().__new__(cls)
+    object.__setattr__(a, 'parent', None)
+    object.__setattr__(a, '_index', None)
+    return a
+
   def __init__(self, the_uid: int = None, name: str = None, ctx_uid: int = None, note: str = '') -> None:
     super().__init__(the_uid=the_uid)
     self.is_complete = False
@@ -44,6 +70,16 @@ class Action(auditable_object.AuditableObject):
     assert (ctx_uid is None) or ((-2**63 <= ctx_uid < 0) or (0 < ctx_uid < 2**63)), ctx_uid
     self.ctx_uid = ctx_uid
 
+  def __setattr__(self, name: str, value: Any) -> None:
+    if name == 'ctx_uid':
+      value = _InternedCtxUid(value)
+      if self._index is not None:
+        old_ctx_uid = getattr(self, 'ctx_uid', None)
+        super().__setattr__(name, value)
+        self._index.NoteContextChange(self, old_ctx_uid)
+        return
+    super().__setattr__(name, value)
+
   def __unicode__(self) -> str:
     uid_str = '' if not FLAGS.pyatdl_show_uid else ' uid=%s' % self.uid
     return '<action%s is_deleted="%s" is_complete="%s" name="%s" ctx="%s"/>' % (
@@ -70,17 +106,6 @@ class Action(auditable_object.AuditableObject):
     self.ctx_uid = other.ctx_uid if other.HasField('ctx_uid') else None
     self.MergeCommonFrom(other)
 
-  def AlmostPurge(self) -> None:
-    """Almost purges. A complete removal would be disastrous if you are using multiple devices. The next time some other
-    device syncs it will seem that it has new items. So we leave the UID in place but clear all metadata and remove
-    from the context, if any.
-
-    To truly purge the data, once you're certain that everyone is in sync, call PurgeDeleted().
-    """
-    self.name = ''
-    self.is_deleted = True
-    self.ctx_uid = None
-
   def AsProto(self, pb: message.Message = None) -> message.Message:
     if pb is None:
       pb = pyatdl_pb2.Action()
@@ -101,13 +126,23 @@ class Action(auditable_object.AuditableObject):
   def DeserializedProtobuf(cls: Type[T], bytestring: bytes) -> T:
     """Deserializes a Action from the given protocol buffer."""
     assert bytestring
-    pb = pyatdl_pb2.Action.FromString(bytestring)  # pylint: disable=no-member
-    ctx_uid = pb.ctx_uid if pb.HasField('ctx_uid') else None
+    return cls.FromProtobufMessage(pyatdl_pb2.Action.FromString(bytestring))  # pylint: disable=no-member
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[T], pb: pyatdl_pb2.Action, *, note_uid: bool = True) -> T:
+    """Like DeserializedProtobuf but faster: starts from a parsed message and bypasses __setattr__.
+
+    Args:
+      pb: pyatdl_pb2.Action
+      note_uid: bool  # False iff the caller already called uid.singleton_factory.NoteExistingUID
+    """
+    assert pb.ListFields()
+    ctx_uid = _InternedCtxUid(pb.ctx_uid) if pb.HasField('ctx_uid') else None
     assert (ctx_uid is None) or ((-2**63 <= ctx_uid < 0) or (0 < ctx_uid < 2**63)), ctx_uid
-    a = cls(the_uid=pb.common.uid,
-            name=pb.common.metadata.name,
-            note=pb.common.metadata.note,
-            ctx_uid=ctx_uid)
-    a.is_complete = pb.is_complete
+    a = cls._NewWithoutHooks(pb.common, note_uid=note_uid)
+    a._SetFields(is_complete=pb.is_complete,
+                 name=pb.common.metadata.name,
+                 note=pb.common.metadata.note,
+                 ctx_uid=ctx_uid)
     a.SetFieldsBasedOnProtobuf(pb.common)  # must be last mutation
     return a
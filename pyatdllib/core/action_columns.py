@@ -0,0 +1,170 @@
+"""Defines ActionColumns, a column-oriented snapshot of every Action in a ToDoList.
+
+ViewFilter.ShowAction decides about one Action at a time, looking up the
+Action's Prj and Ctx each time. ActionColumns instead stores each boolean
+property of all the Actions as a bitset, a Python int whose bit i describes the
+ith Action (in the order of ToDoList.Actions()). A ViewFilter can then compute
+the set of Actions it shows (see ViewFilter.ActionMask) with a handful of
+bitwise operations on whole columns, each of which runs in C.
+
+The Actions of a Prj occupy a contiguous range of positions, so the columns
+describing Prjs cost O(number of Prjs) to build.
+
+A snapshot does not notice later changes to the ToDoList. Build a new one.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import array
+import itertools
+import operator
+
+from typing import AbstractSet, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import action
+from . import ctx
+from . import prj
+
+
+_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+
+def _Bitset(bools: Iterable[bool]) -> int:
+  """Returns the bitset whose bit i is bools[i]. Given a map object, this runs without any Python-level loop."""
+  digits = bytes(bools).translate(_DIGITS)
+  return int(digits[::-1], 2) if digits else 0
+
+
+def _Range(start: int, end: int) -> int:
+  """Returns the bitset of positions start, start + 1, ..., end - 1."""
+  return ((1 << (end - start)) - 1) << start
+
+
+class ActionColumns(object):
+  """A snapshot of all Actions of a ToDoList, one column per field.
+
+  Fields:
+    actions: [Action]  # in the order of ToDoList.Actions()
+    projects: [Prj]  # in the order of ToDoList.Projects()
+    project_index: array('l')  # project_index[i] is the position in projects of the Prj containing actions[i]
+    uid: array('q')
+    ctime: array('d')
+    mtime: array('d')
+    dtime: array('d')  # NaN for an undeleted Action
+    ctx_uid: [int|None]
+    is_complete: int  # a bitset
+    is_deleted: int  # a bitset
+    in_inactive_ctx: int  # a bitset: Actions whose Ctx is inactive. Actions without a Ctx are not included.
+    in_complete_prj: int  # a bitset
+    in_active_prj: int  # a bitset
+    ctx_is_active: {int: bool}  # Ctx UID => is_active
+    ctx_by_uid: {int: Ctx}
+  """
+
+  def __init__(self, projects: Iterable[prj.Prj], contexts: Iterable[ctx.Ctx]) -> None:
+    self.ctx_by_uid: Dict[int, ctx.Ctx] = {c.uid: c for c in contexts}
+    self.ctx_is_active: Dict[int, bool] = {u: c.is_active for u, c in self.ctx_by_uid.items()}
+    self.projects: List[prj.Prj] = []
+    self.actions: List[action.Action] = []
+    self.project_index = array.array('l')
+    self._project_ranges: List[Tuple[int, int]] = []
+    for p in projects:
+      start = len(self.actions)
+      self.actions.extend(p.items)
+      self.project_index.extend([len(self.projects)] * (len(self.actions) - start))
+      self.projects.append(p)
+      self._project_ranges.append((start, len(self.actions)))
+    actions = self.actions
+    self.uid = array.array('q', map(operator.attrgetter('uid'), actions))
+    self.ctime = array.array('d', map(operator.attrgetter('ctime'), actions))
+    self.mtime = array.array('d', map(operator.attrgetter('mtime'), actions))
+    nan = float('nan')
+    self.dtime = array.array('d', [nan if d is None else d for d in map(operator.attrgetter('dtime'), actions)])
+    self.ctx_uid: List[Optional[int]] = list(map(operator.attrgetter('ctx_uid'), actions))
+    self.is_complete = _Bitset(map(operator.attrgetter('is_complete'), actions))
+    self.is_deleted = _Bitset(map(operator.attrgetter('is_deleted'), actions))
+    inactive_ctx_uids = frozenset(u for u, is_active in self.ctx_is_active.items() if not is_active)
+    self.in_inactive_ctx = _Bitset(map(inactive_ctx_uids.__contains__, self.ctx_uid))
+    self.in_complete_prj = self.ProjectsMask(lambda p: p.is_complete)
+    self.in_active_prj = self.ProjectsMask(lambda p: p.is_active)
+    self._bitset_by_ctx_uid: Dict[Optional[int], int] = {}
+    self._position_by_project_id = {id(p): i for i, p in enumerate(self.projects)}
+
+  def __len__(self) -> int:
+    return len(self.actions)
+
+  def All(self) -> int:
+    """Returns the bitset of all Actions."""
+    return _Range(0, len(self.actions))
+
+  def Not(self, bitset: int) -> int:
+    """Returns the complement of the given bitset."""
+    return self.All() ^ bitset
+
+  def ProjectsMask(self, predicate: Callable[[prj.Prj], bool]) -> int:
+    """Returns the bitset of Actions whose Prj satisfies the predicate."""
+    mask = 0
+    for p, (start, end) in zip(self.projects, self._project_ranges):
+      if start < end and predicate(p):
+        mask |= _Range(start, end)
+    return mask
+
+  def Mask(self, predicate: Callable[[action.Action], bool]) -> int:
+    """Returns the bitset of Actions satisfying the predicate, which we call once per Action."""
+    return _Bitset(map(bool, map(predicate, self.actions)))
+
+  def TimeMask(self, field: str, op: Callable[[float, float], bool], seconds: float) -> int:
+    """Returns the bitset of Actions for which op(the Action's field, seconds) is True.
+
+    Args:
+      field: 'ctime'|'mtime'|'dtime'  # An undeleted Action's dtime satisfies no comparison.
+      op: e.g. operator.gt
+      seconds: float  # since the epoch
+    """
+    return _Bitset(map(op, getattr(self, field), itertools.repeat(seconds)))
+
+  def WithUIDs(self, uids: AbstractSet[int]) -> int:
+    """Returns the bitset of Actions whose UID is in uids."""
+    return _Bitset(map(uids.__contains__, self.uid))
+
+  def WithIds(self, ids: AbstractSet[int]) -> int:
+    """Returns the bitset of Actions whose id() is in ids."""
+    return _Bitset(map(ids.__contains__, map(id, self.actions)))
+
+  def InProject(self, project: prj.Prj) -> int:
+    """Returns the bitset of the given Prj's Actions, or 0 if the Prj is not in this snapshot."""
+    i = self._position_by_project_id.get(id(project))
+    return 0 if i is None else _Range(*self._project_ranges[i])
+
+  def InContext(self, ctx_uid: Optional[int]) -> int:
+    """Returns the bitset of Actions with the given ctx_uid (None for Actions without a Ctx)."""
+    bitset = self._bitset_by_ctx_uid.get(ctx_uid)
+    if bitset is None:
+      bitset = self._bitset_by_ctx_uid[ctx_uid] = _Bitset(map(operator.eq, self.ctx_uid, itertools.repeat(ctx_uid)))
+    return bitset
+
+  @staticmethod
+  def Count(bitset: int) -> int:
+    """Returns the number of Actions in the given bitset."""
+    return bin(bitset).count('1')
+
+  def Positions(self, bitset: int) -> List[int]:
+    """Returns the positions, in ascending order, of the Actions in the given bitset."""
+    digits = bin(bitset)[:1:-1]  # least significant first
+    positions = []
+    i = digits.find('1')
+    while i >= 0:
+      positions.append(i)
+      i = digits.find('1', i + 1)
+    return positions
+
+  def Actions(self, bitset: int) -> List[action.Action]:
+    """Returns the Actions in the given bitset in the order of ToDoList.Actions()."""
+    return [self.actions[i] for i in self.Positions(bitset)]
+
+  def Predicate(self, bitset: int) -> Callable[[action.Action], bool]:
+    """Returns a function like ViewFilter.ShowAction that tells whether an Action is in the given bitset."""
+    ids = frozenset(id(a) for a in self.Actions(bitset))
+    return lambda an_action: id(an_action) in ids
@@ -0,0 +1,92 @@
+"""Unittests for module 'action_columns'."""
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import folder
+from pyatdllib.core import prj
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+from pyatdllib.core import view_filter
+
+
+FLAGS = flags.FLAGS
+
+
+class ActionColumnsTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+
+  def _ToDoList(self):
+    lst = tdl.ToDoList()
+    active_uid = lst.AddContext('@active')
+    inactive_uid = lst.AddContext('@inactive')
+    lst.ContextByUID(inactive_uid).is_active = False
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    i = 0
+    for is_active, is_complete in ((True, False), (False, False), (True, True)):
+      p = prj.Prj(name='p%d' % i)
+      p.is_active = is_active
+      p.is_complete = is_complete
+      f.items.append(p)
+      lst.AddProjectOrFolder(prj.Prj(name='empty%d' % i), parent_folder_uid=f.uid)
+      for ctx_uid in (None, active_uid, inactive_uid):
+        for is_deleted, is_complete in ((False, False), (True, False), (False, True)):
+          a = action.Action(name='a%d' % i, ctx_uid=ctx_uid)
+          a.is_deleted = is_deleted
+          a.is_complete = is_complete
+          p.items.append(a)
+          i += 1
+    lst.inbox.items.append(action.Action(name='in the inbox', ctx_uid=inactive_uid))
+    return lst
+
+  def testActionMaskMatchesShowAction(self):
+    lst = self._ToDoList()
+    columns = lst.ActionColumns()
+    self.assertEqual(len(columns), 28)
+    self.assertEqual(columns.actions, [a for a, _ in lst.Actions()])
+
+    def ActionToProject(an_action):
+      return lst.ActionByUID(an_action.uid)[1]
+
+    def ActionToContext(an_action):
+      return None if an_action.ctx_uid is None else lst.ContextByUID(an_action.ctx_uid)
+
+    filters = [cls(ActionToProject, ActionToContext) for cls in view_filter._VIEW_FILTER_CLASSES]
+    filters.append(view_filter.SearchFilter(ActionToProject, ActionToContext, query='a1',
+                                            show_active=True, show_done=False))
+    for vf in filters:
+      expected = [a for a, _ in lst.Actions() if vf.ShowAction(a)]
+      mask = vf.ActionMask(columns)
+      self.assertEqual(columns.Actions(mask), expected, type(vf).__name__)
+      self.assertEqual(columns.Count(mask), len(expected))
+      predicate = columns.Predicate(mask)
+      self.assertEqual([a for a, _ in lst.Actions() if predicate(a)], expected)
+      for c in [None] + list(lst.ctx_list.items):
+        ctx_uid = None if c is None else c.uid
+        self.assertEqual(columns.Count(mask & columns.InContext(ctx_uid)),
+                         sum(1 for a in expected if a.ctx_uid == ctx_uid))
+      for p, _ in lst.Projects():
+        self.assertEqual(columns.Count(mask & columns.InProject(p)),
+                         sum(1 for a in p.items if a in expected))
+
+  def testColumns(self):
+    lst = self._ToDoList()
+    columns = lst.ActionColumns()
+    actions = [a for a, _ in lst.Actions()]
+    self.assertEqual(list(columns.uid), [a.uid for a in actions])
+    self.assertEqual(list(columns.ctime), [a.ctime for a in actions])
+    self.assertEqual([columns.projects[i] for i in columns.project_index], [p for _, p in lst.Actions()])
+    self.assertEqual(columns.Positions(columns.is_deleted),
+                     [i for i, a in enumerate(actions) if a.is_deleted])
+    self.assertEqual(columns.Positions(0), [])
+    self.assertEqual(columns.Not(columns.All()), 0)
+
+
+if __name__ == '__main__':
+  unitjest.main()
@@ -1,5 +1,6 @@
 """Unittests for module 'action'."""
 
+import copy
 import time
 
 from absl import flags  # type: ignore
@@ -79,6 +80,27 @@ ctx_uid: -9223372036854775808
     finally:
       time.time = saved_time
 
+  def testSlots(self):
+    a = action.Action(name='a', ctx_uid=-2**63)
+    self.assertFalse(hasattr(a, '__dict__'))
+    with self.assertRaises(AttributeError):
+      a.no_such_field = 1
+    self.assertIsNone(a.parent)
+    a.mtime = 1.0
+    a.ctime = 1.0
+    a.name = 'b'
+    self.assertGreater(a.mtime, 1.0)
+    self.assertEqual(a.ctime, 1.0)
+    self.assertIsNone(a.dtime)
+    a.is_deleted = True
+    self.assertIsNotNone(a.dtime)
+    b = action.Action.FromProtobufMessage(a.AsProto(), note_uid=False)
+    self.assertEqual(b.AsProto(), a.AsProto())
+    self.assertIs(b.ctx_uid, a.ctx_uid)
+    c = copy.deepcopy(a)
+    self.assertEqual(c.AsProto(), a.AsProto())
+    self.assertIsNot(c, a)
+
 
 if __name__ == '__main__':
   unitjest.main()
@@ -0,0 +1,37 @@
+"""Defines ActivityIndex, which orders objects by the time of their latest activity.
+
+An object's activity time is the latest of its ctime, mtime, and dtime (see
+ActivityTime). The k most recently active objects, and the objects active since
+a given time, then take O(log N + k) time to find (see module 'sorted_index').
+
+The Index of a ToDoList builds an ActivityIndex on demand and keeps it up to
+date as objects come, go, and change (see Index.ActivityIndex).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from typing import Any, List
+
+from . import sorted_index
+
+
+def ActivityTime(obj: Any) -> float:
+  """Returns the latest of obj's ctime, mtime, and dtime, in seconds since the epoch."""
+  return max(obj.mtime or 0.0, obj.ctime or 0.0, obj.dtime or 0.0)
+
+
+class ActivityIndex(sorted_index.SortedIndex):
+  """Orders objects having UIDs by ActivityTime, breaking ties by UID."""
+
+  def __init__(self) -> None:
+    super().__init__(ActivityTime)
+
+  def MostRecent(self, k: int) -> List[Any]:
+    """Returns the k most recently active objects (or all, if fewer), most recent first."""
+    return self.Greatest(k)
+
+  def ActiveSince(self, timestamp: float) -> List[Any]:
+    """Returns the objects whose activity time is later than timestamp, most recent first."""
+    return self.Above(timestamp)
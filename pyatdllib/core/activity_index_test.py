@@ -0,0 +1,89 @@
+"""Unittests for module 'activity_index'."""
+
+import time
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import activity_index
+from pyatdllib.core import prj
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+
+
+FLAGS = flags.FLAGS
+
+
+class ActivityIndexTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+
+  def _Action(self, name, mtime):
+    a = action.Action(name=name)
+    a.ctime = 0.0
+    a.mtime = mtime
+    return a
+
+  def testOrdering(self):
+    ai = activity_index.ActivityIndex()
+    a, b, c = self._Action('a', 10.0), self._Action('b', 30.0), self._Action('c', 20.0)
+    ai.AddAll([a, b])
+    ai.Add(c)
+    self.assertEqual(len(ai), 3)
+    self.assertEqual(ai.MostRecent(2), [b, c])
+    self.assertEqual(ai.MostRecent(0), [])
+    self.assertEqual(ai.MostRecent(9), [b, c, a])
+    self.assertEqual(ai.ActiveSince(10.0), [b, c])
+    self.assertEqual(ai.ActiveSince(30.0), [])
+    a.mtime = 40.0
+    self.assertEqual(ai.MostRecent(1), [b])  # we have not heard about the change yet
+    ai.Add(a)
+    self.assertEqual(ai.MostRecent(1), [a])
+    ai.Remove(b)
+    ai.Remove(b)
+    self.assertEqual(ai.ActiveSince(0.0), [a, c])
+    a.dtime = 50.0
+    a.mtime = 45.0  # because setting dtime updated mtime
+    ai.Add(a)
+    self.assertEqual(activity_index.ActivityTime(a), 50.0)
+    self.assertEqual(ai.ActiveSince(45.0), [a])
+
+  def testToDoListKeepsItUpToDate(self):
+    lst = tdl.ToDoList()
+    p = prj.Prj(name='p')
+    lst.AddProjectOrFolder(p)
+    for i in range(5):
+      p.items.append(action.Action(name='a%d' % i))
+    for i, item in enumerate(lst.Items()):
+      item.ctime = 0.0
+      item.mtime = 100.0 + i  # last because setting ctime updated mtime
+
+    def Check():
+      expected = sorted(lst.Items(), key=lambda x: (activity_index.ActivityTime(x), x.uid), reverse=True)
+      self.assertEqual([v['name'] for v in lst.RecentActivity(num_items=3)[1:]],
+                       [x.name for x in expected[:3]])
+      self.assertEqual(lst.ItemsActiveSince(103.0), [x for x in expected if activity_index.ActivityTime(x) > 103.0])
+
+    Check()
+    self.assertEqual([x.name for x in lst.ItemsActiveSince(104.0)], ['a4', 'a3', 'a2'])
+    p.items[0].NoteModification()
+    self.assertEqual(lst.ItemsActiveSince(time.time() - 3600)[0], p.items[0])
+    Check()
+    p.items[1].is_deleted = True
+    Check()
+    p.items[2].mtime = 1.0
+    Check()
+    p.items.append(action.Action(name='new'))
+    Check()
+    del p.items[0]
+    Check()
+    lst.AddContext('@home')
+    Check()
+
+
+if __name__ == '__main__':
+  unitjest.main()
@@ -10,7 +10,7 @@ import time
 
 from absl import flags  # type: ignore
 from google.protobuf import message
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import common
 from . import errors
@@ -55,12 +55,22 @@ class AuditableObject(object):
     dtime: float|None  # seconds since the epoch, or None if not deleted.
     mtime: float  # seconds since the epoch
     is_deleted: bool
+    parent: Container|None  # maintained by the parent's ItemList; None for the inbox, the root Folder, and Ctxs
 
   Invariants:
     ctime == min(ctime, mtime, dtime if dtime is not None else +infinity)
     2**63 > uid >= -(2**63)
   """
 
+  # Subclasses without a __dict__ (see Action) must list these two in their __slots__ and set them to None in __new__.
+  __slots__ = ()
+
+  # The index.Index of the ToDoList containing this object, if any. Set via object.__setattr__ so that attaching an
+  # object to a ToDoList does not trample mtime.
+  _index: Optional[Any] = None
+  # Likewise set via object.__setattr__:
+  parent: Optional[Any] = None
+
   def __init__(self, the_uid: int = None) -> None:  # the_uid only for deserialization
     self.ctime = time.time()
     self.mtime = self.ctime
@@ -78,11 +88,39 @@ class AuditableObject(object):
       uid.singleton_factory.NoteExistingUID(the_uid)
       self.uid = the_uid
 
+  def Ancestors(self) -> List[Any]:
+    """Returns [parent, grandparent, ...], i.e. the path to this object, leaf first."""
+    path = []
+    ancestor = self.parent
+    while ancestor is not None:
+      path.append(ancestor)
+      ancestor = ancestor.parent
+    return path
+
+  def _NameChanged(self, old_name: Optional[str]) -> None:
+    """Tells our parent, which indexes its items by name, that our name changed.
+
+    Call this if you change self.name without __setattr__ (e.g., with _SetFields).
+    """
+    if self.parent is not None:
+      self.parent._ChildRenamed(self, old_name)
+
+  def _MarkDirty(self) -> None:
+    """Discards the cached serializations (see Container.SerializedProtobuf) that include this object.
+
+    Call this if you bypass __setattr__ (e.g., with _SetFields). We have no cache of our own, so we tell our parent.
+    """
+    if self.parent is not None:
+      self.parent._MarkDirty()
+
   def NoteModification(self) -> None:
     """Updates mtime."""
-    self.__dict__['mtime'] = time.time()
+    object.__setattr__(self, 'mtime', time.time())
+    self._MarkDirty()
+    if self._index is not None:
+      self._index.NoteActivity(self)
     if os.environ.get('DJANGO_DEBUG') == "True":
-      assert self.__dict__['mtime'] >= self.__dict__['ctime'], str(self.__dict__)
+      assert self.mtime >= self.ctime, str(self._Fields())
     # The above assertion led to this: AssertionError:
     # {'max_seconds_before_review': 604800.0, 'is_deleted': False, 'uid': 62L,
     # 'items': [], 'dtime': None, 'is_active': False, 'name': u'inactive prj',
@@ -108,11 +146,60 @@ class AuditableObject(object):
     if name == 'name':
       if value is not None and value.startswith('uid='):
         raise IllegalNameError('Names starting with "uid=" are prohibited.')
-    self.__dict__[name] = value
+      old_name = getattr(self, 'name', None)
+      object.__setattr__(self, name, value)
+      if old_name != value:
+        self._NameChanged(old_name)
+    else:
+      object.__setattr__(self, name, value)
     if name == 'is_deleted' and value:
-      self.__dict__['dtime'] = time.time()
+      object.__setattr__(self, 'dtime', time.time())
     if name != 'mtime':
       self.NoteModification()
+    else:
+      self._MarkDirty()
+    if self._index is not None:
+      self._index.NoteTouched(self)
+
+  def _SetFields(self, **fields: Any) -> None:
+    """Sets the given fields directly, bypassing __setattr__ and therefore NoteModification, _NameChanged, etc."""
+    for name, value in fields.items():
+      object.__setattr__(self, name, value)
+    if self._index is not None:
+      self._index.NoteTouched(self)
+
+  def __setstate__(self, state: Any) -> None:
+    """For copy.deepcopy and pickle. Restores our fields without the side effects of __setattr__, e.g. on mtime.
+
+    Args:
+      state: dict|(dict|None, dict)  # __dict__ and/or __slots__, as object.__reduce_ex__ captures them
+    """
+    dict_state, slots_state = state if isinstance(state, tuple) else (state, None)
+    for fields in (dict_state, slots_state):
+      for name, value in (fields or {}).items():
+        object.__setattr__(self, name, value)
+
+  def _Fields(self) -> Dict[str, Any]:
+    """Returns our fields, whether they live in __dict__ or in __slots__, for debugging."""
+    d = getattr(self, '__dict__', None)
+    if d is not None:
+      return dict(d)
+    slots: Tuple[str, ...] = type(self).__slots__
+    return {name: getattr(self, name, None) for name in slots}
+
+  @classmethod
+  def _NewWithoutHooks(cls, pb: pyatdl_pb2.Common, *, note_uid: bool = True) -> Any:
+    """For fast deserialization, returns an instance having nothing but the UID from pb (which we note unless told
+    that the caller already did).
+
+    This bypasses __init__ and __setattr__ (and their calls to time.time()), so the caller must set every field with
+    _SetFields and must finish by calling SetFieldsBasedOnProtobuf.
+    """
+    obj = cls.__new__(cls)
+    if note_uid:
+      uid.singleton_factory.NoteExistingUID(pb.uid)
+    object.__setattr__(obj, 'uid', pb.uid)
+    return obj
 
   def AsProto(self, pb: message.Message) -> message.Message:
     """Serializes this object by mutating pb.
@@ -153,22 +240,26 @@ class AuditableObject(object):
 
     At the very last because any manipulation of this object afterwards will overwrite mtime.
     """
-    self.__dict__['is_deleted'] = pb.is_deleted
-    self.__dict__['ctime'] = common.FloatingPointTimestamp(pb.timestamp.ctime)
-    self.__dict__['dtime'] = common.FloatingPointTimestamp(pb.timestamp.dtime)
-    # self.__dict__['mtime'] must be set last because setting anything else triggers NoteModification which overwrites
-    # it based on time.time().
+    set_field = object.__setattr__
+    set_field(self, 'is_deleted', pb.is_deleted)
+    set_field(self, 'ctime', common.FloatingPointTimestamp(pb.timestamp.ctime))
+    set_field(self, 'dtime', common.FloatingPointTimestamp(pb.timestamp.dtime))
+    # mtime must be set last because setting anything else triggers NoteModification which overwrites it based on
+    # time.time().
     if pb.uid == 0 or pb.uid < -2**63 or pb.uid >= 2**63:
       raise errors.DataError(f"Illegal UID value {pb.uid} from {pb}: not in range [-2**63, 0) or (0, 2**63)")
-    if self.__dict__['uid'] != pb.uid:
+    if self.uid != pb.uid:
       uid.singleton_factory.NoteExistingUID(pb.uid)
-    self.__dict__['uid'] = pb.uid
-    self.__dict__['mtime'] = common.FloatingPointTimestamp(pb.timestamp.mtime)  # because __setattr__ tramples mtime, this comes last
+    set_field(self, 'uid', pb.uid)
+    set_field(self, 'mtime', common.FloatingPointTimestamp(pb.timestamp.mtime))  # because __setattr__ tramples mtime, this comes last
+    self._MarkDirty()
+    if self._index is not None:
+      self._index.NoteTouched(self)
     if os.environ.get('DJANGO_DEBUG') == "True":
       # See comment above for why we don't run this in production.
-      assert (self.__dict__['mtime'] is None
-              or self.__dict__['ctime'] is None
-              or self.__dict__['mtime'] >= self.__dict__['ctime']), f'mtime < ctime: {self.__dict__}'
+      assert (self.mtime is None
+              or self.ctime is None
+              or self.mtime >= self.ctime), f'mtime < ctime: {self._Fields()}'
 
   def __str__(self):
     return self.__unicode__().encode('utf-8') if six.PY2 else self.__unicode__()
@@ -77,3 +77,22 @@ class SupportsTimestamps(Protocol):
 
 def MaxTime(auditable_obj: SupportsTimestamps) -> float:
   return max(0.0 if t is None else t for t in [auditable_obj.ctime, auditable_obj.mtime, auditable_obj.dtime])
+
+
+def _Varint(n: int) -> bytes:
+  """Returns the protobuf wire encoding of the nonnegative integer n."""
+  out = bytearray()
+  while n > 0x7f:
+    out.append((n & 0x7f) | 0x80)
+    n >>= 7
+  out.append(n)
+  return bytes(out)
+
+
+def LengthDelimitedField(field_number: int, payload: bytes) -> bytes:
+  """Returns the protobuf wire encoding of a length-delimited field (e.g., a submessage) with the given payload.
+
+  Protobuf messages may be concatenated, so this lets us splice together serialized submessages without reparsing
+  them.
+  """
+  return _Varint((field_number << 3) | 2) + _Varint(len(payload)) + payload
@@ -8,10 +8,12 @@ from __future__ import annotations
 from . import auditable_object
 from . import common
 from . import errors
+from . import item_list
 from . import pyatdl_pb2
+from . import traversal
 
 from google.protobuf import message
-from typing import Any, Iterator, List, Tuple, Type
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Type
 from typing_extensions import Protocol
 
 
@@ -42,6 +44,18 @@ def YieldDescendantsThatAreNotDeleted(root: Any) -> Iterator[object]:
       YieldDescendantsThatAreNotDeleted(item)
 
 
+def _ChildContainers(c: Container) -> List[Container]:
+  return [item for item in c.items if isinstance(item, Container)]
+
+
+class AggregateCounts(NamedTuple):
+  """Counts describing a Container's items and descendants. See Container.Aggregates."""
+  live_items: int  # items that are not deleted
+  incomplete_items: int  # items that can be completed (Actions and Prjs) but are neither complete nor deleted
+  incomplete_actions: int  # descendant Actions that are neither complete nor deleted
+  actionable_actions: int  # those of the incomplete_actions that have no Ctx or an active Ctx
+
+
 class Container(auditable_object.AuditableObject):
   """A Container contains either Containers or Actions, but not every
   Container may contain Actions and not every Contain may contain Containers.
@@ -54,9 +68,18 @@ class Container(auditable_object.AuditableObject):
     is_deleted: bool
     name: str|None
     note: str|None
-    items: [object]
+    items: ItemList  # of objects
+
+  A Container built lazily (see _InitLazily) keeps its items in a protocol
+  buffer until something first needs them. Reading 'items' builds them.
+
+  A Container also caches its serialization (see SerializedProtobuf) and its
+  Aggregates until it or a descendant changes. If a Container's cache is gone,
+  so are the caches of all its ancestors.
   """
 
+  _items_by_name: item_list.NameIndex
+
   @classmethod
   def TypesContained(cls) -> Tuple[Type[object]]:
     """Returns [type].  self.items will be restricted to items of the
@@ -66,24 +89,193 @@ class Container(auditable_object.AuditableObject):
 
   def __init__(self, *, the_uid: int = None, items: list = None, name: str = None, note: str = '') -> None:
     super().__init__(the_uid=the_uid)
+    self.__dict__['_items_by_name'] = item_list.NameIndex()
     self.items = list() if items is None else list(items)
     self.name = name
     self.note = note
 
+  def _InitWithoutHooks(self, *, name: str, note: str) -> None:
+    """The counterpart of __init__ for objects created by AuditableObject._NewWithoutHooks."""
+    d = self.__dict__
+    d['_items_by_name'] = item_list.NameIndex()
+    d['items'] = item_list.ItemList(self)
+    d['name'] = name
+    d['note'] = note
+
+  def _InitLazily(self, *, name: str, note: str, backing_pb: message.Message) -> None:
+    """Like _InitWithoutHooks, but our items stay in backing_pb until we are materialized.
+
+    The caller must already have noted the UIDs of the items (see uid.Factory.NoteExistingUID).
+    """
+    d = self.__dict__
+    d['_backing_pb'] = backing_pb
+    d['name'] = name
+    d['note'] = note
+
+  def IsMaterialized(self) -> bool:
+    """Returns False iff our items are still only in the protocol buffer from which we were lazily loaded."""
+    return '_backing_pb' not in self.__dict__
+
+  def MaterializedItems(self) -> List[Any]:
+    """Returns self.items if they exist already, else [], without materializing them."""
+    return self.__dict__.get('items', [])
+
+  def _BackingProtobuf(self) -> Optional[Any]:
+    """Returns the message holding our items if we are not yet materialized, else None."""
+    return self.__dict__.get('_backing_pb')
+
+  def __getattr__(self, name: str) -> Any:
+    # Python calls this only if normal lookup fails, e.g. for 'items' before we are materialized.
+    if name in ('items', '_items_by_name') and '_backing_pb' in self.__dict__:
+      self._Materialize()
+      return self.__dict__[name]
+    raise AttributeError(name)
+
+  def _Materialize(self) -> None:
+    """Builds our items from the protocol buffer given to _InitLazily."""
+    d = self.__dict__
+    backing_pb = d.pop('_backing_pb')
+    d['_items_by_name'] = item_list.NameIndex()
+    d['items'] = item_list.ItemList(self)
+    # This discards our cached serialization, if any, because our new items have none and a Container may have a cache
+    # only if its descendants do:
+    d['items'].extend(self._ItemsFromBackingProtobuf(backing_pb))
+
+  def _ItemsFromBackingProtobuf(self, pb: Any) -> List[Any]:
+    """Returns our items, built from the argument to _InitLazily. Override this if you use _InitLazily."""
+    raise NotImplementedError
+
+  def __setattr__(self, name: str, value: Any) -> None:
+    if name == 'items':
+      if not self.IsMaterialized():
+        self._Materialize()
+      old_items = self.__dict__.get('items', [])
+      value = item_list.ItemList(self, value)
+      super().__setattr__(name, value)
+      self._ItemsRemoved(item_list.IdentityDifference(old_items, value))
+      self._ItemsAdded(item_list.IdentityDifference(value, old_items))
+      return
+    super().__setattr__(name, value)
+
+  def _ItemsAdded(self, items: List[Any]) -> None:
+    """Called by our ItemList after items become our children."""
+    self._MarkDirty()
+    for item in items:
+      object.__setattr__(item, 'parent', self)
+    self._items_by_name.Add(items)
+    if self._index is not None:
+      for item in items:
+        self._index.Attach(item, self)
+
+  def _ItemsRemoved(self, items: List[Any]) -> None:
+    """Called by our ItemList after items stop being our children."""
+    self._MarkDirty()
+    for item in items:
+      if item.parent is self:  # else it already moved elsewhere
+        object.__setattr__(item, 'parent', None)
+    self._items_by_name.Remove(items)
+    if self._index is not None:
+      for item in items:
+        self._index.Detach(item, self)
+
+  def _ItemsReordered(self) -> None:
+    """Called by our ItemList after its items change order."""
+    self._MarkDirty()
+    if self._index is not None:
+      self._index.NoteReordered(self)
+
+  def _MarkDirty(self) -> None:
+    """Override. Discards our cached serialization and Aggregates and those of our ancestors."""
+    c: Optional[Container] = self
+    # Stop at the first Container without a cache because its ancestors have none either:
+    while c is not None:
+      d = c.__dict__
+      if d.get('_serialized') is None and d.get('_aggregates') is None:
+        break
+      d['_serialized'] = None
+      d['_aggregates'] = None
+      c = c.parent
+
+  def Aggregates(self) -> AggregateCounts:
+    """Returns counts of our live items, incomplete Actions, etc., in O(1) time if nothing changed since last time.
+
+    After a change, we recount only the Containers on the path from the change
+    to the root, and a Ctx becoming active or inactive means recounting
+    everything once. This materializes a lazily loaded Container and all its
+    descendants.
+    """
+    generation = None if self._index is None else self._index.ContextActivityGeneration()
+    cached = self.__dict__.get('_aggregates')
+    if cached is not None and cached[0] == generation:
+      return cached[1]
+
+    def StaleChildren(c: Container) -> List[Container]:
+      result = []
+      for item in c.items:
+        if isinstance(item, Container):
+          entry = item.__dict__.get('_aggregates')
+          if entry is None or entry[0] != generation:
+            result.append(item)
+      return result
+
+    stale = [c for c, unused_path in traversal.Preorder(self, StaleChildren)]
+    for c in reversed(stale):  # children first
+      c.__dict__['_aggregates'] = (generation, c._CountAggregates())
+    return self.__dict__['_aggregates'][1]
+
+  def _CountAggregates(self) -> AggregateCounts:
+    """Computes our Aggregates from our items, given the cached Aggregates of each child Container."""
+    live_items = incomplete_items = incomplete_actions = actionable_actions = 0
+    ctx_is_active: Dict[int, bool] = {}
+    for item in self.items:
+      if not item.is_deleted:
+        live_items += 1
+        if hasattr(item, 'is_complete') and not item.is_complete:
+          incomplete_items += 1
+      if isinstance(item, Container):
+        counts = item.__dict__['_aggregates'][1]
+        incomplete_actions += counts.incomplete_actions
+        actionable_actions += counts.actionable_actions
+      elif not item.is_deleted and not item.is_complete:  # an incomplete Action
+        incomplete_actions += 1
+        if item.ctx_uid is None:
+          actionable_actions += 1
+          continue
+        is_active = ctx_is_active.get(item.ctx_uid)
+        if is_active is None:
+          # A missing Ctx, or one we cannot look up because we are not in a ToDoList, counts as active:
+          context = None if self._index is None else self._index.ObjectByUID(item.ctx_uid)
+          is_active = ctx_is_active[item.ctx_uid] = getattr(context, 'is_active', True)
+        if is_active:
+          actionable_actions += 1
+    return AggregateCounts(live_items, incomplete_items, incomplete_actions, actionable_actions)
+
+  def SerializedProtobuf(self) -> bytes:
+    """Returns self.AsProto().SerializeToString(), reusing the cached serializations of unchanged descendants."""
+    raise NotImplementedError
+
+  def _ChildRenamed(self, item: Any, old_name: Optional[str]) -> None:
+    """Called by item after its name changes."""
+    self._items_by_name.Rename(item, old_name)
+
+  def ItemsNamed(self, name: Optional[str]) -> List[Any]:
+    """Returns our items having the given name, in order, without scanning all our items."""
+    return self._items_by_name.Named(name, self.items)
+
   def MergeCommonFrom(self, pb: common.TypeHavingCommon) -> None:
     if not hasattr(self, 'name') and hasattr(self, 'note'):
       raise AssertionError("All Containers have a name and note.")
+    old_name = self.__dict__['name']
     self.__dict__['name'] = pb.common.metadata.name
     self.__dict__['note'] = pb.common.metadata.note
+    if old_name != self.name:
+      self._NameChanged(old_name)
     super().MergeCommonFrom(pb)  # comes last to preserve mtime
 
   @classmethod
   def HasLiveDescendant(cls, item: Any) -> bool:
-    if hasattr(item, 'items'):
-      for subitem in item.items:
-        if not subitem.is_deleted:
-          return True
-    return False
+    """Returns True iff item is a Container with an undeleted item."""
+    return isinstance(item, Container) and item.Aggregates().live_items > 0
 
   def DeleteItemByUid(self, the_uid: int) -> None:
     old_length = len(self.items)
@@ -91,37 +283,46 @@ class Container(auditable_object.AuditableObject):
     if old_length - 1 != len(self.items):
       raise AssertionError(f"Cannot find the item with UID {the_uid} to delete.")
 
-  def PurgeDeleted(self) -> None:
-    self.items[:] = [item for item in self.items if not item.is_deleted or self.HasLiveDescendant(item)]
-    for item in self.items:
-      if hasattr(item, 'PurgeDeleted'):
-        item.PurgeDeleted()
+  def PurgeDeleted(self) -> List[Tuple[Any, Container]]:
+    """Removes the deleted items that have no undeleted descendants.
+
+    Returns:
+      [(item, parent Container)] for every item removed, including the descendants of removed Containers
+    """
+    purged: List[Tuple[Any, Container]] = []
+    for c, unused_path in self.ContainersPreorder():
+      kept = []
+      for item in c.items:
+        if not item.is_deleted or c.HasLiveDescendant(item):
+          kept.append(item)
+        else:
+          purged.append((item, c))
+      if len(kept) != len(c.items):
+        c.items[:] = kept
+    i = 0
+    while i < len(purged):  # purged grows as we go
+      item = purged[i][0]
+      if isinstance(item, Container):
+        purged.extend((child, item) for child in item.items)
+      i += 1
+    return purged
 
   def DeleteCompleted(self) -> None:
-    for item in self.items:
-      if hasattr(item, 'is_complete') and item.is_complete:
-        incomplete_descendant = False
-        if hasattr(item, 'items'):
-          for subitem in item.items:
-            if hasattr(subitem, 'is_complete') and not subitem.is_complete and not subitem.is_deleted:
-              incomplete_descendant = True
-              break
-        if not incomplete_descendant:
-          item.is_deleted = True
-      if hasattr(item, 'DeleteCompleted'):
-        item.DeleteCompleted()
-
-  def ContainersPreorder(self) -> Iterator[Tuple[Container, List[Container]]]:
+    for c, unused_path in self.ContainersPreorder():
+      for item in c.items:
+        if hasattr(item, 'is_complete') and item.is_complete:
+          if not isinstance(item, Container) or not item.Aggregates().incomplete_items:
+            item.is_deleted = True
+
+  def ContainersPreorder(self) -> Iterator[Tuple[Container, traversal.PathView]]:
     """Yields all containers, including itself, in a preorder traversal (itself first).
 
+    This is not recursive, so arbitrarily deep Folders are fine.
+
     Yields:
-      (Container, [Container])  # the first element in the list is the leaf
+      (Container, PathView)  # the first element in the path is the leaf, i.e. the parent
     """
-    yield (self, [])
-    for item in self.items:
-      if isinstance(item, Container):
-        for f, path in item.ContainersPreorder():
-          yield (f, list(path) + [self])
+    return traversal.Preorder(self, _ChildContainers)
 
   def TrulyDeleteByUid(self, *, uid: int) -> bool:
     for i, item in enumerate(self.items):
@@ -135,15 +336,11 @@ class Container(auditable_object.AuditableObject):
     return False
 
   def ForEachUidRecursively(self) -> Iterator[int]:
+    """Yields the UIDs of this Container and all Containers within it."""
     for cc, _ in self.ContainersPreorder():
       yield cc.uid
-      if cc is self:
-        continue
-      func = getattr(cc, 'ForEachUidRecursively', None)
-      if func is not None:
-        yield from func()
 
-  def Projects(self) -> Iterator[Tuple[Container, List[Container]]]:
+  def Projects(self) -> Iterator[Tuple[Container, Sequence[Container]]]:
     """Iterates recursively over all projects contained herein.
 
     Each Prj is yielded with its path (leaf first). If this container is itself
@@ -174,7 +371,8 @@ class Container(auditable_object.AuditableObject):
         'The suppposed "child" is not really a child of this container.'
         ' self=%s child=%s'
         % (str(self), str(child)))
-    for descendant in YieldDescendantsThatAreNotDeleted(child):
+    if self.HasLiveDescendant(child):
+      descendant = next(YieldDescendantsThatAreNotDeleted(child))
       raise IllegalOperationError(
         'Cannot delete because a descendant is not deleted.  descendant=\n%s'
         % str(descendant))
@@ -188,11 +386,15 @@ class Container(auditable_object.AuditableObject):
     Raises:
       AssertionError: Find a new programmer.
     """
-    for item in self.items:
-      if True not in [isinstance(item, t) for t in self.TypesContained()]:
-        raise AssertionError(
-          'An item is of type %s which is not an acceptable type (%s)'
-          % (str(type(item)), ', '.join(str(t) for t in self.TypesContained())))
+    for item in self.MaterializedItems():
+      self.CheckItemType(item)
+
+  def CheckItemType(self, item: Any) -> None:
+    """Raises AssertionError unless item is of a type we may contain."""
+    if True not in [isinstance(item, t) for t in self.TypesContained()]:
+      raise AssertionError(
+        'An item is of type %s which is not an acceptable type (%s)'
+        % (str(type(item)), ', '.join(str(t) for t in self.TypesContained())))
 
   def AsProto(self, pb: message.Message) -> message.Message:
     """Returns: pb."""
@@ -8,14 +8,16 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import six
+import sys
 
 from absl import flags  # type: ignore
 from google.protobuf import message
-from typing import Sequence, Type, TypeVar
+from typing import Any, List, Optional, Sequence, Type, TypeVar
 
 from . import auditable_object
 from . import common
 from . import errors
+from . import item_list
 from . import pyatdl_pb2
 from . import uid
 
@@ -49,6 +51,17 @@ class Ctx(auditable_object.AuditableObject):
     note: basestring
   """
 
+  # _ctx_list is the CtxList containing this Ctx, maintained by CtxList's ItemList and set via object.__setattr__.
+  # Ctxs have no parent; they inherit parent=None from AuditableObject.
+  __slots__ = ('uid', 'ctime', 'mtime', 'dtime', 'is_deleted', 'is_active', 'name', 'note', '_index', '_ctx_list')
+  _ctx_list: Optional['CtxList']
+
+  def __new__(cls, *args: Any, **kwargs: Any) -> 'Ctx':
+    c = super().__new__(cls)
+    object.__setattr__(c, '_index', None)
+    object.__setattr__(c, '_ctx_list', None)
+    return c
+
   def __init__(self, the_uid: int = None, name: str = None, is_active: bool = True, note: str = '') -> None:
     super().__init__(the_uid=the_uid)
     if not name:
@@ -57,6 +70,16 @@ class Ctx(auditable_object.AuditableObject):
     self.note = note
     self.is_active = is_active
 
+  def __setattr__(self, name: str, value: Any) -> None:
+    super().__setattr__(name, value)
+    if name == 'is_active' and self._index is not None:
+      self._index.NoteContextActivityChange()
+
+  def _NameChanged(self, old_name: Optional[str]) -> None:
+    """Override."""
+    if self._ctx_list is not None:
+      self._ctx_list._ChildRenamed(self, old_name)
+
   def __unicode__(self) -> str:
     uid_str = '' if not FLAGS.pyatdl_show_uid else ' uid=%s' % self.uid
     return '<context%s is_deleted="%s" is_active="%s" name="%s"/>' % (
@@ -79,10 +102,15 @@ class Ctx(auditable_object.AuditableObject):
     if not isinstance(other, pyatdl_pb2.Context):
       raise TypeError
     if common.MaxTimeOfPb(other) > common.MaxTime(self):
-      self.__dict__['is_active'] = other.is_active
+      if other.is_active != self.is_active and self._index is not None:
+        self._index.NoteContextActivityChange()
+      self._SetFields(is_active=other.is_active)
       self.MergeCommonFrom(other)
-      self.__dict__['name'] = other.common.metadata.name
-      self.__dict__['note'] = other.common.metadata.note
+      old_name = self.name
+      self._SetFields(name=sys.intern(other.common.metadata.name),
+                      note=sys.intern(other.common.metadata.note))
+      if old_name != self.name:
+        self._NameChanged(old_name)
 
   def AsProto(self, pb: message.Message = None) -> message.Message:
     # pylint: disable=maybe-no-member
@@ -109,11 +137,19 @@ class Ctx(auditable_object.AuditableObject):
     """
     if not bytestring:
       raise errors.DataError("A Context must be nonempty -- add a UID and name.")
-    pb = pyatdl_pb2.Context.FromString(bytestring)  # pylint: disable=no-member
-    c = cls(the_uid=pb.common.uid,
-            name=pb.common.metadata.name,
-            is_active=pb.is_active,
-            note=pb.common.metadata.note)
+    return cls.FromProtobufMessage(pyatdl_pb2.Context.FromString(bytestring))  # pylint: disable=no-member
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[T], pb: pyatdl_pb2.Context) -> T:
+    """Like DeserializedProtobuf but faster: starts from a parsed message and bypasses __setattr__."""
+    if not pb.ListFields():
+      raise errors.DataError("A Context must be nonempty -- add a UID and name.")
+    c = cls._NewWithoutHooks(pb.common)
+    if not pb.common.metadata.name:
+      raise errors.DataError("Every Context must have a name.")
+    c._SetFields(name=sys.intern(pb.common.metadata.name),
+                 note=sys.intern(pb.common.metadata.note),
+                 is_active=pb.is_active)
     c.SetFieldsBasedOnProtobuf(pb.common)  # must be last
     assert c.uid == pb.common.uid
     return c
@@ -126,15 +162,54 @@ class CtxList(object):
   """A list of Contexts.
 
   Fields:
-    items: [Ctx]
+    items: ItemList  # of Ctx
   """
 
+  _index: Optional[Any] = None  # see AuditableObject._index
+
   def __init__(self, items: Sequence[Ctx] = None, *, deserializing: bool = False) -> None:
     # this just simplifies the unittests because, once upon a time, a pyatdl_pb2.ContextList had a 'Common' message that had a UID:
     if not deserializing:
       uid.singleton_factory.NextUID(discarding=True)
 
-    self.items = list(items) if items is not None else []
+    self._items_by_name = item_list.NameIndex()
+    self.items = item_list.ItemList(self, [])
+    if items is not None:
+      self.items.extend(items)
+
+  def _ItemsAdded(self, items: List[Ctx]) -> None:
+    """Called by our ItemList after items join this list."""
+    for item in items:
+      object.__setattr__(item, '_ctx_list', self)
+    self._items_by_name.Add(items)
+    if self._index is not None:
+      for item in items:
+        self._index.Attach(item, self)
+      self._index.NoteContextActivityChange()
+
+  def _ItemsRemoved(self, items: List[Ctx]) -> None:
+    """Called by our ItemList after items leave this list."""
+    for item in items:
+      if item._ctx_list is self:
+        object.__setattr__(item, '_ctx_list', None)
+    self._items_by_name.Remove(items)
+    if self._index is not None:
+      for item in items:
+        self._index.Detach(item, self)
+      self._index.NoteContextActivityChange()
+
+  def _ItemsReordered(self) -> None:
+    """Called by our ItemList after its items change order."""
+    if self._index is not None:
+      self._index.NoteReordered(self)
+
+  def _ChildRenamed(self, item: Ctx, old_name: Optional[str]) -> None:
+    """Called by item after its name changes."""
+    self._items_by_name.Rename(item, old_name)
+
+  def ItemsNamed(self, name: str) -> List[Ctx]:
+    """Returns the Contexts having the given name, in order, without scanning all Contexts."""
+    return self._items_by_name.Named(name, self.items)
 
   def __unicode__(self) -> str:
     indented = common.Indented('\n'.join(six.text_type(c) for c in self.items))
@@ -151,13 +226,16 @@ class CtxList(object):
     Raises:
       NoSuchNameError
     """
-    for c in self.items:
-      if c.name == name:
-        return c.uid
+    for c in self.ItemsNamed(name):
+      return c.uid
     raise NoSuchNameError('No Context is named "%s"' % name)
 
-  def PurgeDeleted(self) -> None:
-    self.items[:] = [item for item in self.items if not item.is_deleted]
+  def PurgeDeleted(self) -> List[Ctx]:
+    """Removes the deleted Ctxs and returns them."""
+    purged = [item for item in self.items if item.is_deleted]
+    if purged:
+      self.items[:] = [item for item in self.items if not item.is_deleted]
+    return purged
 
   def AsProto(self, pb: pyatdl_pb2.ContextList = None) -> pyatdl_pb2.ContextList:
     if pb is None:
@@ -173,8 +251,11 @@ class CtxList(object):
     """Deserializes a CtxList from the given protocol buffer."""
     if not bytestring:
       raise errors.DataError("A ContextList must be nonempty -- add a UID.")
-    pb = pyatdl_pb2.ContextList.FromString(bytestring)
+    return cls.FromProtobufMessage(pyatdl_pb2.ContextList.FromString(bytestring))
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[U], pb: pyatdl_pb2.ContextList) -> U:
+    """Like DeserializedProtobuf but faster: starts from a parsed message."""
     cl = cls(deserializing=True)
-    for pbc in pb.contexts:
-      cl.items.append(Ctx.DeserializedProtobuf(pbc.SerializeToString()))
+    cl.items.extend(Ctx.FromProtobufMessage(pbc) for pbc in pb.contexts)
     return cl
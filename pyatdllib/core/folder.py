@@ -17,6 +17,7 @@ from . import container
 from . import errors
 from . import prj
 from . import pyatdl_pb2
+from . import traversal
 
 FLAGS = flags.FLAGS
 
@@ -64,7 +65,7 @@ class Folder(container.Container):
   def IsDone(self) -> bool:
     return self.is_deleted
 
-  def Projects(self) -> Iterator[Tuple[prj.Prj, List[container.Container]]]:
+  def Projects(self) -> Iterator[Tuple[prj.Prj, traversal.PathView]]:
     """Override."""
     for c, path in self.ContainersPreorder():
       if isinstance(c, prj.Prj):
@@ -75,16 +76,86 @@ class Folder(container.Container):
       pb = pyatdl_pb2.Folder()
     if not isinstance(pb, pyatdl_pb2.Folder):
       raise TypeError
+    # Not recursive, so arbitrarily deep Folders are fine:
+    stack = [(self, pb)]
+    while stack:
+      f, f_pb = stack.pop()
+      f._AsProtoWithoutItems(f_pb)
+      backing_pb = f._BackingProtobuf()
+      if backing_pb is not None:  # untouched since we loaded them
+        f_pb.folders.extend(backing_pb.folders)
+        f_pb.projects.extend(backing_pb.projects)
+        continue
+      for i in f.items:
+        if isinstance(i, prj.Prj):
+          i.AsProto(f_pb.projects.add())
+        else:
+          assert isinstance(i, Folder), (type(i), str(i))
+          stack.append((i, f_pb.folders.add()))
+    return pb
+
+  def ProtobufNestingDepth(self) -> int:
+    """Returns how deeply messages nest within self.AsProto(), counting the pyatdl.Folder itself as depth 1.
+
+    We assume that each Prj holds an Action with a timestamp, so a Prj adds
+    three levels below itself. We do not materialize Folders loaded lazily.
+    """
+    deepest = 0
+    stack: List[Tuple[Union[Folder, pyatdl_pb2.Folder], int]] = [(self, 1)]
+    while stack:
+      f, depth = stack.pop()
+      if isinstance(f, Folder):
+        backing_pb = f._BackingProtobuf()
+        if backing_pb is not None:  # untouched since we loaded it
+          stack.append((backing_pb, depth))
+          continue
+        subfolders: List[Union[Folder, pyatdl_pb2.Folder]] = [i for i in f.items if isinstance(i, Folder)]
+        has_projects = len(subfolders) < len(f.items)
+      else:
+        subfolders = list(f.folders)
+        has_projects = len(f.projects) > 0
+      # Below f come f.common.timestamp and f.projects[i].actions[j].common.timestamp:
+      deepest = max(deepest, depth + (4 if has_projects else 2))
+      stack.extend((sub, depth + 1) for sub in subfolders)
+    return deepest
+
+  def SerializedProtobuf(self) -> bytes:
+    """Override.
+
+    Folders and Projects are length-delimited submessages, so we concatenate their cached serializations. Only the
+    Folders that changed since they were last serialized are encoded anew, bottom up and without recursion.
+    """
+    def Dirty(f: Folder) -> bool:
+      return f.__dict__.get('_serialized') is None
+
+    def DirtyMaterializedSubfolders(f: Folder) -> List[Folder]:
+      return [i for i in f.items if isinstance(i, Folder) and Dirty(i) and i.IsMaterialized()]
+
+    if not Dirty(self):
+      return self.__dict__['_serialized']
+    if not self.IsMaterialized():
+      self.__dict__['_serialized'] = self.AsProto().SerializeToString()
+      return self.__dict__['_serialized']
+    dirty_folders = [f for f, unused_path in traversal.Preorder(self, DirtyMaterializedSubfolders)]
+    for f in reversed(dirty_folders):  # children before parents
+      header = pyatdl_pb2.Folder()
+      f._AsProtoWithoutItems(header)
+      parts = [header.SerializeToString()]
+      for i in f.items:
+        if isinstance(i, Folder):
+          if Dirty(i):  # not materialized, else we would have handled it already
+            i.__dict__['_serialized'] = i.AsProto().SerializeToString()
+          parts.append(common.LengthDelimitedField(pyatdl_pb2.Folder.FOLDERS_FIELD_NUMBER, i.__dict__['_serialized']))
+      for i in f.items:
+        if isinstance(i, prj.Prj):
+          parts.append(common.LengthDelimitedField(pyatdl_pb2.Folder.PROJECTS_FIELD_NUMBER, i.SerializedProtobuf()))
+      f.__dict__['_serialized'] = b''.join(parts)
+    return self.__dict__['_serialized']
+
+  def _AsProtoWithoutItems(self, pb: pyatdl_pb2.Folder) -> None:
     super().AsProto(pb.common)
     if self.note:
       pb.common.metadata.note = self.note
-    for i in self.items:
-      if isinstance(i, prj.Prj):
-        i.AsProto(pb.projects.add())
-      else:
-        assert isinstance(i, Folder), (type(i), str(i))
-        i.AsProto(pb.folders.add())
-    return pb
 
   def MergeFromProto(self,
                      other: pyatdl_pb2.Folder,
@@ -104,8 +175,7 @@ class Folder(container.Container):
     def HandleFolders() -> None:
       for other_subfolder in other.folders:
         def AddOtherSubfolderHere():
-          new_item = type(self).DeserializedProtobuf(
-            other_subfolder.SerializeToString())
+          new_item = type(self).FromProtobufMessage(other_subfolder)
           for uu in new_item.ForEachUidRecursively():
             truly_delete_by_uid(uid=uu)
           self.items.append(new_item)
@@ -147,8 +217,7 @@ class Folder(container.Container):
         else:
           existing_project, path = existing_project_and_path
         if existing_project is None:
-          new_prj_item = prj.Prj.DeserializedProtobuf(
-            other_project.SerializeToString())
+          new_prj_item = prj.Prj.FromProtobufMessage(other_project)
           for uu in new_prj_item.ForEachUidRecursively():
             truly_delete_by_uid(uid=uu)
           self.items.append(new_prj_item)
@@ -177,8 +246,7 @@ class Folder(container.Container):
           # No, do not old_folder_in_db.NoteModification() because the folder's mtime should ignore its items
 
           # add here:
-          moved_prj = prj.Prj.DeserializedProtobuf(
-            other_project.SerializeToString())
+          moved_prj = prj.Prj.FromProtobufMessage(other_project)
           moved_prj.MergeFromProto(
             existing_project.AsProto(),
             mtimes_by_uid_in_remote_to_do_list=mtimes_by_uid_in_remote_to_do_list,
@@ -196,15 +264,52 @@ class Folder(container.Container):
     """Deserializes a Folder from the given protocol buffer."""
     if not bytestring:
       raise errors.DataError("empty folder in the protocol buffer -- not even a UID is present")
-    pb = pyatdl_pb2.Folder.FromString(bytestring)  # pylint: disable=no-member
-    p = cls(the_uid=pb.common.uid,
-            name=pb.common.metadata.name,
-            note=pb.common.metadata.note)
-    for pb_folder in pb.folders:
-      p.items.append(
-        cls.DeserializedProtobuf(pb_folder.SerializeToString()))
-    for pb_project in pb.projects:
-      p.items.append(
-        prj.Prj.DeserializedProtobuf(pb_project.SerializeToString()))
-    p.SetFieldsBasedOnProtobuf(pb.common)  # must be last
-    return p
+    return cls.FromProtobufMessage(pyatdl_pb2.Folder.FromString(bytestring))  # pylint: disable=no-member
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[T], pb: pyatdl_pb2.Folder, *, lazy: bool = False) -> T:
+    """Like DeserializedProtobuf but faster: starts from a parsed message and bypasses __setattr__.
+
+    Args:
+      pb: pyatdl_pb2.Folder
+      lazy: bool  # If true, the items are built only when first needed (see Container.IsMaterialized), and the caller
+                  # must already have noted the UIDs of pb and its descendants (see uid.Factory.NoteExistingUID).
+    """
+    if lazy:
+      if not pb.ListFields():
+        raise errors.DataError("empty folder in the protocol buffer -- not even a UID is present")
+      lazy_folder = cls._NewWithoutHooks(pb.common, note_uid=False)
+      lazy_folder._InitLazily(name=pb.common.metadata.name, note=pb.common.metadata.note, backing_pb=pb)
+      lazy_folder.SetFieldsBasedOnProtobuf(pb.common)  # must be last
+      return lazy_folder
+
+    def NewFolder(folder_pb: pyatdl_pb2.Folder) -> T:
+      if not folder_pb.ListFields():
+        raise errors.DataError("empty folder in the protocol buffer -- not even a UID is present")
+      f = cls._NewWithoutHooks(folder_pb.common)
+      f._InitWithoutHooks(name=folder_pb.common.metadata.name, note=folder_pb.common.metadata.note)
+      return f
+
+    # This emulates a recursive descent (in the same order, which matters for UID duplication errors) with an explicit
+    # stack of [Folder, pyatdl_pb2.Folder, index of the next subfolder] so that arbitrarily deep Folders are fine.
+    root = NewFolder(pb)
+    stack: List[List] = [[root, pb, 0]]
+    while stack:
+      frame = stack[-1]
+      p, p_pb, i = frame
+      if i < len(p_pb.folders):
+        frame[2] += 1
+        stack.append([NewFolder(p_pb.folders[i]), p_pb.folders[i], 0])
+        continue
+      p.items.extend(prj.Prj.FromProtobufMessage(pb_project) for pb_project in p_pb.projects)
+      p.SetFieldsBasedOnProtobuf(p_pb.common)  # must be last
+      stack.pop()
+      if stack:
+        stack[-1][0].items.append(p)
+    return root
+
+  def _ItemsFromBackingProtobuf(self, pb: pyatdl_pb2.Folder) -> List[Union[Folder, prj.Prj]]:
+    """Override. Our subfolders and projects are themselves lazy."""
+    items: List[Union[Folder, prj.Prj]] = [type(self).FromProtobufMessage(pb_folder, lazy=True) for pb_folder in pb.folders]
+    items.extend(prj.Prj.FromProtobufMessage(pb_project, lazy=True) for pb_project in pb.projects)
+    return items
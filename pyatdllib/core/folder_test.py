@@ -55,6 +55,29 @@ class FolderTestCase(unitjest.TestCase):
 </folder>
 """.strip()])
 
+  def testDeepFolders(self):
+    depth = 5000  # deeper than the recursion limit
+    outer = folder.Folder(name='outer')
+    parent = outer
+    for i in range(depth):
+      f = folder.Folder(name='f%d' % i)
+      parent.items.append(f)
+      parent = f
+    parent.items.append(unitjest.FullPrj())
+    pairs = list(outer.ContainersPreorder())
+    self.assertEqual(len(pairs), depth + 2)
+    self.assertEqual(pairs[0], (outer, []))
+    self.assertEqual(pairs[2][1], [outer.items[0], outer])
+    self.assertIs(pairs[-1][1][0], parent)
+    self.assertEqual(len(pairs[-1][1]), depth + 1)
+    self.assertEqual([p.name for p, _ in outer.Projects()], ['myname'])
+    pb = outer.AsProto()
+    innermost = pb
+    for _ in range(depth):
+      innermost = innermost.folders[0]
+    self.assertEqual(innermost.projects[0].common.metadata.name, 'myname')
+    self.assertEqual(len(list(outer.ForEachUidRecursively())), depth + 2)
+
 
 if __name__ == '__main__':
   unitjest.main()
@@ -0,0 +1,86 @@
+"""Defines FragmentCache, a bounded LRU cache of rendered fragments such as a Prj's lines of TaskPaper.
+
+A web worker loads a fresh ToDoList for every request, yet most Prjs and
+Actions look the same as last time. FRAGMENTS, shared by every command in the
+process, remembers how we rendered them.
+
+Each key names the object (its UID and mtime), the render mode, and every other
+input to the fragment, including the fields shown. mtime alone would not do:
+the clock may stand still (see command 'chclock'), a Prj's mtime ignores
+changes to its Actions, and two ToDoLists may share UIDs. A hit is therefore
+always correct, and a modified object (see NoteModification) simply misses
+until its old fragments fall out of the cache.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import collections
+import threading
+
+from absl import flags  # type: ignore
+from typing import Any, Callable, Hashable, TypeVar
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer(
+    'pyatdl_fragment_cache_size', 10000,
+    'How many rendered fragments (e.g., a Project as TaskPaper or an Action as JSON) to remember. Zero disables the '
+    'cache.')
+
+T = TypeVar('T')
+
+
+class FragmentCache(object):
+  """A bounded LRU map from key to fragment. Treat the fragments as immutable.
+
+  Fields:
+    hits: int
+    misses: int
+  """
+
+  def __init__(self) -> None:
+    self._fragments: 'collections.OrderedDict[Hashable, Any]' = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self) -> int:
+    return len(self._fragments)
+
+  def Get(self, key: Hashable, render: Callable[[], T]) -> T:
+    """Returns the fragment for key, calling render() to create it if we do not have it.
+
+    Args:
+      key: Hashable  # See the module docstring.
+      render: lambda: fragment
+    Returns:
+      fragment
+    """
+    max_size = FLAGS.pyatdl_fragment_cache_size
+    if max_size <= 0:
+      return render()
+    with self._lock:
+      fragment = self._fragments.get(key, self)
+      if fragment is not self:
+        self._fragments.move_to_end(key)
+        self.hits += 1
+        return fragment
+    fragment = render()
+    with self._lock:
+      self.misses += 1
+      self._fragments[key] = fragment
+      while len(self._fragments) > max_size:
+        self._fragments.popitem(last=False)
+    return fragment
+
+  def Clear(self) -> None:
+    """Forgets all fragments."""
+    with self._lock:
+      self._fragments.clear()
+      self.hits = 0
+      self.misses = 0
+
+
+FRAGMENTS = FragmentCache()
@@ -0,0 +1,87 @@
+"""Unittests for module 'fragment_cache'."""
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import fragment_cache
+from pyatdllib.core import prj
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+
+
+FLAGS = flags.FLAGS
+
+
+class FragmentCacheTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    self._saved_size = FLAGS.pyatdl_fragment_cache_size
+    fragment_cache.FRAGMENTS.Clear()
+
+  def tearDown(self):
+    FLAGS.pyatdl_fragment_cache_size = self._saved_size
+    super().tearDown()
+
+  def testLeastRecentlyUsedAreEvicted(self):
+    FLAGS.pyatdl_fragment_cache_size = 2
+    cache = fragment_cache.FragmentCache()
+    renders = []
+
+    def Render(value):
+      def F():
+        renders.append(value)
+        return value
+      return F
+
+    self.assertEqual(cache.Get('a', Render(1)), 1)
+    self.assertEqual(cache.Get('b', Render(2)), 2)
+    self.assertEqual(cache.Get('a', Render(-1)), 1)
+    self.assertEqual(cache.Get('c', Render(3)), 3)  # evicts 'b'
+    self.assertEqual(len(cache), 2)
+    self.assertEqual(cache.Get('b', Render(4)), 4)  # evicts 'a'
+    self.assertEqual(cache.Get('c', Render(-1)), 3)
+    self.assertEqual(renders, [1, 2, 3, 4])
+    self.assertEqual((cache.hits, cache.misses), (2, 4))
+    FLAGS.pyatdl_fragment_cache_size = 0
+    self.assertEqual(cache.Get('a', Render(5)), 5)
+    cache.Clear()
+    self.assertEqual(len(cache), 0)
+
+  def testTaskPaperOfUnchangedPrjsIsReused(self):
+    FLAGS.pyatdl_separator = '/'
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    p = prj.Prj(name='p')
+    lst.AddProjectOrFolder(p)
+    for name in ('a0', 'a1'):
+      p.items.append(action.Action(name=name, ctx_uid=home_uid))
+      p.items[-1].mtime = 0  # as if the clock stood still
+
+    def TaskPaper():
+      lines = []
+      lst.AsTaskPaper(lines, show_project=lambda x: x is p, cache_key='all notes')
+      uncached = []
+      lst.AsTaskPaper(uncached, show_project=lambda x: x is p)
+      self.assertEqual(lines, uncached)
+      return lines
+
+    self.assertEqual(TaskPaper(), ['', 'p:', '\t- a0 @home', '\t- a1 @home'])
+    self.assertEqual(fragment_cache.FRAGMENTS.misses, 1)
+    TaskPaper()
+    self.assertEqual(fragment_cache.FRAGMENTS.hits, 1)
+    p.items[0].name = 'b0'
+    p.items[0].mtime = 0
+    self.assertEqual(TaskPaper(), ['', 'p:', '\t- b0 @home', '\t- a1 @home'])
+    lst.ContextByUID(home_uid).name = '@house'
+    self.assertEqual(TaskPaper(), ['', 'p:', '\t- b0 @house', '\t- a1 @house'])
+    p.items.remove(p.items[1])
+    self.assertEqual(TaskPaper(), ['', 'p:', '\t- b0 @house'])
+    self.assertEqual(fragment_cache.FRAGMENTS.misses, 4)
+
+
+if __name__ == '__main__':
+  unitjest.main()
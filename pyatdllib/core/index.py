@@ -0,0 +1,374 @@
+"""Defines Index, which finds any object in a ToDoList by UID without a traversal.
+
+A ToDoList owns exactly one Index. Every object reachable from the ToDoList
+(Folders, Prjs, Actions, Ctxs, and the CtxList itself) holds a reference to the
+Index in its '_index' attribute, and the ItemLists (see module 'item_list') of
+those objects attach and detach items as they come and go.
+
+The mergeprotobufs API temporarily allows two objects with the same UID (see
+uid.Factory's allow_duplication) and moves an object by adding it to its new
+parent before removing it from the old parent, so we track every (object,
+parent) pair and not merely one object per UID.
+
+We also index Actions by their ctx_uid (see ActionsInContext). Action notifies
+us when its ctx_uid changes.
+
+A lazily loaded ToDoList has Containers whose items are not yet materialized
+(see Container.IsMaterialized). We know only the UIDs of such items and of their
+parents (see NoteUnmaterialized). Looking up such a UID materializes the
+Containers on the path to it, and whole-list queries like ActionsInContext
+materialize everything.
+
+Containers cache counts of incomplete and actionable Actions (see
+Container.Aggregates), and whether an Action is actionable depends on its Ctx.
+We count the changes to Ctxs' activity (see ContextActivityGeneration) so that
+those caches can tell when they are stale.
+
+Searches use a TextIndex of names and notes, RecentActivity uses an
+ActivityIndex ordering objects by their latest timestamp, and ProjectsToReview
+uses a ReviewQueue ordering Prjs by when they need review. We build each on
+demand and then keep it up to date (see TextIndex, ActivityIndex, and
+ReviewQueue).
+
+We count modifications so that a checksum of the ToDoList's serialization,
+noted when the ToDoList was loaded, can identify the ToDoList until something
+changes (see ChecksumIfUnmodified). Materializing a lazily loaded Container is
+not a modification.
+
+Finally, we keep a journal of the objects attached or modified, and the UIDs
+detached, since ToDoList last checked its invariants, so that it need not
+check the objects nobody touched (see ToDoList.CheckChangesAreWellFormed).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from . import activity_index
+from . import review_queue
+from . import text_index
+
+
+Entry = Tuple[Any, Any]  # (object, parent) where parent is None for the inbox, the root Folder, and the CtxList
+
+
+def _IsProject(obj: Any) -> bool:
+  return hasattr(obj, 'max_seconds_before_review')
+
+
+def _MaterializedChildren(obj: Any) -> Optional[List[Any]]:
+  """Returns obj.items without materializing a lazily loaded Container."""
+  d = getattr(obj, '__dict__', None)
+  return None if d is None else d.get('items')
+
+
+class Index(object):
+  """Maps UIDs to (object, parent) pairs."""
+
+  def __init__(self) -> None:
+    self._entry_by_uid: Dict[int, Entry] = {}
+    # Rarely used: the second, third, ... pairs for a UID:
+    self._more_entries_by_uid: Dict[int, List[Entry]] = {}
+    # ctx_uid (None for actions without a context) => {id(action): action}:
+    self._actions_by_ctx_uid: Dict[Optional[int], Dict[int, Any]] = {}
+    # UID of an object not yet materialized => UID of its parent:
+    self._unmaterialized_parent_uid: Dict[int, int] = {}
+    # The journal: id(object) => object for objects attached or modified since the last ClearJournal, and the UIDs
+    # of objects detached since then:
+    self._touched: Dict[int, Any] = {}
+    self._detached_uids: Set[int] = set()
+    self._ctx_activity_generation = 0
+    self._text_index: Optional[text_index.TextIndex] = None
+    self._activity_index: Optional[activity_index.ActivityIndex] = None
+    self._review_queue: Optional[review_queue.ReviewQueue] = None
+    self._num_modifications = 0
+    self._checksum: Optional[Tuple[str, int]] = None  # (checksum, self._num_modifications at the time)
+
+  def __len__(self) -> int:
+    self.MaterializeAll()
+    return len(self._entry_by_uid)
+
+  def NoteUnmaterialized(self, the_uid: int, parent_uid: int) -> None:
+    """Call this for each descendant of a lazily loaded Container that we have not yet indexed."""
+    self._unmaterialized_parent_uid[the_uid] = parent_uid
+
+  def _Materialize(self, the_uid: int) -> None:
+    """Materializes the Containers on the path to the given UID, if it is the UID of an unmaterialized object."""
+    path = []  # leaf first, ending with an indexed object
+    u = the_uid
+    while u not in self._entry_by_uid:
+      if u not in self._unmaterialized_parent_uid:  # no such object, or its ancestor is no longer in the ToDoList
+        return
+      u = self._unmaterialized_parent_uid.pop(u)
+      path.append(u)
+    for u in reversed(path):
+      entry = self._entry_by_uid.get(u)
+      if entry is None:
+        return
+      getattr(entry[0], 'items', None)  # materializes, which indexes the children
+
+  def MaterializeAll(self) -> None:
+    """Materializes every object in the ToDoList."""
+    while self._unmaterialized_parent_uid:
+      the_uid = next(iter(self._unmaterialized_parent_uid))
+      self._Materialize(the_uid)
+      self._unmaterialized_parent_uid.pop(the_uid, None)
+
+  def Contains(self, the_uid: int) -> bool:
+    """Returns True iff an object with the given UID exists, without materializing it."""
+    return the_uid in self._entry_by_uid or the_uid in self._unmaterialized_parent_uid
+
+  def DuplicatedUIDs(self) -> List[int]:
+    """Returns the UIDs of objects that are in more than one place or that share a UID with another object."""
+    return list(self._more_entries_by_uid)
+
+  def NoteTouched(self, obj: Any) -> None:
+    """Call this after modifying obj, an indexed object."""
+    self._touched[id(obj)] = obj
+    self._num_modifications += 1
+    if self._text_index is not None:
+      self._text_index.Add(obj)
+    if self._review_queue is not None and _IsProject(obj):
+      self._review_queue.Add(obj)
+    self.NoteActivity(obj)
+
+  def NoteActivity(self, obj: Any) -> None:
+    """Call this after changing the ctime, mtime, or dtime of obj, an indexed object."""
+    if self._activity_index is not None and getattr(obj, 'uid', None) is not None:
+      self._activity_index.Add(obj)
+
+  def NoteReordered(self, obj: Any) -> None:
+    """Call this after the items of obj, an indexed Container or CtxList, change order."""
+    self._touched[id(obj)] = obj
+    self._num_modifications += 1
+
+  def NoteChecksum(self, checksum: str) -> None:
+    """Call this with a checksum of the serialization of the ToDoList as it is now."""
+    self._checksum = (checksum, self._num_modifications)
+
+  def ChecksumIfUnmodified(self) -> Optional[str]:
+    """Returns the argument to the last NoteChecksum unless we attached, detached, or modified an object since."""
+    if self._checksum is None or self._checksum[1] != self._num_modifications:
+      return None
+    return self._checksum[0]
+
+  def TextIndex(self) -> text_index.TextIndex:
+    """Returns the TextIndex of the names and notes of every object, building it if this is the first call."""
+    if self._text_index is None:
+      self.MaterializeAll()
+      the_text_index = text_index.TextIndex()
+      for o, _ in self._entry_by_uid.values():
+        the_text_index.Add(o)
+      for entries in self._more_entries_by_uid.values():
+        for o, _ in entries:
+          the_text_index.Add(o)
+      self._text_index = the_text_index
+    return self._text_index
+
+  def ActivityIndex(self) -> activity_index.ActivityIndex:
+    """Returns the ActivityIndex of every object, building it if this is the first call."""
+    if self._activity_index is None:
+      self.MaterializeAll()
+      objects = [o for o, _ in self._entry_by_uid.values()]
+      for entries in self._more_entries_by_uid.values():
+        objects.extend(o for o, _ in entries)
+      the_activity_index = activity_index.ActivityIndex()
+      the_activity_index.AddAll(objects)
+      self._activity_index = the_activity_index
+    return self._activity_index
+
+  def ReviewQueue(self) -> review_queue.ReviewQueue:
+    """Returns the ReviewQueue of every Prj, building it if this is the first call."""
+    if self._review_queue is None:
+      self.MaterializeAll()
+      projects = [o for o, _ in self._entry_by_uid.values() if _IsProject(o)]
+      for entries in self._more_entries_by_uid.values():
+        projects.extend(o for o, _ in entries if _IsProject(o))
+      the_review_queue = review_queue.ReviewQueue()
+      the_review_queue.AddAll(projects)
+      self._review_queue = the_review_queue
+    return self._review_queue
+
+  def NoteContextActivityChange(self) -> None:
+    """Call this after a Ctx becomes active or inactive, or after Ctxs come or go."""
+    self._ctx_activity_generation += 1
+
+  def ContextActivityGeneration(self) -> int:
+    """Returns a number that changes whenever NoteContextActivityChange is called."""
+    return self._ctx_activity_generation
+
+  def Journal(self) -> Tuple[List[Any], Set[int]]:
+    """Returns (the indexed objects attached or modified, the UIDs detached) since the last ClearJournal."""
+    return list(self._touched.values()), set(self._detached_uids)
+
+  def ClearJournal(self) -> None:
+    self._touched.clear()
+    self._detached_uids.clear()
+
+  def Entries(self, the_uid: int) -> Iterator[Entry]:
+    """Yields all (object, parent) pairs with the given UID, usually zero or one."""
+    entry = self.Lookup(the_uid)
+    if entry is None:
+      return
+    yield entry
+    yield from self._more_entries_by_uid.get(the_uid, ())
+
+  def Lookup(self, the_uid: int) -> Optional[Entry]:
+    """Returns the (object, parent) pair for the given UID or None if no such object exists."""
+    entry = self._entry_by_uid.get(the_uid)
+    if entry is None and the_uid in self._unmaterialized_parent_uid:
+      self._Materialize(the_uid)
+      entry = self._entry_by_uid.get(the_uid)
+    return entry
+
+  def ObjectByUID(self, the_uid: int) -> Optional[Any]:
+    entry = self.Lookup(the_uid)
+    return None if entry is None else entry[0]
+
+  def ParentOf(self, obj: Any) -> Optional[Any]:
+    """Returns the parent of obj, or None if obj is a top-level object.
+
+    Raises:
+      KeyError: obj is not in this index
+    """
+    for o, parent in self.Entries(obj.uid):
+      if o is obj:
+        return parent
+    raise KeyError(obj.uid)
+
+  def Path(self, obj: Any) -> List[Any]:
+    """Returns obj's ancestors, leaf first, like Container.ContainersPreorder does.
+
+    Raises:
+      KeyError: obj is not in this index
+    """
+    path = []
+    parent = self.ParentOf(obj)
+    while parent is not None:
+      path.append(parent)
+      parent = self.ParentOf(parent)
+    return path
+
+  def ActionsInContext(self, ctx_uid: Optional[int]) -> List[Any]:
+    """Returns the Actions with the given ctx_uid, in no particular order.
+
+    Args:
+      ctx_uid: int|None  # For None, we return actions without a context.
+    """
+    self.MaterializeAll()
+    return list(self._actions_by_ctx_uid.get(ctx_uid, {}).values())
+
+  def MaterializedActionsInContext(self, ctx_uid: Optional[int]) -> List[Any]:
+    """Like ActionsInContext but omits the Actions not yet materialized rather than materializing them."""
+    return list(self._actions_by_ctx_uid.get(ctx_uid, {}).values())
+
+  def NoteContextChange(self, an_action: Any, old_ctx_uid: Optional[int]) -> None:
+    """Call this after an_action.ctx_uid changes."""
+    if old_ctx_uid == an_action.ctx_uid:
+      return
+    self._RemoveFromContext(an_action, old_ctx_uid)
+    self._actions_by_ctx_uid.setdefault(an_action.ctx_uid, {})[id(an_action)] = an_action
+
+  def _RemoveFromContext(self, an_action: Any, ctx_uid: Optional[int]) -> None:
+    actions = self._actions_by_ctx_uid.get(ctx_uid)
+    if actions is not None:
+      actions.pop(id(an_action), None)
+      if not actions:
+        del self._actions_by_ctx_uid[ctx_uid]
+
+  def Attach(self, obj: Any, parent: Any) -> None:
+    """Indexes obj and all its descendants. Call this after making obj a child of parent."""
+    if getattr(obj, 'uid', None) not in self._unmaterialized_parent_uid:  # else we are materializing obj
+      self._num_modifications += 1
+    stack = [(obj, parent)]
+    while stack:
+      o, p = stack.pop()
+      if not self._Add(o, p):
+        continue
+      if self._unmaterialized_parent_uid:
+        self._unmaterialized_parent_uid.pop(getattr(o, 'uid', None), None)
+      object.__setattr__(o, '_index', self)
+      self._touched[id(o)] = o
+      if self._text_index is not None and getattr(o, 'uid', None) is not None:
+        self._text_index.Add(o)
+      if self._activity_index is not None and getattr(o, 'uid', None) is not None:
+        self._activity_index.Add(o)
+      if self._review_queue is not None and _IsProject(o):
+        self._review_queue.Add(o)
+      if hasattr(o, 'ctx_uid'):
+        self._actions_by_ctx_uid.setdefault(o.ctx_uid, {})[id(o)] = o
+      children = _MaterializedChildren(o)
+      if children:
+        stack.extend((child, o) for child in children)
+
+  def Detach(self, obj: Any, parent: Any) -> None:
+    """Unindexes obj and all its descendants. Call this after removing obj from parent."""
+    self._num_modifications += 1
+    stack = [(obj, parent)]
+    while stack:
+      o, p = stack.pop()
+      if not self._Remove(o, p):
+        continue
+      object.__setattr__(o, '_index', None)
+      self._touched.pop(id(o), None)
+      if self._text_index is not None:
+        self._text_index.Remove(o)
+      if self._activity_index is not None:
+        self._activity_index.Remove(o)
+      if self._review_queue is not None:
+        self._review_queue.Remove(o)
+      the_uid = getattr(o, 'uid', None)
+      if the_uid is not None:
+        self._detached_uids.add(the_uid)
+      if hasattr(o, 'ctx_uid'):
+        self._RemoveFromContext(o, o.ctx_uid)
+      children = _MaterializedChildren(o)
+      if children:
+        stack.extend((child, o) for child in children)
+
+  def _Add(self, obj: Any, parent: Any) -> bool:
+    """Returns True iff obj was not previously indexed under any parent."""
+    the_uid = getattr(obj, 'uid', None)
+    if the_uid is None:  # a CtxList
+      return True
+    entry = self._entry_by_uid.get(the_uid)
+    if entry is None:
+      self._entry_by_uid[the_uid] = (obj, parent)
+      return True
+    already_present = False
+    for o, p in self.Entries(the_uid):
+      if o is obj:
+        if p is parent:
+          return False
+        already_present = True
+    self._more_entries_by_uid.setdefault(the_uid, []).append((obj, parent))
+    return not already_present
+
+  def _Remove(self, obj: Any, parent: Any) -> bool:
+    """Returns True iff obj is no longer indexed under any parent."""
+    the_uid = getattr(obj, 'uid', None)
+    if the_uid is None:  # a CtxList
+      return True
+    entry = self._entry_by_uid.get(the_uid)
+    if entry is None:
+      return False
+    more = self._more_entries_by_uid.get(the_uid)
+    if entry[0] is obj and entry[1] is parent:
+      if more:
+        self._entry_by_uid[the_uid] = more.pop(0)
+      else:
+        del self._entry_by_uid[the_uid]
+    elif more:
+      for i, (o, p) in enumerate(more):
+        if o is obj and p is parent:
+          del more[i]
+          break
+      else:
+        return False
+    else:
+      return False
+    if more is not None and not more:
+      del self._more_entries_by_uid[the_uid]
+    return not any(o is obj for o, _ in self.Entries(the_uid))
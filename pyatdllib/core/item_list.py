@@ -0,0 +1,156 @@
+"""Defines ItemList, the list type of Container.items and CtxList.items.
+
+AuditableObject.__setattr__ cannot see mutations of a bare list, so an ItemList
+tells its owner which objects entered and left the list. The owner uses that to
+keep indices (see module 'index') up to date.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def IdentityDifference(a: List[Any], b: List[Any]) -> List[Any]:
+  """Returns the elements of a that are not in b, comparing by identity."""
+  ids = set(id(x) for x in b)
+  return [x for x in a if id(x) not in ids]
+
+
+class NameIndex(object):
+  """A multimap from name to the items, of one ItemList, having that name.
+
+  The owner of the ItemList must call Add, Remove, and Rename.
+  """
+
+  __slots__ = ('_items_by_name',)
+
+  def __init__(self) -> None:
+    self._items_by_name: Dict[Optional[str], List[Any]] = {}
+
+  def __contains__(self, name: Optional[str]) -> bool:
+    return name in self._items_by_name
+
+  def Add(self, items: List[Any]) -> None:
+    for item in items:
+      self._items_by_name.setdefault(item.name, []).append(item)
+
+  def Remove(self, items: List[Any]) -> None:
+    for item in items:
+      self._Remove(item, item.name)
+
+  def Rename(self, item: Any, old_name: Optional[str]) -> None:
+    """Call this after item.name changes from old_name."""
+    if self._Remove(item, old_name):
+      self._items_by_name.setdefault(item.name, []).append(item)
+
+  def _Remove(self, item: Any, name: Optional[str]) -> bool:
+    """Returns True iff item was present."""
+    named = self._items_by_name.get(name, [])
+    for i, x in enumerate(named):
+      if x is item:
+        del named[i]
+        if not named:
+          del self._items_by_name[name]
+        return True
+    return False
+
+  def Named(self, name: Optional[str], items: List[Any]) -> List[Any]:
+    """Returns the elements of items (which must be the indexed ItemList) with the given name, in order."""
+    named = self._items_by_name.get(name)
+    if not named:
+      return []
+    if len(named) == 1:
+      return list(named)
+    ids = set(id(x) for x in named)
+    return [x for x in items if id(x) in ids]
+
+
+class ItemList(list):
+  """A list that calls owner._ItemsAdded([item]) and owner._ItemsRemoved([item]), and owner._ItemsReordered() after
+  sort and reverse.
+
+  Removals are reported before additions so that an item that is replaced by
+  itself (e.g., 'items[:] = [x for x in items if ...]') is neither removed nor
+  added.
+  """
+
+  __slots__ = ('_owner',)
+
+  def __init__(self, owner: Any, iterable: Iterable[Any] = ()) -> None:
+    super().__init__(iterable)
+    self._owner = owner
+
+  def __reduce_ex__(self, protocol: Any) -> Tuple[Any, ...]:
+    # copy.deepcopy and pickle rebuild us while our owner is only half rebuilt, so we must not tell it about our items.
+    # Its state (e.g., its NameIndex) already reflects them.
+    return (ItemList, (self._owner, list(self)))
+
+  def _Changed(self, removed: List[Any], added: List[Any]) -> None:
+    if removed:
+      self._owner._ItemsRemoved(removed)
+    if added:
+      self._owner._ItemsAdded(added)
+
+  def append(self, item: Any) -> None:
+    super().append(item)
+    self._Changed([], [item])
+
+  def extend(self, iterable: Iterable[Any]) -> None:
+    items = list(iterable)
+    super().extend(items)
+    self._Changed([], items)
+
+  def __iadd__(self, iterable: Iterable[Any]) -> 'ItemList':
+    self.extend(iterable)
+    return self
+
+  def insert(self, index: int, item: Any) -> None:
+    super().insert(index, item)
+    self._Changed([], [item])
+
+  def __setitem__(self, key, value) -> None:
+    if isinstance(key, slice):
+      old = super().__getitem__(key)
+      new = list(value)
+      super().__setitem__(key, new)
+      self._Changed(IdentityDifference(old, new), IdentityDifference(new, old))
+    else:
+      old_item = super().__getitem__(key)
+      super().__setitem__(key, value)
+      if old_item is not value:
+        self._Changed([old_item], [value])
+
+  def __delitem__(self, key) -> None:
+    old = super().__getitem__(key)
+    super().__delitem__(key)
+    self._Changed(old if isinstance(key, slice) else [old], [])
+
+  def pop(self, index: int = -1) -> Any:
+    item = super().pop(index)
+    self._Changed([item], [])
+    return item
+
+  def remove(self, item: Any) -> None:
+    index = self.index(item)
+    self.__delitem__(index)
+
+  def clear(self) -> None:
+    old = list(self)
+    super().clear()
+    self._Changed(old, [])
+
+  def __imul__(self, n: int) -> 'ItemList':
+    old = list(self)
+    super().__imul__(n)
+    self._Changed(old if n < 1 else [], old * (n - 1) if n > 1 else [])
+    return self
+
+  def sort(self, *args: Any, **kwargs: Any) -> None:
+    super().sort(*args, **kwargs)
+    self._owner._ItemsReordered()
+
+  def reverse(self) -> None:
+    super().reverse()
+    self._owner._ItemsReordered()
@@ -41,7 +41,10 @@ def Merge(db: tdl.ToDoList, remote: pyatdl_pb2.ToDoList) -> pyatdl_pb2.ToDoList:
 
   We merge global notes (i.e., those in the NoteList), contexts, projects, folders, actions, and their notes. Deletion
   is accomplished by leaving a context, project, folder, or action in place with UID intact and common.is_deleted set
-  to True. If you try to delete an action by removing the pyatdl.Action message, it will be resurrected.
+  to True. If you try to delete an action by removing the pyatdl.Action message, it will be resurrected. Purging is
+  accomplished by removing the message and adding a tombstone to pyatdl.ToDoList.tombstones. We keep the tombstones of
+  both db and remote and then truly delete any item that has a tombstone unless the item changed after it died (see
+  tdl.ToDoList.ApplyTombstones). Finally we forget old tombstones (see tdl.ToDoList.PruneTombstones).
 
   pyatdl.Timestamp values are used to determine the winner of a modification of an item. We don't want to rely upon the
   various applications' clocks to be in sync in a perfect world, but that's what you've got for now. (A paranoid
@@ -81,14 +84,19 @@ def Merge(db: tdl.ToDoList, remote: pyatdl_pb2.ToDoList) -> pyatdl_pb2.ToDoList:
     db.MergeCtxList(remote.ctx_list)
   if remote.HasField('note_list'):
     db.MergeNoteList(remote.note_list)
+  if remote.HasField('tombstones'):
+    db.tombstones.MergeFromProto(remote.tombstones)
+  db.ApplyTombstones()
   uid.ResetNotesOfExistingUIDs(
     raise_data_error_upon_next_uid=True,
     allow_duplication=False)
   all_merged_uids = set(db.CheckIsWellFormed())
+  all_merged_uids.update(t.uid for t in db.tombstones)
   missing_remote_uids = set(mtimes_by_uid_in_remote_to_do_list) - all_merged_uids
   if missing_remote_uids:
     raise AssertionError(f'missing_remote_uids={missing_remote_uids}')
   missing_local_uids = set(all_uids_in_local_to_do_list) - all_merged_uids
   if missing_local_uids:
     raise AssertionError(f'missing_local_uids={missing_local_uids}')
+  db.PruneTombstones()
   return db.AsProto()
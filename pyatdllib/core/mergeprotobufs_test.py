@@ -3339,6 +3339,52 @@ root {
     """
     self.assertTrue("TODO(chandler37): add this test")
 
+  def testMergeKeepsPurgedItemsPurged(self) -> None:
+    todos_in_db = tdl.ToDoList()
+    gone = action.Action(the_uid=5, name="gone")
+    todos_in_db.inbox.items.extend([gone, action.Action(the_uid=6, name="kept")])
+    remote_pb = todos_in_db.AsProto()  # The other device has not yet heard of the purge.
+    todos_in_db.AlmostPurge(gone)
+    merged = mergeprotobufs.Merge(todos_in_db, remote_pb)
+    self.assertEqual([a.common.uid for a in merged.inbox.actions], [6])
+    self.assertEqual(list(merged.tombstones.uid), [5])
+    self.assertEqual(list(merged.tombstones.dtime), [1000000001000000])
+    self.assertEqual(list(merged.tombstones.parent_uid), [uid.INBOX_UID])
+
+  def testMergeResurrectsItemsModifiedAfterTheyDied(self) -> None:
+    todos_in_db = tdl.ToDoList()
+    gone = action.Action(the_uid=5, name="gone")
+    todos_in_db.inbox.items.append(gone)
+    remote_pb = todos_in_db.AsProto()
+    remote_pb.inbox.actions[0].common.metadata.name = "back"
+    remote_pb.inbox.actions[0].common.timestamp.mtime = year5454microsec
+    todos_in_db.AlmostPurge(gone)
+    merged = mergeprotobufs.Merge(todos_in_db, remote_pb)
+    self.assertEqual([a.common.metadata.name for a in merged.inbox.actions], ["back"])
+    self.assertFalse(merged.HasField("tombstones"))
+
+  def testMergeRemoteTombstones(self) -> None:
+    todos_in_db = tdl.ToDoList()
+    todos_in_db.inbox.items.extend([action.Action(the_uid=5, name="purged remotely"), action.Action(the_uid=6, name="kept")])
+    remote_pb = todos_in_db.AsProto()
+    del remote_pb.inbox.actions[0]
+    remote_pb.tombstones.uid.append(5)
+    remote_pb.tombstones.dtime.append(year5454microsec)
+    remote_pb.tombstones.parent_uid.append(uid.INBOX_UID)
+    merged = mergeprotobufs.Merge(todos_in_db, remote_pb)
+    self.assertEqual([a.common.uid for a in merged.inbox.actions], [6])
+    self.assertProtosEqual(merged.tombstones, remote_pb.tombstones)
+
+  def testMergeForgetsOldTombstones(self) -> None:
+    todos_in_db = tdl.ToDoList()
+    todos_in_db.inbox.items.append(action.Action(the_uid=6, name="kept"))
+    remote_pb = todos_in_db.AsProto()
+    remote_pb.tombstones.uid.extend([5, 7])
+    remote_pb.tombstones.dtime.extend([1000000, 1000000001000000])  # 1970 and now
+    remote_pb.tombstones.parent_uid.extend([uid.INBOX_UID, uid.INBOX_UID])
+    merged = mergeprotobufs.Merge(todos_in_db, remote_pb)
+    self.assertEqual(list(merged.tombstones.uid), [7])
+
   def testFolderChanges(self) -> None:
     """A folder has a new prj inside, and a new folder inside. We grab all three changes.
 
@@ -65,7 +65,11 @@ class NoteList(object):
     Returns:
       NoteList
     """
-    pb = pyatdl_pb2.NoteList.FromString(bytestring)  # pylint: disable=no-member
+    return cls.FromProtobufMessage(pyatdl_pb2.NoteList.FromString(bytestring))  # pylint: disable=no-member
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[T], pb: pyatdl_pb2.NoteList) -> T:
+    """Like DeserializedProtobuf but starts from a parsed message."""
     nl = cls()
     for pbn in pb.notes:
       nl.notes[pbn.name] = pbn.note
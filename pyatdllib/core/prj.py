@@ -10,12 +10,13 @@ import time
 
 from absl import flags  # type: ignore
 from google.protobuf import message
-from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Type, TypeVar
 
 from . import action
 from . import common
 from . import container
 from . import errors
+from . import fragment_cache
 from . import pyatdl_pb2
 from . import uid
 
@@ -104,7 +105,8 @@ class Prj(container.Container):
                   show_action: Callable[[action.Action], bool] = lambda _: True,
                   show_note: Callable[[str], bool] = lambda _: True,
                   hypertext_prefix: str = None,
-                  html_escaper: Callable[[str], str] = None) -> None:
+                  html_escaper: Callable[[str], str] = None,
+                  cache_key: Hashable = None) -> None:
     """Appends lines of text to lines.
 
     Args:
@@ -115,12 +117,41 @@ class Prj(container.Container):
       show_note: lambda str: bool
       hypertext_prefix: None|unicode  # None means to output plain text
       html_escaper: lambda unicode: unicode
+      cache_key: None|Hashable  # identifies show_note, e.g. the search query, so that we may reuse our lines from
+                                # fragment_cache.FRAGMENTS. None means to render afresh.
     Returns:
       None
     """
     if context_name is None:
       raise TypeError
-
+    name_of_context = context_name  # not None, even within Render
+    actions = [item for item in self.items if show_action(item)]
+    if cache_key is None:
+      self._AppendTaskPaper(lines, name_of_context, project_name_prefix, actions, show_note, hypertext_prefix,
+                            html_escaper)
+      return
+    key = ('taskpaper', cache_key, hypertext_prefix, html_escaper, project_name_prefix,
+           self.uid, self.mtime, self.name, self.note, self.IsDone(),
+           tuple((a.uid, a.mtime, a.name, a.note, a.is_complete, a.is_deleted,
+                  None if a.ctx_uid is None else context_name(a.ctx_uid)) for a in actions))
+
+    def Render() -> Tuple[str, ...]:
+      fragment: List[str] = []
+      self._AppendTaskPaper(fragment, name_of_context, project_name_prefix, actions, show_note, hypertext_prefix,
+                            html_escaper)
+      return tuple(fragment)
+
+    lines.extend(fragment_cache.FRAGMENTS.Get(key, Render))
+
+  def _AppendTaskPaper(self,
+                       lines: List[str],
+                       context_name: Callable[[int], str],
+                       project_name_prefix: str,
+                       actions: List[action.Action],
+                       show_note: Callable[[str], bool],
+                       hypertext_prefix: Optional[str],
+                       html_escaper: Optional[Callable[[str], str]]) -> None:
+    """Does the work of AsTaskPaper given the Actions to show."""
     # TODO(chandler37): We might want to optionally display @without_context
     # when there is not a context for an action to easily find those actions so
     # you can assign them contexts?
@@ -145,9 +176,7 @@ class Prj(container.Container):
     if self.note and show_note(self.note):
       for line in self.note.replace('\r', '').replace('\\n', ', ').split('\n'):
         lines.append(Escaped(line))
-    for item in self.items:
-      if not show_action(item):
-        continue
+    for item in actions:
       hypernote = ''
       note_suffix = ''
       if item.note and show_note(item.note):
@@ -161,7 +190,7 @@ class Prj(container.Container):
       if item.ctx_uid is not None:
         cname = context_name(item.ctx_uid).replace(' ', '_')
         context_suffix = ' %s' % (cname,) if cname.startswith('@') else ' @%s' % (cname,)
-        if context_suffix.strip() in item.name:
+        if context_suffix.strip() in (item.name or ''):
           context_suffix = ''
       else:
         context_suffix = ''
@@ -239,11 +268,23 @@ class Prj(container.Container):
       pb.max_seconds_before_review = self.max_seconds_before_review
     if self._last_review_epoch_sec:
       pb.last_review_epoch_seconds = self._last_review_epoch_sec
-    for a in self.items:
-      pba = pb.actions.add()
-      a.AsProto(pba)
+    backing_pb = self._BackingProtobuf()
+    if backing_pb is not None:
+      pb.actions.extend(backing_pb.actions)  # untouched since we loaded them
+    else:
+      for a in self.items:
+        pba = pb.actions.add()
+        a.AsProto(pba)
     return pb
 
+  def SerializedProtobuf(self) -> bytes:
+    """Override."""
+    serialized = self.__dict__.get('_serialized')
+    if serialized is None:
+      serialized = self.AsProto().SerializeToString()
+      self.__dict__['_serialized'] = serialized
+    return serialized
+
   def MergeFromProto(self,
                      other: pyatdl_pb2.Project,
                      *,
@@ -286,8 +327,7 @@ class Prj(container.Container):
         # You might wonder, what if this used to exist here and the most recent thing we did was purge it? You are not
         # supposed to purge without syncing 100% of devices.
         self.items.append(
-          action.Action.DeserializedProtobuf(
-            other_action.SerializeToString()))
+          action.Action.FromProtobufMessage(other_action))
       else:
         existing_action, existing_project = tup
         they_are_authority = common.MaxTimeOfPb(other_action) >= common.MaxTime(existing_action)
@@ -310,21 +350,39 @@ class Prj(container.Container):
     """
     if not bytestring:
       raise errors.DataError("empty project in the protocol buffer -- not even a UID is present")
-    pb = pyatdl_pb2.Project.FromString(bytestring)  # pylint: disable=no-member
+    return cls.FromProtobufMessage(pyatdl_pb2.Project.FromString(bytestring))  # pylint: disable=no-member
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[T], pb: pyatdl_pb2.Project, *, lazy: bool = False) -> T:
+    """Like DeserializedProtobuf but faster: starts from a parsed message and bypasses __setattr__.
+
+    Args:
+      pb: pyatdl_pb2.Project
+      lazy: bool  # If true, the Actions are built only when first needed (see Container.IsMaterialized), and the
+                  # caller must already have noted the UIDs of pb and its Actions (see uid.Factory.NoteExistingUID).
+    """
+    if not pb.ListFields():
+      raise errors.DataError("empty project in the protocol buffer -- not even a UID is present")
     if pb.HasField('max_seconds_before_review'):
       max_seconds_before_review = pb.max_seconds_before_review
     else:
       max_seconds_before_review = DEFAULT_MAX_SECONDS_BEFORE_REVIEW
-    p = cls(the_uid=pb.common.uid,
-            name=pb.common.metadata.name,
-            note=pb.common.metadata.note,
-            is_complete=pb.is_complete,
-            is_active=pb.is_active,
-            default_context_uid=pb.default_context_uid,
-            max_seconds_before_review=max_seconds_before_review,
-            last_review_epoch_sec=pb.last_review_epoch_seconds)
-    for pb_action in pb.actions:
-      p.items.append(action.Action.DeserializedProtobuf(
-        pb_action.SerializeToString()))
+    p = cls._NewWithoutHooks(pb.common, note_uid=not lazy)
+    if lazy:
+      p._InitLazily(name=pb.common.metadata.name, note=pb.common.metadata.note, backing_pb=pb)
+    else:
+      p._InitWithoutHooks(name=pb.common.metadata.name, note=pb.common.metadata.note)
+    d = p.__dict__
+    d['max_seconds_before_review'] = max_seconds_before_review
+    d['_last_review_epoch_sec'] = pb.last_review_epoch_seconds
+    d['is_complete'] = pb.is_complete
+    d['is_active'] = pb.is_active
+    d['default_context_uid'] = None if pb.default_context_uid == 0 else pb.default_context_uid
+    if not lazy:
+      p.items.extend(action.Action.FromProtobufMessage(pb_action) for pb_action in pb.actions)
     p.SetFieldsBasedOnProtobuf(pb.common)  # must be last
     return p
+
+  def _ItemsFromBackingProtobuf(self, pb: pyatdl_pb2.Project) -> List[action.Action]:
+    """Override."""
+    return [action.Action.FromProtobufMessage(pb_action, note_uid=False) for pb_action in pb.actions]
@@ -0,0 +1,346 @@
+"""Defines Compile, which compiles a search query into a Query that selects Actions.
+
+A query is a sequence of terms separated by whitespace. An Action matches the
+query iff it satisfies every term:
+
+  milk            the name or note contains 'milk', ignoring case
+  "buy milk"      the name or note contains 'buy milk', ignoring case
+  /mi(lk|ld)/     the name or note matches the regular expression, ignoring case, where '.' matches a newline and
+                  '\\/' matches a slash
+  @home           the name of the Action's Ctx contains 'home', ignoring case
+  +garden         the name of the Action's Prj contains 'garden', ignoring case
+  is:done         complete or deleted (see Action.IsDone)
+  is:complete     complete
+  is:deleted      deleted
+  is:active       the Prj is active, and so is the Ctx, if any
+  needs:review    the Prj needs review (see Prj.NeedsReview)
+  ctime>2020-01-31
+                  created after midnight UTC beginning 2020-01-31. Also ctime<, ctime>=, ctime<=, and likewise for
+                  mtime and dtime (an undeleted Action's dtime satisfies nothing). Instead of a date, you may give
+                  seconds since the epoch.
+  -TERM           the Action does not satisfy TERM, e.g. -is:done or -@work
+
+Double quotes may surround part of any term, e.g. +"buy milk" or "is:done".
+CompileOrLiteral treats a malformed query as a plain phrase instead.
+
+A compiled Query is a list of terms, each of which can decide about one Action
+(see Query.Matches) or about all of them at once (see Query.Mask), operating
+on whole columns of an ActionColumns. Compile remembers the queries it compiled
+recently, and Query.Mask remembers its results for each (query, checksum) pair
+where the checksum identifies an unmodified ToDoList (see
+ToDoList.NoteChecksum), unless the results depend on the time of day (e.g.,
+needs:review).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import calendar
+import collections
+import functools
+import operator
+import re
+import time
+
+from typing import Any, Callable, List, Optional, Tuple
+
+from . import action
+from . import action_columns
+from . import ctx
+from . import prj
+
+
+_MAX_CACHED_RESULTS = 64
+
+_TERM_RE = re.compile(r'''
+  (?P<negated>-)?
+  (?:
+    /(?P<regex>(?:[^/\\]|\\.)*)/
+  | (?P<word>(?:[^\s"]|"[^"]*")+)
+  )
+  (?=\s|$)''', re.VERBOSE)
+
+_TIME_RE = re.compile(r'^(?P<field>ctime|mtime|dtime)(?P<op>>=|<=|>|<)(?P<value>.+)$')
+
+_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+# (query, checksum) => the UIDs of the matching Actions, least recently used first:
+_uids_by_query_and_checksum: 'collections.OrderedDict[Tuple[str, str], frozenset]' = collections.OrderedDict()
+
+
+class Error(Exception):
+  """Base class for this module's exceptions."""
+
+
+class QuerySyntaxError(Error):
+  """The query is malformed."""
+
+
+ActionToProject = Callable[[action.Action], prj.Prj]
+ActionToContext = Callable[[action.Action], Optional[ctx.Ctx]]
+
+
+class _Term(object):
+  """One term of a query.
+
+  Fields:
+    matches: lambda Action, ActionToProject, ActionToContext: bool
+    mask: lambda ActionColumns: int  # a bitset; see module 'action_columns'
+    text_matches: None|lambda str: bool  # for terms about text, whether the term matches the given name or note
+    depends_on_clock: bool  # whether the term's verdict can change as time passes, with the ToDoList unmodified
+  """
+
+  def __init__(self, matches, mask, text_matches=None, *, depends_on_clock: bool = False) -> None:
+    self.matches = matches
+    self.mask = mask
+    self.text_matches = text_matches
+    self.depends_on_clock = depends_on_clock
+
+
+def _TextTerm(needle: str) -> _Term:
+  needle = needle.lower()
+
+  def TextMatches(text: Optional[str]) -> bool:
+    if not text:
+      return False
+    return needle in text.lower()
+
+  def Matches(an_action: action.Action, unused_to_project, unused_to_context) -> bool:
+    if an_action._index is not None:  # pylint: disable=protected-access
+      return an_action._index.TextIndex().Matches(needle, an_action)  # pylint: disable=protected-access
+    return TextMatches(an_action.name) or TextMatches(an_action.note)
+
+  def Mask(columns: action_columns.ActionColumns) -> int:
+    the_index = columns.actions[0]._index if columns.actions else None  # pylint: disable=protected-access
+    if the_index is None:
+      return columns.Mask(lambda an_action: Matches(an_action, None, None))
+    return columns.WithIds(the_index.TextIndex().Matching(needle))
+
+  return _Term(Matches, Mask, TextMatches)
+
+
+def _RegexTerm(pattern: str) -> _Term:
+  try:
+    regex = re.compile(pattern.replace('\\/', '/'), re.IGNORECASE | re.DOTALL)
+  except re.error as e:
+    raise QuerySyntaxError('Bad regular expression /%s/: %s' % (pattern, e))
+
+  def TextMatches(text: Optional[str]) -> bool:
+    if not text:
+      return False
+    return regex.search(text) is not None
+
+  def Matches(an_action: action.Action, unused_to_project, unused_to_context) -> bool:
+    return TextMatches(an_action.name) or TextMatches(an_action.note)
+
+  return _Term(Matches, lambda columns: columns.Mask(lambda an_action: Matches(an_action, None, None)), TextMatches)
+
+
+def _ContextTerm(needle: str) -> _Term:
+  needle = needle.lower()
+
+  def ContextMatches(context: Optional[ctx.Ctx]) -> bool:
+    return context is not None and needle in context.name.lower()
+
+  def Matches(an_action: action.Action, unused_to_project, to_context: ActionToContext) -> bool:
+    return ContextMatches(to_context(an_action))
+
+  def Mask(columns: action_columns.ActionColumns) -> int:
+    mask = 0
+    for the_uid, context in columns.ctx_by_uid.items():
+      if ContextMatches(context):
+        mask |= columns.InContext(the_uid)
+    return mask
+
+  return _Term(Matches, Mask)
+
+
+def _ProjectTerm(predicate: Callable[[prj.Prj], bool], *, depends_on_clock: bool = False) -> _Term:
+  return _Term(lambda an_action, to_project, unused_to_context: predicate(to_project(an_action)),
+               lambda columns: columns.ProjectsMask(predicate),
+               depends_on_clock=depends_on_clock)
+
+
+def _IsTerm(value: str) -> _Term:
+  if value == 'done':
+    return _Term(lambda an_action, *unused: an_action.IsDone(),
+                 lambda columns: columns.is_complete | columns.is_deleted)
+  if value == 'complete':
+    return _Term(lambda an_action, *unused: an_action.is_complete, lambda columns: columns.is_complete)
+  if value == 'deleted':
+    return _Term(lambda an_action, *unused: an_action.is_deleted, lambda columns: columns.is_deleted)
+  if value == 'active':
+    def Matches(an_action: action.Action, to_project: ActionToProject, to_context: ActionToContext) -> bool:
+      context = to_context(an_action)
+      return to_project(an_action).is_active and (context is None or context.is_active)
+
+    return _Term(Matches, lambda columns: columns.in_active_prj & columns.Not(columns.in_inactive_ctx))
+  raise QuerySyntaxError('Unknown term is:%s; try is:done, is:complete, is:deleted, or is:active' % value)
+
+
+def _Seconds(value: str) -> float:
+  """Returns seconds since the epoch given either that or a date like 2020-01-31, taken to be midnight UTC."""
+  try:
+    return float(value)
+  except ValueError:
+    pass
+  try:
+    return float(calendar.timegm(time.strptime(value, '%Y-%m-%d')))
+  except ValueError:
+    raise QuerySyntaxError('Expected a date like 2020-01-31 or seconds since the epoch but got %s' % value)
+
+
+def _TimeTerm(field: str, op: Callable[[float, float], bool], seconds: float) -> _Term:
+  def Matches(an_action: action.Action, *unused) -> bool:
+    value = getattr(an_action, field)
+    return value is not None and op(value, seconds)
+
+  return _Term(Matches, lambda columns: columns.TimeMask(field, op, seconds))
+
+
+def _CompileTerm(word: str) -> _Term:
+  """Compiles a term other than a regex, given with its double quotes but without its negation."""
+  if word.startswith('"'):
+    return _TextTerm(word.replace('"', ''))
+  unquoted = word.replace('"', '')
+  if unquoted.startswith('@') and len(unquoted) > 1:
+    return _ContextTerm(unquoted[1:])
+  if unquoted.startswith('+') and len(unquoted) > 1:
+    needle = unquoted[1:].lower()
+    return _ProjectTerm(lambda project: needle in (project.name or '').lower())
+  if unquoted.startswith('is:'):
+    return _IsTerm(unquoted[len('is:'):])
+  if unquoted.startswith('needs:'):
+    if unquoted != 'needs:review':
+      raise QuerySyntaxError('Unknown term %s; try needs:review' % unquoted)
+    return _ProjectTerm(lambda project: project.NeedsReview(), depends_on_clock=True)
+  m = _TIME_RE.match(unquoted)
+  if m:
+    return _TimeTerm(m.group('field'), _OPERATORS[m.group('op')], _Seconds(m.group('value')))
+  return _TextTerm(unquoted)
+
+
+class Query(object):
+  """A compiled query. See the module docstring and Compile.
+
+  Fields:
+    text: str  # the query as given to Compile
+  """
+
+  def __init__(self, text: str, terms: List[Tuple[bool, _Term]]) -> None:
+    self.text = text
+    self._terms = terms  # [(negated, term)]
+    self._depends_on_clock = any(term.depends_on_clock for _, term in terms)
+
+  def __repr__(self) -> str:
+    return 'Query(%r)' % self.text
+
+  def Matches(self, an_action: action.Action, to_project: ActionToProject, to_context: ActionToContext) -> bool:
+    """Returns True iff the Action matches this query.
+
+    Args:
+      an_action: Action
+      to_project: lambda Action: Prj  # called only if needed
+      to_context: lambda Action: Ctx|None  # called only if needed
+    """
+    for negated, term in self._terms:
+      if bool(term.matches(an_action, to_project, to_context)) is negated:
+        return False
+    return True
+
+  def Mask(self, columns: action_columns.ActionColumns, checksum: Optional[str] = None) -> int:
+    """Returns the bitset of the Actions in columns that match this query.
+
+    Args:
+      columns: ActionColumns
+      checksum: None|str  # identifies the unmodified ToDoList of the columns, if known, so we may reuse our result
+    Returns:
+      int  # see module 'action_columns'
+    """
+    if self._depends_on_clock:
+      checksum = None  # the same ToDoList may give a different result a moment from now
+    if checksum is not None:
+      key = (self.text, checksum)
+      uids = _uids_by_query_and_checksum.get(key)
+      if uids is not None:
+        _uids_by_query_and_checksum.move_to_end(key)
+        return columns.WithUIDs(uids)
+    mask = columns.All()
+    for negated, term in self._terms:
+      term_mask = term.mask(columns)
+      mask &= columns.Not(term_mask) if negated else term_mask
+      if not mask:
+        break
+    if checksum is not None:
+      _uids_by_query_and_checksum[key] = frozenset(columns.uid[i] for i in columns.Positions(mask))
+      while len(_uids_by_query_and_checksum) > _MAX_CACHED_RESULTS:
+        _uids_by_query_and_checksum.popitem(last=False)
+    return mask
+
+  def IsOnlyAboutText(self) -> bool:
+    """Returns True iff every term concerns only names and notes, e.g. 'milk -/^buy/'."""
+    return all(term.text_matches is not None for _, term in self._terms)
+
+  def MatchesText(self, item: Any) -> bool:
+    """Returns True iff this query is only about text (see IsOnlyAboutText) and the item's name or note matches it.
+
+    Args:
+      item: Folder|Prj|Ctx|Action
+    """
+    if not self.IsOnlyAboutText():
+      return False
+    for negated, term in self._terms:
+      if (term.text_matches(item.name) or term.text_matches(item.note)) is negated:
+        return False
+    return True
+
+  def Highlights(self, text: Optional[str]) -> bool:
+    """Returns True iff a term that is about text and not negated matches the given text, e.g. a note."""
+    return any(term.text_matches is not None and term.text_matches(text)
+               for negated, term in self._terms if not negated)
+
+
+@functools.lru_cache(maxsize=128)
+def Compile(text: str) -> Query:
+  """Compiles the given query. See the module docstring.
+
+  Args:
+    text: str
+  Returns:
+    Query
+  Raises:
+    QuerySyntaxError
+  """
+  terms = []
+  pos = 0
+  while True:
+    while pos < len(text) and text[pos].isspace():
+      pos += 1
+    if pos == len(text):
+      break
+    m = _TERM_RE.match(text, pos)
+    if m is None:
+      raise QuerySyntaxError('Cannot parse the query beginning here: %s' % text[pos:])
+    if m.group('regex') is not None:
+      terms.append((bool(m.group('negated')), _RegexTerm(m.group('regex'))))
+    else:
+      terms.append((bool(m.group('negated')), _CompileTerm(m.group('word'))))
+    pos = m.end()
+  if not terms:
+    raise QuerySyntaxError('The query is empty.')
+  return Query(text, terms)
+
+
+def CompileOrLiteral(text: str) -> Query:
+  """Like Compile, but a malformed query, e.g. '12" ruler' or 'is:x', searches for the given text instead.
+
+  Args:
+    text: str  # nonempty
+  Returns:
+    Query
+  """
+  try:
+    return Compile(text)
+  except QuerySyntaxError:
+    return Query(text, [(False, _TextTerm(text))])
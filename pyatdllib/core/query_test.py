@@ -0,0 +1,151 @@
+"""Unittests for module 'query'."""
+
+import time
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import prj
+from pyatdllib.core import query
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+
+
+FLAGS = flags.FLAGS
+
+
+class QueryTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    query._uids_by_query_and_checksum.clear()  # pylint: disable=protected-access
+
+  def _ToDoList(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    work_uid = lst.AddContext('@work')
+    lst.ContextByUID(work_uid).is_active = False
+    garden = prj.Prj(name='garden')
+    lst.AddProjectOrFolder(garden)
+    office = prj.Prj(name='office')
+    office.is_active = False
+    lst.AddProjectOrFolder(office)
+    specs = [
+      (garden, 'buy milk', 'at the store', None, 100.0, False, False),
+      (garden, 'buy seeds', None, home_uid, 200.0, True, False),
+      (garden, 'water plants', 'every/day', home_uid, 300.0, False, False),
+      (office, 'file report', 'Milk the deadline', work_uid, 400.0, False, True),
+      (office, 'call boss', None, None, 500.0, False, False),
+    ]
+    for p, name, note, ctx_uid, ctime, is_complete, is_deleted in specs:
+      a = action.Action(name=name, note=note, ctx_uid=ctx_uid)
+      a.ctime = ctime
+      a.is_complete = is_complete
+      a.is_deleted = is_deleted
+      p.items.append(a)
+    return lst
+
+  def _Names(self, lst, text):
+    """Returns the names of the Actions matching the query, checking that Matches and Mask agree."""
+    q = query.Compile(text)
+
+    def ActionToProject(an_action):
+      return lst.ActionByUID(an_action.uid)[1]
+
+    def ActionToContext(an_action):
+      return None if an_action.ctx_uid is None else lst.ContextByUID(an_action.ctx_uid)
+
+    expected = [a.name for a, _ in lst.Actions() if q.Matches(a, ActionToProject, ActionToContext)]
+    columns = lst.ActionColumns()
+    self.assertEqual([a.name for a in columns.Actions(q.Mask(columns))], expected, text)
+    return expected
+
+  def testTerms(self):
+    lst = self._ToDoList()
+    self.assertEqual(self._Names(lst, 'milk'), ['buy milk', 'file report'])
+    self.assertEqual(self._Names(lst, 'buy store'), ['buy milk'])
+    self.assertEqual(self._Names(lst, '"buy seeds"'), ['buy seeds'])
+    self.assertEqual(self._Names(lst, '"seeds buy"'), [])
+    self.assertEqual(self._Names(lst, '/^b.*s$/'), ['buy seeds'])
+    self.assertEqual(self._Names(lst, r'/y\/d/'), ['water plants'])
+    self.assertEqual(self._Names(lst, '@HOME'), ['buy seeds', 'water plants'])
+    self.assertEqual(self._Names(lst, '-@home'), ['buy milk', 'file report', 'call boss'])
+    self.assertEqual(self._Names(lst, '+off'), ['file report', 'call boss'])
+    self.assertEqual(self._Names(lst, 'is:done'), ['buy seeds', 'file report'])
+    self.assertEqual(self._Names(lst, 'is:complete'), ['buy seeds'])
+    self.assertEqual(self._Names(lst, 'is:deleted'), ['file report'])
+    self.assertEqual(self._Names(lst, 'is:active'), ['buy milk', 'buy seeds', 'water plants'])
+    self.assertEqual(self._Names(lst, 'ctime>200 ctime<=400'), ['water plants', 'file report'])
+    self.assertEqual(self._Names(lst, 'dtime>0 -@work'), [])
+    self.assertEqual(self._Names(lst, 'ctime<1970-01-02'), [a.name for a, _ in lst.Actions()])
+    self.assertEqual(self._Names(lst, 'buy -is:done +garden'), ['buy milk'])
+    self.assertEqual(self._Names(lst, 'needs:review'), [a.name for a, p in lst.Actions() if p.NeedsReview()])
+
+  def testSyntaxErrors(self):
+    for text in ('', '   ', 'is:bogus', 'needs:love', '/(/', 'ctime>yesterday', 'a "b'):
+      with self.assertRaises(query.QuerySyntaxError):
+        query.Compile(text)
+
+  def testCompileOrLiteral(self):
+    lst = self._ToDoList()
+    lst.inbox.items.append(action.Action(name='buy a 12" ruler', note='is:x ctime>soon /(/'))
+    columns = lst.ActionColumns()
+    for text in ('12" ruler', '"', 'is:x', 'ctime>soon', '/(/'):
+      q = query.CompileOrLiteral(text)
+      self.assertTrue(q.IsOnlyAboutText(), text)
+      self.assertEqual([a.name for a in columns.Actions(q.Mask(columns))], ['buy a 12" ruler'], text)
+    self.assertEqual([a.name for a in columns.Actions(query.CompileOrLiteral('buy -milk').Mask(columns))],
+                     ['buy a 12" ruler', 'buy seeds'])
+
+  def testText(self):
+    q = query.Compile('milk -/^call/')
+    self.assertTrue(q.IsOnlyAboutText())
+    self.assertTrue(q.MatchesText(prj.Prj(name='Milk run')))
+    self.assertFalse(q.MatchesText(prj.Prj(name='call for milk')))
+    self.assertTrue(q.Highlights('got milk?'))
+    self.assertFalse(q.Highlights('call'))
+    self.assertFalse(query.Compile('milk is:done').IsOnlyAboutText())
+    self.assertFalse(query.Compile('milk is:done').MatchesText(prj.Prj(name='milk')))
+
+  def testMaskIsCachedByChecksum(self):
+    lst = self._ToDoList()
+    q = query.Compile('buy')
+    lst.NoteChecksum('abc')
+    checksum = lst.ChecksumIfUnmodified()
+    self.assertEqual(checksum, 'abc')
+    columns = lst.ActionColumns()
+    self.assertEqual([a.name for a in columns.Actions(q.Mask(columns, checksum))], ['buy milk', 'buy seeds'])
+    self.assertEqual(len(query._uids_by_query_and_checksum), 1)  # pylint: disable=protected-access
+    a = lst.ActionByUID(columns.uid[0])[0]
+    a.name = 'sell milk'
+    self.assertIsNone(lst.ChecksumIfUnmodified())
+    # Stale results remain available under the old checksum:
+    self.assertEqual([x.name for x in columns.Actions(q.Mask(columns, 'abc'))], ['sell milk', 'buy seeds'])
+    columns = lst.ActionColumns()
+    self.assertEqual([x.name for x in columns.Actions(q.Mask(columns, lst.ChecksumIfUnmodified()))], ['buy seeds'])
+
+  def testMaskIsNotCachedIfItDependsOnTheClock(self):
+    lst = self._ToDoList()
+    garden = lst.ProjectByUID([p.uid for p, _ in lst.Projects() if p.name == 'garden'][0])[0]
+    garden.max_seconds_before_review = 3600.0
+    garden.MarkAsReviewed()
+    lst.NoteChecksum('abc')
+    q = query.Compile('needs:review -is:done')
+    columns = lst.ActionColumns()
+    self.assertNotIn('buy milk', [a.name for a in columns.Actions(q.Mask(columns, lst.ChecksumIfUnmodified()))])
+    saved_time = time.time
+    later = saved_time() + 30 * 24 * 3600.0
+    time.time = lambda: later
+    try:
+      self.assertEqual(lst.ChecksumIfUnmodified(), 'abc')
+      self.assertIn('buy milk', [a.name for a in columns.Actions(q.Mask(columns, lst.ChecksumIfUnmodified()))])
+    finally:
+      time.time = saved_time
+    self.assertEqual(len(query._uids_by_query_and_checksum), 0)  # pylint: disable=protected-access
+
+
+if __name__ == '__main__':
+  unitjest.main()
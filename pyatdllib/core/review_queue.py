@@ -0,0 +1,43 @@
+"""Defines ReviewQueue, which orders Prjs by when they next need review.
+
+A Prj needs review (see Prj.NeedsReview) once the time of its last review plus
+its max_seconds_before_review has passed (see DueTime). Ordering Prjs by that
+time makes "which Prjs need review now?" and "when does the next one?" take
+O(log N + k) time (see module 'sorted_index').
+
+The Index of a ToDoList builds a ReviewQueue on demand and keeps it up to date
+as Prjs come, go, and change (see Index.ReviewQueue).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from typing import Any, List, Optional, Tuple
+
+from . import sorted_index
+
+
+# We reconsider Prjs due this close to 'now' with Prj.NeedsReview itself, which subtracts rather than adds and so may
+# round differently:
+_SLOP_SECONDS = 1.0
+
+
+def DueTime(project: Any) -> float:
+  """Returns the time, in seconds since the epoch, after which the given Prj needs review."""
+  return project.TimeOfLastReview() + project.max_seconds_before_review
+
+
+class ReviewQueue(sorted_index.SortedIndex):
+  """Orders Prjs by DueTime, breaking ties by UID."""
+
+  def __init__(self) -> None:
+    super().__init__(DueTime)
+
+  def Due(self, now: float) -> List[Any]:
+    """Returns the Prjs that need review at the given time, most overdue first."""
+    return [p for p in self.Below(now + _SLOP_SECONDS) if p.NeedsReview(now)]
+
+  def Next(self, now: float) -> Optional[Tuple[float, Any]]:
+    """Returns (DueTime, Prj) for the Prj that will need review soonest after the given time, or None."""
+    return self.LeastAtOrAbove(now)
@@ -0,0 +1,82 @@
+"""Unittests for module 'review_queue'."""
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import folder
+from pyatdllib.core import prj
+from pyatdllib.core import review_queue
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+
+
+FLAGS = flags.FLAGS
+
+
+class ReviewQueueTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+
+  def testQueue(self):
+    q = review_queue.ReviewQueue()
+    a = prj.Prj(name='a', max_seconds_before_review=100.0, last_review_epoch_sec=1000.0)
+    b = prj.Prj(name='b', max_seconds_before_review=10.0, last_review_epoch_sec=1000.0)
+    c = prj.Prj(name='c', max_seconds_before_review=500.0)
+    q.AddAll([a, b, c, a])
+    self.assertEqual(len(q), 3)
+    self.assertEqual(review_queue.DueTime(b), 1010.0)
+    self.assertEqual(q.Due(1000.0), [c])
+    self.assertEqual(q.Due(1010.0), [c])
+    self.assertEqual(q.Due(1010.5), [c, b])
+    self.assertEqual(q.Next(1010.0), (1010.0, b))
+    self.assertEqual(q.Next(1010.5), (1100.0, a))
+    self.assertIsNone(q.Next(2000.0))
+    a.MarkAsReviewed(5000.0)
+    q.Add(a)
+    self.assertEqual(q.Next(1010.5), (5100.0, a))
+    q.Remove(c)
+    self.assertEqual(q.Due(2000.0), [b])
+
+  def testToDoListKeepsItUpToDate(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    for i in range(5):
+      p = prj.Prj(name='p%d' % i, max_seconds_before_review=100.0 * (i + 1), last_review_epoch_sec=1000.0)
+      lst.AddProjectOrFolder(p, parent_folder_uid=f.uid if i % 2 else None)
+    lst.inbox.MarkAsReviewed(1000.0)
+
+    def Check(now):
+      expected = [(p, path) for p, path in lst.Projects() if p.NeedsReview(now)]
+      self.assertEqual(list(lst.ProjectsToReview(now)), expected)
+      due_times = sorted((review_queue.DueTime(p), p.uid) for p, _ in lst.Projects()
+                         if review_queue.DueTime(p) >= now)
+      next_due = lst.NextProjectToReview(now)
+      if due_times:
+        self.assertEqual((next_due[0], next_due[1].uid), due_times[0])
+      else:
+        self.assertIsNone(next_due)
+      return [p.name for p, _ in expected]
+
+    self.assertEqual(Check(1250.0), ['p1', 'p0'])
+    self.assertEqual(lst.NextProjectToReview(1250.0)[1].name, 'p2')
+    projects = {p.name: p for p, _ in lst.Projects()}
+    projects['p0'].MarkAsReviewed(1200.0)
+    self.assertEqual(Check(1250.0), ['p1'])
+    projects['p4'].MarkAsNeedingReview()
+    self.assertEqual(Check(1250.0), ['p1', 'p4'])
+    projects['p1'].max_seconds_before_review = 1000.0
+    self.assertEqual(Check(1250.0), ['p4'])
+    lst.AddProjectOrFolder(prj.Prj(name='new', max_seconds_before_review=1.0))
+    self.assertEqual(Check(1250.0), ['p4', 'new'])
+    f.items.remove(projects['p1'])
+    lst.root.items.remove(projects['p4'])
+    self.assertEqual(Check(1250.0), ['new'])
+    self.assertEqual(Check(1e10), ['inbox', 'p3', 'p0', 'p2', 'new'])
+
+
+if __name__ == '__main__':
+  unitjest.main()
@@ -0,0 +1,102 @@
+"""Defines SortedIndex, which keeps objects sorted by a numeric key such as a timestamp.
+
+We keep a list of (key, UID, id(object)) sorted ascending, so the objects
+whose keys lie above or below a given value are a suffix or prefix that
+bisection finds in O(log N) time. Reading k objects costs O(k).
+
+When an object's key changes we bisect to its old position and insert it at its
+new one. Python lists shift their tails with memmove, which is O(N) in theory
+but negligible next to the Python-level work of any caller.
+
+See ActivityIndex and ReviewQueue.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import bisect
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+Key = Tuple[float, int, int]  # (sort key, UID, id(object))
+
+
+class SortedIndex(object):
+  """Orders objects having UIDs by sort_key(object), breaking ties by UID.
+
+  We identify objects by id() because, unlike UIDs, ids are unique even while
+  the mergeprotobufs API allows two objects with the same UID.
+  """
+
+  def __init__(self, sort_key: Callable[[Any], float]) -> None:
+    self._sort_key = sort_key
+    self._keys: List[Key] = []  # sorted
+    self._key_by_id: Dict[int, Key] = {}  # id(object) => its key as of the last Add
+    self._object_by_id: Dict[int, Any] = {}
+
+  def __len__(self) -> int:
+    return len(self._keys)
+
+  def AddAll(self, objects: List[Any]) -> None:
+    """Adds the given objects, none of which may be present already, in O(N log N) time for N objects.
+
+    An object may appear more than once in objects.
+    """
+    sort_key = self._sort_key
+    object_by_id = dict(zip(map(id, objects), objects))
+    keys = [(sort_key(obj), obj.uid, i) for i, obj in object_by_id.items()]
+    self._key_by_id.update((key[2], key) for key in keys)
+    self._object_by_id.update(object_by_id)
+    keys.extend(self._keys)
+    keys.sort()
+    self._keys = keys
+
+  def Add(self, obj: Any) -> None:
+    """Adds obj, or notes a change to it. Cheap if its sort key and UID are unchanged."""
+    key = (self._sort_key(obj), obj.uid, id(obj))
+    old_key = self._key_by_id.get(key[2])
+    if old_key is not None:
+      if old_key == key:
+        return
+      self._Discard(old_key)
+    self._key_by_id[key[2]] = key
+    self._object_by_id[key[2]] = obj
+    bisect.insort(self._keys, key)
+
+  def Remove(self, obj: Any) -> None:
+    """Forgets obj if present."""
+    old_key = self._key_by_id.pop(id(obj), None)
+    if old_key is not None:
+      del self._object_by_id[old_key[2]]
+      self._Discard(old_key)
+
+  def _Discard(self, key: Key) -> None:
+    i = bisect.bisect_left(self._keys, key)
+    assert self._keys[i] == key, (i, key)
+    del self._keys[i]
+
+  def Greatest(self, k: int) -> List[Any]:
+    """Returns the k objects (or all, if fewer) with the greatest keys, greatest first."""
+    if k <= 0:
+      return []
+    return [self._object_by_id[key[2]] for key in reversed(self._keys[-k:])]
+
+  def Above(self, value: float) -> List[Any]:
+    """Returns the objects whose keys are greater than value, greatest first."""
+    i = bisect.bisect_left(self._keys, (value, float('inf')))
+    return [self._object_by_id[key[2]] for key in reversed(self._keys[i:])]
+
+  def Below(self, value: float) -> List[Any]:
+    """Returns the objects whose keys are less than value, least first."""
+    i = bisect.bisect_left(self._keys, (value, float('-inf')))
+    return [self._object_by_id[key[2]] for key in self._keys[:i]]
+
+  def LeastAtOrAbove(self, value: float) -> Optional[Tuple[float, Any]]:
+    """Returns (key, object) for the object with the least key not less than value, or None if there is none."""
+    i = bisect.bisect_left(self._keys, (value, float('-inf')))
+    if i == len(self._keys):
+      return None
+    key = self._keys[i]
+    return key[0], self._object_by_id[key[2]]
@@ -9,9 +9,8 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 from dateutil import tz
-from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar, Union, cast
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Type, TypeVar, Union, cast
 import datetime
-import heapq
 import six
 import time
 
@@ -20,14 +19,19 @@ from absl import flags  # type: ignore
 from google.protobuf.pyext._message import SetAllowOversizeProtos  # type: ignore
 
 from . import action
+from . import action_columns
+from . import activity_index
 from . import common
 from . import container
 from . import ctx
 from . import errors
 from . import folder
+from . import index
 from . import note
 from . import prj
 from . import pyatdl_pb2
+from . import tombstone
+from . import traversal
 from . import uid
 
 flags.DEFINE_string('inbox_project_name', 'inbox',
@@ -37,9 +41,17 @@ flags.DEFINE_bool(
     'This is very dangerous! We skip checks that make sure everything is '
     'well-formed. If you serialize (i.e., save) your to-do list without '
     'such checks, you may not be able to deserialize (i.e., load) it later.')
+flags.DEFINE_integer(
+    'pyatdl_full_wellformedness_check_interval', 100,
+    'CheckChangesAreWellFormed checks only what changed, except that every Nth call does a full check instead. '
+    'Zero means never.')
 flags.DEFINE_bool(
     'pyatdl_allow_infinite_memory_for_protobuf', False,
     'There is a 64MiB memory limit otherwise.')
+flags.DEFINE_integer(
+    'pyatdl_tombstone_lifetime_days', 365,
+    'Purging an item leaves a tombstone so that syncing does not resurrect the item. We forget tombstones this many '
+    'days old, after which a device that has not synced since may resurrect the item. Zero means never.')
 flags.DEFINE_string('pyatdl_separator', '/',
                     'In Folder names, which character separates parent from child?')
 
@@ -73,13 +85,17 @@ class ToDoList(object):
     inbox: Prj
     ctx_list: CtxList
     note_list: NoteList  # every auditable object has its own note; these are global
+    tombstones: TombstoneList  # what remains of purged items
   """
 
   def __init__(self,
                inbox: prj.Prj = None,
                root: folder.Folder = None,
                ctx_list: ctx.CtxList = None,
-               note_list: note.NoteList = None) -> None:
+               note_list: note.NoteList = None,
+               tombstones: tombstone.TombstoneList = None) -> None:
+    self._index = index.Index()
+    self._num_checks_since_full_check = 0
     self.inbox = inbox if inbox is not None else prj.Prj(name=FLAGS.inbox_project_name, the_uid=uid.INBOX_UID)
     if self.inbox.ctime is None or self.inbox.mtime is None:
       raise errors.DataError("ctime and mtime are required")
@@ -92,6 +108,41 @@ class ToDoList(object):
       raise errors.DataError("ctime and mtime are required")
     self.ctx_list = ctx_list if ctx_list is not None else ctx.CtxList()
     self.note_list = note_list if note_list is not None else note.NoteList()
+    self.tombstones = tombstones if tombstones is not None else tombstone.TombstoneList()
+
+  def _Replace(self, attr: str, value: Union[prj.Prj, folder.Folder, ctx.CtxList]) -> None:
+    """Replaces one of our top-level objects, keeping self._index up to date."""
+    old_value = self.__dict__.get(attr)
+    if old_value is not None:
+      self._index.Detach(old_value, None)
+    self.__dict__[attr] = value
+    self._index.Attach(value, None)
+    if attr == '_ctx_list':
+      self._index.NoteContextActivityChange()
+
+  @property
+  def inbox(self) -> prj.Prj:
+    return self.__dict__['_inbox']
+
+  @inbox.setter
+  def inbox(self, value: prj.Prj) -> None:
+    self._Replace('_inbox', value)
+
+  @property
+  def root(self) -> folder.Folder:
+    return self.__dict__['_root']
+
+  @root.setter
+  def root(self, value: folder.Folder) -> None:
+    self._Replace('_root', value)
+
+  @property
+  def ctx_list(self) -> ctx.CtxList:
+    return self.__dict__['_ctx_list']
+
+  @ctx_list.setter
+  def ctx_list(self, value: ctx.CtxList) -> None:
+    self._Replace('_ctx_list', value)
 
   def __str__(self):
     return self.__unicode__().encode('utf-8') if six.PY2 else self.__unicode__()
@@ -117,30 +168,38 @@ class ToDoList(object):
     return t.strip()
 
   def AsTaskPaper(self,
-                  lines: List[str],
+                  lines: Union[List[str], Dict[Hashable, List[str]]],
                   show_project: Callable[[prj.Prj], bool] = lambda _: True,
                   show_action: Callable[[action.Action], bool] = lambda _: True,
                   show_note: Callable[[str], bool] = lambda _: True,
                   hypertext_prefix: str = None,
-                  html_escaper: Callable[[str], str] = None) -> None:
+                  html_escaper: Callable[[str], str] = None,
+                  partition: Callable[[prj.Prj, Optional[action.Action]], Optional[Hashable]] = None,
+                  cache_key: Hashable = None) -> None:
     """Appends lines of text to lines in TaskPaper format.
 
+    Given a partition, we split the output into sections in a single pass. partition(p, None) names the section
+    listing the Prj p even if it has no Actions there (None means only sections listing its Actions).
+    partition(p, a) names the section listing the Action a of p (None means nowhere). A Prj appears in every section
+    so named, each time with only that section's Actions.
+
     Args:
-      lines: [unicode]
+      lines: [unicode]|{Hashable: [unicode]}  # the latter iff partition is given, with a key for every section
       show_project: lambda Prj: bool
       show_action: lambda Action: bool
       show_note: lambda str: bool
       hypertext_prefix: None|unicode  # URL fragment e.g. "/todo". if None,
                                       # output plain text
       html_escaper: lambda unicode: unicode
+      partition: None|lambda Prj, None|Action: None|Hashable
+      cache_key: None|Hashable  # see Prj.AsTaskPaper
     Returns:
       None
     """
+    context_names = {c.uid: six.text_type(c.name) for c in self.ctx_list.items}
+
     def ContextName(context_uid: int) -> str:
-      for i in self.ctx_list.items:
-        if i.uid == context_uid:
-          return six.text_type(i.name)
-      return 'impossible error so file a bug report please'
+      return context_names.get(context_uid, 'impossible error so file a bug report please')
 
     pairs = []
     for p, path in self.Projects():
@@ -167,18 +226,98 @@ class ToDoList(object):
         prefix = '@done ' + prefix
       if not p.is_active:
         prefix = '@inactive ' + prefix
-      p.AsTaskPaper(lines,
-                    context_name=ContextName,
-                    project_name_prefix=prefix,
-                    show_action=show_action,
-                    show_note=show_note,
-                    hypertext_prefix=hypertext_prefix,
-                    html_escaper=html_escaper)
+      if partition is None:
+        p.AsTaskPaper(cast(List[str], lines),
+                      context_name=ContextName,
+                      project_name_prefix=prefix,
+                      show_action=show_action,
+                      show_note=show_note,
+                      hypertext_prefix=hypertext_prefix,
+                      html_escaper=html_escaper,
+                      cache_key=cache_key)
+        continue
+      section_by_action_id = {id(a): partition(p, a) for a in p.items if show_action(a)}
+      sections = [partition(p, None)]
+      sections.extend(section_by_action_id.values())
+      for section in frozenset(s for s in sections if s is not None):
+
+        def IsInSection(a: action.Action, section: Hashable = section) -> bool:
+          return section_by_action_id.get(id(a)) == section
+
+        p.AsTaskPaper(cast(Dict[Hashable, List[str]], lines)[section],
+                      context_name=ContextName,
+                      project_name_prefix=prefix,
+                      show_action=IsInSection,
+                      show_note=show_note,
+                      hypertext_prefix=hypertext_prefix,
+                      html_escaper=html_escaper,
+                      cache_key=cache_key)
 
   def PurgeDeleted(self) -> None:
-    self.inbox.PurgeDeleted()
-    self.root.PurgeDeleted()
-    self.ctx_list.PurgeDeleted()
+    """Truly deletes deleted items, leaving tombstones behind (see module 'tombstone').
+
+    Before tombstones, purging was unsafe unless every device was in sync. Now the mergeprotobufs API sees the
+    tombstones and does not resurrect the items.
+    """
+    now = time.time()
+    for item, parent in self.inbox.PurgeDeleted() + self.root.PurgeDeleted():
+      self.tombstones.Add(item.uid, max(now, common.MaxTime(item)), parent.uid)
+    for context in self.ctx_list.PurgeDeleted():
+      self.tombstones.Add(context.uid, max(now, common.MaxTime(context)), None)
+    self.PruneTombstones()
+
+  def PruneTombstones(self) -> None:
+    """Forgets the tombstones older than --pyatdl_tombstone_lifetime_days so that they do not accumulate forever."""
+    if FLAGS.pyatdl_tombstone_lifetime_days > 0:
+      self.tombstones.PruneDiedBefore(time.time() - FLAGS.pyatdl_tombstone_lifetime_days * 24 * 60 * 60)
+
+  def AlmostPurge(self, the_action: action.Action) -> None:
+    """Truly deletes the given Action, leaving only a tombstone recording its UID (see module 'tombstone').
+
+    Raises:
+      NoSuchParentFolderError: the_action is not in this ToDoList
+    """
+    parent = self.ParentContainerOf(the_action)
+    for i, item in enumerate(parent.items):
+      if item is the_action:
+        del parent.items[i]  # our index notices this
+        break
+    self.tombstones.Add(the_action.uid, max(time.time(), common.MaxTime(the_action)), parent.uid)
+
+  def ApplyTombstones(self) -> None:
+    """Truly deletes each item that has a tombstone, unless the item changed after it died.
+
+    The mergeprotobufs API calls this after merging because the other device may have returned items that we purged.
+    An item outlives its tombstone if it changed after the tombstone's dtime, if it is a Container with an undeleted
+    descendant, or if it is a Ctx that something refers to. In that case we forget the tombstone.
+    """
+    for t in self.tombstones:
+      item = self.ObjectByUID(t.uid)
+      if item is None:
+        continue
+      outlives_tombstone = (item is self.inbox or item is self.root or common.MaxTime(item) > t.dtime
+                            or container.Container.HasLiveDescendant(item) or self._IsReferenced(item))
+      if outlives_tombstone:
+        self.tombstones.Remove(t.uid)
+        continue
+      if isinstance(item, ctx.Ctx):
+        self.ctx_list.items[:] = [c for c in self.ctx_list.items if c is not item]
+        continue
+      if isinstance(item, container.Container):
+        for descendant, parent in item.PurgeDeleted():
+          self.tombstones.Add(descendant.uid, t.dtime, parent.uid)
+        if item.items:  # an undeleted grandchild, say
+          self.tombstones.Remove(t.uid)
+          continue
+      self.TrulyDeleteByUid(uid=t.uid)
+
+  def _IsReferenced(self, item: Union[action.Action, container.Container, ctx.Ctx]) -> bool:
+    """Returns True iff item is a Ctx that some Action or Prj refers to."""
+    if not isinstance(item, ctx.Ctx):
+      return False
+    if self._index.MaterializedActionsInContext(item.uid):
+      return True
+    return any(p.default_context_uid == item.uid for p, _ in self.Projects())
 
   def DeleteCompleted(self) -> None:
     self.inbox.DeleteCompleted()
@@ -195,17 +334,36 @@ class ToDoList(object):
     for p, path in self.ContainersPreorder():
       if not isinstance(p, prj.Prj):
         continue
-      for element in path:
-        if not isinstance(element, folder.Folder):
-          raise TypeError
+      # Checking the parent suffices because each ancestor is also a parent:
+      if path and not isinstance(path[0], folder.Folder):
+        raise TypeError
       yield (p, cast(List[folder.Folder], path))
 
-  def ProjectsToReview(self) -> Iterator[Tuple[prj.Prj, List[folder.Folder]]]:
-    """Yields: (prj.Prj, [Container])."""
-    now = time.time()
-    for p, path in self.Projects():
-      if p.NeedsReview(now):
-        yield (p, path)
+  def ProjectsToReview(self, now: float = None) -> Iterator[Tuple[prj.Prj, List[folder.Folder]]]:
+    """Yields the Prjs needing review (see Prj.NeedsReview) in the order of Projects().
+
+    This takes O(log N + K log K) time for K such Prjs out of N, apart from the first call, which indexes every Prj
+    (see review_queue.ReviewQueue).
+
+    Args:
+      now: None|float  # seconds since the epoch; None means the current time
+    Yields:
+      (Prj, [Folder])  # The path is leaf first.
+    """
+    due = self._index.ReviewQueue().Due(time.time() if now is None else now)
+    position = self._ContainerPosition()
+    for p in sorted(due, key=position):
+      yield (p, cast(List[folder.Folder], self._index.Path(p)))
+
+  def NextProjectToReview(self, now: float = None) -> Optional[Tuple[float, prj.Prj]]:
+    """Returns (when, Prj) for the Prj that will need review soonest after now, or None if there is none.
+
+    Args:
+      now: None|float  # seconds since the epoch; None means the current time
+    Returns:
+      None|(float, Prj)  # when is in seconds since the epoch
+    """
+    return self._index.ReviewQueue().Next(time.time() if now is None else now)
 
   def Folders(self) -> Iterator[Tuple[folder.Folder, List[folder.Folder]]]:
     """Returns all Folders and their paths.
@@ -218,9 +376,8 @@ class ToDoList(object):
     for f, path in self.ContainersPreorder():
       if not isinstance(f, folder.Folder):
         continue
-      for element in path:
-        if not isinstance(element, folder.Folder):
-          raise TypeError
+      if path and not isinstance(path[0], folder.Folder):
+        raise TypeError
       yield (f, cast(List[folder.Folder], path))
 
   def Actions(self) -> Iterator[Tuple[action.Action, prj.Prj]]:
@@ -234,21 +391,96 @@ class ToDoList(object):
         assert isinstance(a, action.Action), 'p=%s item=%s' % (str(p), str(a))
         yield (a, p)
 
-  def ActionsInContext(self, ctx_uid: Optional[int]) -> Iterator[Tuple[action.Action, prj.Prj]]:
+  def ActionsInContext(self, ctx_uid: Optional[int], *, ordered: bool = True) -> Iterator[Tuple[action.Action, prj.Prj]]:
     """Iterates over all Actions in the specified Ctx.
 
+    The cost is proportional to the size of the projects containing such Actions, not the size of this ToDoList. It
+    is safe to change the ctx_uid of the yielded Actions.
+
     Args:
       ctx_uid: int|None  # For None, we return actions without a context.
+      ordered: bool  # If true, yield in the order that Actions() would. Else the order is arbitrary (but cheaper).
     Yields:
       (Action, Prj)
     """
-    for a, p in self.Actions():
-      if ctx_uid is None:
-        if a.ctx_uid is None:
-          yield a, p
-      else:
-        if a.ctx_uid is not None and a.ctx_uid == ctx_uid:
-          yield a, p
+    pairs: List[Tuple[action.Action, prj.Prj]] = [
+      (a, cast(prj.Prj, self._index.ParentOf(a))) for a in self._index.ActionsInContext(ctx_uid)]
+    if ordered:
+      pairs = self._InTreeOrder(pairs)
+    yield from pairs
+
+  def NoteChecksum(self, checksum: str) -> None:
+    """Records a checksum of our serialization as we are now, e.g. the one verified when loading us.
+
+    Caches of results computed from us (see module 'query') use it as a key until we change. Changes to note_list do
+    not count.
+    """
+    self._index.NoteChecksum(checksum)
+
+  def ChecksumIfUnmodified(self) -> Optional[str]:
+    """Returns the argument to the last NoteChecksum unless a Folder, Prj, Action, or Ctx changed since."""
+    return self._index.ChecksumIfUnmodified()
+
+  def ActionColumns(self) -> action_columns.ActionColumns:
+    """Returns a snapshot of all Actions for use with ViewFilter.ActionMask. It does not reflect later changes."""
+    return action_columns.ActionColumns((p for p, unused_path in self.Projects()), self.ctx_list.items)
+
+  def _InTreeOrder(self, pairs: List[Tuple[action.Action, prj.Prj]]) -> List[Tuple[action.Action, prj.Prj]]:
+    """Sorts (Action, Prj) pairs into the order of Actions()."""
+    position = self._ContainerPosition()
+    action_positions: Dict[int, int] = {}
+    for a, p in pairs:
+      if id(a) not in action_positions:
+        for i, item in enumerate(p.items):
+          action_positions[id(item)] = i
+    return sorted(pairs, key=lambda pair: (position(pair[1]), action_positions[id(pair[0])]))
+
+  def _ContainerPosition(self) -> Callable[[container.Container], Tuple[int, ...]]:
+    """Returns a function giving keys that sort Containers in the order of ContainersPreorder().
+
+    The function remembers the positions it computes, so do not use it after the ToDoList changes.
+    """
+    positions: Dict[int, Tuple[int, ...]] = {}
+
+    def Position(c: container.Container) -> Tuple[int, ...]:
+      """Returns a key that sorts containers in the order of ContainersPreorder()."""
+      unpositioned = []
+      ancestor = c
+      while id(ancestor) not in positions:
+        parent = self._index.ParentOf(ancestor)
+        if parent is None:
+          positions[id(ancestor)] = (0,) if ancestor is self.inbox else (1,)
+          break
+        unpositioned.append(parent)
+        ancestor = parent
+      for parent in reversed(unpositioned):
+        parent_position = positions[id(parent)]
+        for i, sibling in enumerate(parent.items):
+          positions.setdefault(id(sibling), parent_position + (i,))
+      return positions[id(c)]
+
+    return Position
+
+  def _MaterializedContainers(self) -> Iterator[container.Container]:
+    """Like ContainersPreorder() but skips the descendants of Containers that are not yet materialized."""
+    def ChildContainers(c: container.Container) -> List[container.Container]:
+      return [item for item in c.MaterializedItems() if isinstance(item, container.Container)]
+
+    for top in (self.inbox, self.root):
+      for co, unused_path in traversal.Preorder(top, ChildContainers):
+        yield co
+
+  def _MaterializedItems(self) -> Iterator[Union[action.Action, container.Container, ctx.Ctx]]:
+    """Like Items() but skips the descendants of Containers that are not yet materialized (see DeserializedProtobuf)."""
+    for c in self.ctx_list.items:
+      yield c
+    containers = list(self._MaterializedContainers())
+    for co in containers:
+      yield co
+    for co in containers:
+      if isinstance(co, prj.Prj):
+        for a in co.MaterializedItems():
+          yield a
 
   def Items(self) -> Iterator[Union[action.Action, container.Container, ctx.Ctx]]:
     """Iterates through all Actions, Projects, Contexts, and Folders."""
@@ -265,33 +497,39 @@ class ToDoList(object):
     Args:
       ctx_uid: int
     """
-    for a, unused_prj in self.ActionsInContext(ctx_uid):
+    for a, unused_prj in self.ActionsInContext(ctx_uid, ordered=False):
       assert a.ctx_uid == ctx_uid, str(a)
       a.ctx_uid = None
     for p, unused_path in self.Projects():
       if p.default_context_uid == ctx_uid:
         p.default_context_uid = None
 
-  def ContainersPreorder(self) -> Iterator[Tuple[container.Container, List[container.Container]]]:
-    """Yields all containers, /inbox first, then the others in /."""
-    yield (self.inbox, [])
-    for f, path in self.root.ContainersPreorder():
-      yield (f, path)
+  def ContainersPreorder(self) -> Iterator[Tuple[container.Container, traversal.PathView]]:
+    """Yields all containers, /inbox first, then the others in /.
+
+    Yields:
+      (Container, PathView)  # The path is leaf first.
+    """
+    yield (self.inbox, traversal.EMPTY_PATH)
+    yield from self.root.ContainersPreorder()
 
   def ContextByName(self, ctx_name: str) -> Optional[ctx.Ctx]:
     """Returns the named Context if it exists, else None."""
-    for c in self.ctx_list.items:
-      if c.name == ctx_name:
-        return c
+    for c in self.ctx_list.ItemsNamed(ctx_name):
+      return c
     return None
 
   def ContextByUID(self, ctx_uid: int) -> Optional[ctx.Ctx]:
     """Returns the specified Context if it exists, else None."""
-    for c in self.ctx_list.items:
-      if c.uid == ctx_uid:
+    for c, unused_parent in self._index.Entries(ctx_uid):
+      if isinstance(c, ctx.Ctx):
         return c
     return None
 
+  def ObjectByUID(self, the_uid: int) -> Optional[Union[action.Action, container.Container, ctx.Ctx]]:
+    """Returns the specified Action/Prj/Folder/Ctx if it exists, else None."""
+    return self._index.ObjectByUID(the_uid)
+
   def ActionByUID(self, the_uid: int) -> Optional[Tuple[action.Action, prj.Prj]]:
     """Returns the specified Action (with its corresponding Prj) if it exists, else None.
 
@@ -300,8 +538,8 @@ class ToDoList(object):
     Returns:
       None|(Action, Prj)
     """
-    for a, project in self.Actions():
-      if a.uid == the_uid:
+    for a, project in self._index.Entries(the_uid):
+      if isinstance(a, action.Action):
         return (a, project)
     return None
 
@@ -313,9 +551,9 @@ class ToDoList(object):
     Returns:
       None|(Prj, [Folder])
     """
-    for p, path in self.Projects():
-      if p.uid == project_uid:
-        return (p, path)
+    for p, unused_parent in self._index.Entries(project_uid):
+      if isinstance(p, prj.Prj):
+        return (p, self._index.Path(p))
     return None
 
   def FolderByUID(self, folder_uid: int) -> Optional[Tuple[folder.Folder, List[folder.Folder]]]:
@@ -326,9 +564,9 @@ class ToDoList(object):
     Returns:
       None|(Folder, [Folder])
     """
-    for f, path in self.Folders():
-      if f.uid == folder_uid:
-        return (f, path)
+    for f, unused_parent in self._index.Entries(folder_uid):
+      if isinstance(f, folder.Folder):
+        return (f, self._index.Path(f))
     return None
 
   def ParentContainerOf(self, item: Union[action.Action, container.Container]) -> container.Container:
@@ -342,10 +580,8 @@ class ToDoList(object):
     if item is self.inbox:
       # TODO(chandler): Should inbox be in self.root.items?
       return self.root
-    for f, unused_path in self.ContainersPreorder():
-      for child in f.items:
-        if child is item:
-          return f
+    if item.parent is not None and item._index is self._index:
+      return item.parent
     # This is very probably a bug. Could be 'x is y' vs. 'x == y'; could be a
     # stale reference.
     raise NoSuchParentFolderError('The given item has no parent Container.')
@@ -360,7 +596,7 @@ class ToDoList(object):
     Raises:
       DuplicateContextError
     """
-    if context_name in [c.name for c in self.ctx_list.items]:
+    if self.ctx_list.ItemsNamed(context_name):
       raise DuplicateContextError(
         'A Context named "%s" already exists.' % context_name)
     new_ctx = ctx.Ctx(name=context_name)
@@ -378,23 +614,21 @@ class ToDoList(object):
     """
     if parent_folder_uid is None:
       parent_folder_uid = self.root.uid
-    for f, unused_path in self.ContainersPreorder():
-      if isinstance(f, prj.Prj):
-        continue
-      if f.uid == parent_folder_uid:
-        f.items.append(project_or_folder)
-        f.NoteModification()
-        break
+    folder_and_path = self.FolderByUID(parent_folder_uid)
+    if folder_and_path is not None:
+      f = folder_and_path[0]
+      f.items.append(project_or_folder)  # our index notices this
+      f.NoteModification()
     else:
       raise NoSuchParentFolderError(
         'No such parent folder with UID %s. project_or_folder=%s'
         % (parent_folder_uid, str(project_or_folder)))
 
   def RecentActivity(self, num_items: int = 5, max_name_length: int = 79) -> List[Dict[str, Union[float, str]]]:
-    # TODO(chandler37): This sorts the whole list; it's slower than necessary.
-    def Key(item: common.SupportsTimestamps) -> float:
-      return max(item.mtime, item.ctime, 0.0 if item.dtime is None else item.dtime)
+    """Returns the current time followed by the num_items most recently created, modified, or deleted items.
 
+    See activity_index.ActivityTime. Among items active at the same time, those with greater UIDs come first.
+    """
     def Val(number: float, name: str) -> Dict[str, Union[float, str]]:
       return {
         "timestamp": number,
@@ -403,10 +637,21 @@ class ToDoList(object):
         "name": name
       }
 
-    vals = [Val(Key(item), (item.name or '')[:max_name_length])
-            for item in heapq.nlargest(num_items, self.Items(), key=Key)]
+    vals = [Val(activity_index.ActivityTime(item), (item.name or '')[:max_name_length])
+            for item in self._index.ActivityIndex().MostRecent(num_items)]
     return [Val(time.time(), "current time")] + vals
 
+  def ItemsActiveSince(self, timestamp: float) -> List[Union[action.Action, container.Container, ctx.Ctx]]:
+    """Returns the Actions, Prjs, Ctxs, and Folders created, modified, or deleted after timestamp, latest first.
+
+    This takes O(log N + K) time for K such items out of N, apart from the first call, which indexes every item (see
+    activity_index.ActivityIndex). Beware that purged items are absent.
+
+    Args:
+      timestamp: float  # seconds since the epoch
+    """
+    return self._index.ActivityIndex().ActiveSince(timestamp)
+
   def CheckIsWellFormed(self) -> Dict[int, float]:
     """A noop unless the programmer made an error.
 
@@ -416,6 +661,9 @@ class ToDoList(object):
     other lists in the ToDoList, so it's probably very hard to avoid
     this method.
 
+    The objects that a lazily loaded ToDoList (see DeserializedProtobuf) has not yet materialized are unchanged since
+    they were last saved, which required this check, so we skip them and omit their UIDs from the result.
+
     Raises:
       errors.DataError: A "foreign key" does not exists; a UID is missing/duplicated; etc.
     Returns:
@@ -428,40 +676,103 @@ class ToDoList(object):
         if not item.uid:
           continue
         mtime_by_uid[item.uid] = item.mtime
+      self._NoteFullCheck()
       return mtime_by_uid
 
-    def SelfStr() -> str:  # pylint: disable=missing-docstring
-      saved_value = FLAGS.pyatdl_show_uid
-      FLAGS.pyatdl_show_uid = True
-      try:
-        return str(self)
-      finally:
-        FLAGS.pyatdl_show_uid = saved_value
-
-    for f, unused_path in self.root.ContainersPreorder():
-      f.CheckIsWellFormed()
+    items = list(self._MaterializedItems())
+    for item in items:
+      if isinstance(item, container.Container) and item is not self.inbox:
+        item.CheckIsWellFormed()
 
     # Verify that UIDs are unique globally (not just within Actions or Contexts):
-    for item in self.Items():
+    for item in items:
       if not item.uid:
         raise errors.DataError(
-          'Missing UID for item "%s". self=%s' % (str(item), SelfStr()))
+          'Missing UID for item "%s". self=%s' % (str(item), self._StrShowingUIDs()))
       if item.uid in mtime_by_uid:
         raise errors.DataError(
           'UID %s was used for two different objects' % item.uid)
       mtime_by_uid[item.uid] = item.mtime
 
-    for item in self.Items():
-      if isinstance(item, prj.Prj):
-        if item.default_context_uid is not None and item.default_context_uid not in mtime_by_uid:
-          raise errors.DataError(
-            'UID %s is a default_context_uid but that UID does not exist.' % item.default_context_uid)
-      if isinstance(item, action.Action):
-        if item.ctx_uid is not None and item.ctx_uid not in mtime_by_uid:
-          raise errors.DataError(
-            "UID %s is an action's context UID but that context does not exist." % item.ctx_uid)
+    for item in items:
+      self._CheckForeignKeys(item, lambda the_uid: the_uid in mtime_by_uid)
+    for t in self.tombstones:
+      if t.uid in mtime_by_uid:
+        raise errors.DataError(f'UID {t.uid} has a tombstone but is not dead')
+    self._NoteFullCheck()
     return mtime_by_uid
 
+  def CheckChangesAreWellFormed(self) -> None:
+    """Like CheckIsWellFormed but checks only what changed since the last check.
+
+    Our index journals the objects attached or modified and the objects detached (see module 'index'). We check the
+    former and what they refer to, and we check that nothing refers to the latter. We raise the same errors that
+    CheckIsWellFormed would. Every FLAGS.pyatdl_full_wellformedness_check_interval calls, we call CheckIsWellFormed
+    instead. Call that yourself when you want a full check.
+
+    Raises:
+      errors.DataError: A "foreign key" does not exists; a UID is missing/duplicated; etc.
+    """
+    if FLAGS.pyatdl_break_glass_and_skip_wellformedness_check:
+      self._index.ClearJournal()
+      return
+    self._num_checks_since_full_check += 1
+    interval = FLAGS.pyatdl_full_wellformedness_check_interval
+    if interval and self._num_checks_since_full_check >= interval:
+      self.CheckIsWellFormed()
+      return
+    touched, detached_uids = self._index.Journal()
+    for item in touched:
+      if isinstance(item, ctx.CtxList):
+        continue
+      if not item.uid:
+        raise errors.DataError(
+          'Missing UID for item "%s". self=%s' % (str(item), self._StrShowingUIDs()))
+    for the_uid in self._index.DuplicatedUIDs():
+      raise errors.DataError(
+        'UID %s was used for two different objects' % the_uid)
+    for item in touched:
+      if isinstance(item, ctx.CtxList):
+        continue
+      for o, parent in self._index.Entries(item.uid):
+        if o is item and isinstance(parent, container.Container) and parent is not self.inbox:
+          parent.CheckItemType(item)
+      self._CheckForeignKeys(item, self._index.Contains)
+    gone_uids = set(u for u in detached_uids if not self._index.Contains(u))
+    if gone_uids:
+      for the_uid in gone_uids:
+        for a in self._index.MaterializedActionsInContext(the_uid):
+          self._CheckForeignKeys(a, self._index.Contains)
+      for co in self._MaterializedContainers():
+        if isinstance(co, prj.Prj) and co.default_context_uid in gone_uids:
+          self._CheckForeignKeys(co, self._index.Contains)
+    self._index.ClearJournal()
+
+  def _NoteFullCheck(self) -> None:
+    self._index.ClearJournal()
+    self._num_checks_since_full_check = 0
+
+  @staticmethod
+  def _CheckForeignKeys(item: Union[action.Action, container.Container, ctx.Ctx],
+                        exists: Callable[[int], bool]) -> None:
+    """Raises errors.DataError if item refers to a UID that does not exist."""
+    if isinstance(item, prj.Prj):
+      if item.default_context_uid is not None and not exists(item.default_context_uid):
+        raise errors.DataError(
+          'UID %s is a default_context_uid but that UID does not exist.' % item.default_context_uid)
+    if isinstance(item, action.Action):
+      if item.ctx_uid is not None and not exists(item.ctx_uid):
+        raise errors.DataError(
+          "UID %s is an action's context UID but that context does not exist." % item.ctx_uid)
+
+  def _StrShowingUIDs(self) -> str:
+    saved_value = FLAGS.pyatdl_show_uid
+    FLAGS.pyatdl_show_uid = True
+    try:
+      return str(self)
+    finally:
+      FLAGS.pyatdl_show_uid = saved_value
+
   def MergeNoteList(self, other: pyatdl_pb2.NoteList) -> None:
     """repeated Note notes = 2;
 
@@ -499,29 +810,25 @@ class ToDoList(object):
         # TODO(chandler): check if the UID is in use by some non-Context entity. Duplicate if you must, but then the
         # duplication will happen again each time the mergeprotobufs API is used.
         self.ctx_list.items.append(
-          ctx.Ctx.DeserializedProtobuf(
-            context.SerializeToString()))
+          ctx.Ctx.FromProtobufMessage(context))
 
   @staticmethod
-  def _FindExistingProjectByUidInRemote(*, root: pyatdl_pb2.Folder, uid: int, path: List[pyatdl_pb2.Folder]) -> List[pyatdl_pb2.Folder]:
-    new_path = [root] + path
-    for p in root.projects:
-      if uid == p.common.uid:
-        return new_path
-    for f in root.folders:
-      result = ToDoList._FindExistingProjectByUidInRemote(root=f, uid=uid, path=new_path)
-      if result:
-        return result
+  def _FindExistingProjectByUidInRemote(*, root: pyatdl_pb2.Folder, uid: int) -> List[pyatdl_pb2.Folder]:
+    """Returns the path (leaf first, starting with the parent Folder) to the specified project, or [] if not found."""
+    for f, path in traversal.Preorder(root, lambda f: f.folders):
+      for p in f.projects:
+        if uid == p.common.uid:
+          return list(path.Pushed(f))
     return []
 
   def TrulyDeleteByUid(self, *, uid: int) -> bool:
     """Returns True iff the true deletion happened."""
-    for cc in [self.inbox, self.root]:
-      result = getattr(cc, 'TrulyDeleteByUid')(uid=uid)
-      if not isinstance(result, bool):
-        raise TypeError
-      if result:
-        return True
+    for item, parent in self._index.Entries(uid):
+      if isinstance(parent, container.Container):
+        for i, child in enumerate(parent.items):
+          if child is item:
+            del parent.items[i]  # our index notices this
+            return True
     return False
 
   def MergeRoot(self, other: pyatdl_pb2.Folder, *, mtimes_by_uid_in_remote_to_do_list: Dict[int, float]) -> None:
@@ -533,7 +840,7 @@ class ToDoList(object):
       find_existing_folder_by_uid=self.FolderByUID,
       find_existing_project_by_uid=self.ProjectByUID,
       find_existing_action_by_uid=self.ActionByUID,
-      find_existing_project_by_uid_in_remote=lambda uid: self._FindExistingProjectByUidInRemote(root=other, uid=uid, path=[]),
+      find_existing_project_by_uid_in_remote=lambda uid: self._FindExistingProjectByUidInRemote(root=other, uid=uid),
       truly_delete_by_uid=self.TrulyDeleteByUid)
 
   def AsProto(self, pb: Optional[pyatdl_pb2.ToDoList] = None) -> pyatdl_pb2.ToDoList:
@@ -550,11 +857,56 @@ class ToDoList(object):
     self.root.AsProto(pb.root)
     self.ctx_list.AsProto(pb.ctx_list)
     self.note_list.AsProto(pb.note_list)
+    if self.tombstones:
+      self.tombstones.AsProto(pb.tombstones)
     return pb
 
+  def ProtobufNestingDepth(self) -> int:
+    """Returns how deeply messages nest within self.AsProto(), counting the pyatdl.ToDoList itself as depth 0.
+
+    The protobuf library refuses to parse messages nested too deeply (see
+    serialization.SerializedWithChecksum), and only Folders nest without bound.
+    """
+    # inbox.actions[i].common.timestamp and ctx_list.contexts[i].common.timestamp are 4 deep:
+    return max(4, self.root.ProtobufNestingDepth())
+
+  def SerializedProtobuf(self) -> bytes:
+    """Returns self.AsProto().SerializeToString().
+
+    The inbox and the Folders and Prjs cache their serializations, so this costs time proportional to what changed
+    since the last call (see Container.SerializedProtobuf).
+    """
+    rest = pyatdl_pb2.ToDoList()
+    self.ctx_list.AsProto(rest.ctx_list)
+    self.note_list.AsProto(rest.note_list)
+    if self.tombstones:
+      self.tombstones.AsProto(rest.tombstones)
+    # Fields are serialized in the order of their field numbers; inbox and root come first:
+    assert (pyatdl_pb2.ToDoList.INBOX_FIELD_NUMBER
+            < pyatdl_pb2.ToDoList.ROOT_FIELD_NUMBER
+            < min(pyatdl_pb2.ToDoList.CTX_LIST_FIELD_NUMBER, pyatdl_pb2.ToDoList.NOTE_LIST_FIELD_NUMBER,
+                  pyatdl_pb2.ToDoList.TOMBSTONES_FIELD_NUMBER))
+    return b''.join([
+      common.LengthDelimitedField(pyatdl_pb2.ToDoList.INBOX_FIELD_NUMBER, self.inbox.SerializedProtobuf()),
+      common.LengthDelimitedField(pyatdl_pb2.ToDoList.ROOT_FIELD_NUMBER, self.root.SerializedProtobuf()),
+      rest.SerializeToString()])
+
   @classmethod
-  def DeserializedProtobuf(cls: Type[T], bytestring: six.binary_type) -> T:
-    """Deserializes a ToDoList from the given protocol buffer."""
+  def DeserializedProtobuf(cls: Type[T], bytestring: six.binary_type, *, lazy: bool = False, check: bool = True) -> T:
+    """Deserializes a ToDoList from the given protocol buffer.
+
+    Args:
+      bytestring: bytes
+      lazy: bool  # If true, we build the items of a Folder or Prj only when something first needs them (see
+                  # Container.IsMaterialized), keeping the parsed protocol buffer in the meantime. A request that
+                  # touches a small part of a large ToDoList is then much faster.
+      check: bool  # If false, we skip CheckIsWellFormed, trusting bytestring because we checked it before saving it
+                   # and its checksum matches. Duplicated UIDs still raise errors.DataError.
+    Returns:
+      ToDoList
+    Raises:
+      errors.DataError
+    """
     assert bytestring
     assert type(bytestring) == six.binary_type, type(bytestring)
     SetAllowOversizeProtos(FLAGS.pyatdl_allow_infinite_memory_for_protobuf)
@@ -573,15 +925,46 @@ class ToDoList(object):
       raise errors.DataError(f"protocol buffer error: the Inbox project, with UID={uid.INBOX_UID}, is required")
     if not pb.HasField('root'):
       raise errors.DataError(f"protocol buffer error: the root folder, with UID={uid.ROOT_FOLDER_UID}, is required")
-    inbox = prj.Prj.DeserializedProtobuf(pb.inbox.SerializeToString())
-    root = folder.Folder.DeserializedProtobuf(pb.root.SerializeToString())
-    serialized_ctx_list = pb.ctx_list.SerializeToString()
-    if len(pb.ctx_list.contexts) > 0:
-      ctx_list = ctx.CtxList.DeserializedProtobuf(serialized_ctx_list)
+    # We build objects straight from the parsed submessages rather than reserializing them:
+    inbox = prj.Prj.FromProtobufMessage(pb.inbox, lazy=lazy)
+    root = folder.Folder.FromProtobufMessage(pb.root, lazy=lazy)
+    ctx_list = ctx.CtxList.FromProtobufMessage(pb.ctx_list)
+    note_list = note.NoteList.FromProtobufMessage(pb.note_list)
+    tombstones = tombstone.TombstoneList.FromProtobufMessage(pb.tombstones)
+    for t in tombstones:  # A new item must not take the UID of a dead one.
+      uid.singleton_factory.NoteExistingUID(t.uid)
+    rv = cls(inbox=inbox, root=root, ctx_list=ctx_list, note_list=note_list, tombstones=tombstones)
+    if lazy:
+      rv._NoteUnmaterialized(pb)
+    if check:
+      rv.CheckIsWellFormed()
     else:
-      ctx_list = ctx.CtxList(deserializing=True)
-    serialized_note_list = pb.note_list.SerializeToString()
-    note_list = note.NoteList.DeserializedProtobuf(serialized_note_list)
-    rv = cls(inbox=inbox, root=root, ctx_list=ctx_list, note_list=note_list)
-    rv.CheckIsWellFormed()
+      rv._NoteFullCheck()
     return rv
+
+  def _NoteUnmaterialized(self, pb: pyatdl_pb2.ToDoList) -> None:
+    """Notes the UIDs in pb, the source of our lazily loaded inbox and root Folder, and tells our index about them.
+
+    Noting every UID up front is cheaper than materializing and keeps uid.singleton_factory from reusing a UID.
+    """
+    note_existing_uid = uid.singleton_factory.NoteExistingUID
+    note_unmaterialized = self._index.NoteUnmaterialized
+
+    def NoteActions(pb_project: pyatdl_pb2.Project) -> None:
+      project_uid = pb_project.common.uid
+      for pb_action in pb_project.actions:
+        note_existing_uid(pb_action.common.uid)
+        note_unmaterialized(pb_action.common.uid, project_uid)
+
+    note_existing_uid(pb.inbox.common.uid)
+    NoteActions(pb.inbox)
+    note_existing_uid(pb.root.common.uid)
+    for pb_folder, unused_path in traversal.Preorder(pb.root, lambda f: f.folders):
+      folder_uid = pb_folder.common.uid
+      for pb_subfolder in pb_folder.folders:
+        note_existing_uid(pb_subfolder.common.uid)
+        note_unmaterialized(pb_subfolder.common.uid, folder_uid)
+      for pb_project in pb_folder.projects:
+        note_existing_uid(pb_project.common.uid)
+        note_unmaterialized(pb_project.common.uid, folder_uid)
+        NoteActions(pb_project)
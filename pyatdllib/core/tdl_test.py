@@ -4,10 +4,16 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import copy
+
 from absl import flags  # type: ignore
 
 from google.protobuf import text_format  # type: ignore
 
+from pyatdllib.core import action
+from pyatdllib.core import container
+from pyatdllib.core import folder
+from pyatdllib.core import prj
 from pyatdllib.core import pyatdl_pb2
 from pyatdllib.core import errors
 from pyatdllib.core import tdl
@@ -491,6 +497,527 @@ note_list {
       self.assertEqual("UID -14 is a default_context_uid but that UID does not exist.", str(e))
       raised = True
 
+  def testUIDIndex(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='p', items=[action.Action(name='a0')])
+    lst.AddProjectOrFolder(p, parent_folder_uid=f.uid)
+    a0 = p.items[0]
+    a1 = action.Action(name='a1')
+    p.items.append(a1)
+    self.assertEqual(lst.ActionByUID(a1.uid), (a1, p))
+    self.assertEqual(lst.ActionByUID(a0.uid), (a0, p))
+    self.assertEqual(lst.ProjectByUID(p.uid), (p, [f, lst.root]))
+    self.assertEqual(lst.FolderByUID(f.uid), (f, [lst.root]))
+    self.assertEqual(lst.ProjectByUID(lst.inbox.uid), (lst.inbox, []))
+    self.assertIsNone(lst.ProjectByUID(f.uid))
+    self.assertIsNone(lst.FolderByUID(p.uid))
+    self.assertIs(lst.ObjectByUID(p.uid), p)
+    c_uid = lst.AddContext('@home')
+    self.assertEqual(lst.ContextByUID(c_uid).name, '@home')
+
+    # Moving an action, adding to the new parent first:
+    lst.inbox.items.append(a1)
+    del p.items[1]
+    self.assertEqual(lst.ActionByUID(a1.uid), (a1, lst.inbox))
+
+    # Moving a folder moves its descendants:
+    g = folder.Folder(name='g')
+    lst.AddProjectOrFolder(g)
+    del lst.root.items[0]
+    self.assertIsNone(lst.ActionByUID(a0.uid))
+    g.items.append(f)
+    self.assertEqual(lst.ActionByUID(a0.uid), (a0, p))
+    self.assertEqual(lst.ProjectByUID(p.uid), (p, [f, g, lst.root]))
+
+    self.assertTrue(lst.TrulyDeleteByUid(uid=a0.uid))
+    self.assertFalse(lst.TrulyDeleteByUid(uid=a0.uid))
+    self.assertIsNone(lst.ActionByUID(a0.uid))
+
+    p.is_deleted = True
+    lst.PurgeDeleted()
+    self.assertIsNone(lst.ProjectByUID(p.uid))
+    self.assertEqual(lst.FolderByUID(f.uid), (f, [g, lst.root]))
+
+    old_inbox = lst.inbox
+    uid.ResetNotesOfExistingUIDs(allow_duplication=True)
+    lst.inbox = prj.Prj(the_uid=uid.INBOX_UID, name='new inbox')
+    self.assertIsNone(lst.ActionByUID(a1.uid))
+    self.assertIs(lst.ProjectByUID(uid.INBOX_UID)[0], lst.inbox)
+    self.assertIsNot(lst.inbox, old_inbox)
+
+  def testActionsInContext(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p0 = prj.Prj(name='p0')
+    p1 = prj.Prj(name='p1')
+    lst.AddProjectOrFolder(p1, parent_folder_uid=f.uid)
+    lst.AddProjectOrFolder(p0)
+    a0 = action.Action(name='a0', ctx_uid=home_uid)
+    a1 = action.Action(name='a1')
+    a2 = action.Action(name='a2', ctx_uid=home_uid)
+    a3 = action.Action(name='a3')
+    p0.items.append(a0)
+    p1.items.extend([a1, a2])
+    lst.inbox.items.append(a3)
+
+    def Names(ctx_uid):
+      return [(a.name, p.name) for a, p in lst.ActionsInContext(ctx_uid)]
+
+    self.assertEqual(Names(home_uid), [('a2', 'p1'), ('a0', 'p0')])
+    self.assertEqual(Names(None), [('a3', 'inbox'), ('a1', 'p1')])
+    self.assertEqual(Names(home_uid), [(a.name, p.name) for a, p in lst.Actions() if a.ctx_uid == home_uid])
+    a3.ctx_uid = home_uid
+    self.assertEqual(Names(home_uid), [('a3', 'inbox'), ('a2', 'p1'), ('a0', 'p0')])
+    self.assertEqual(Names(None), [('a1', 'p1')])
+    del p1.items[:]
+    self.assertEqual(Names(home_uid), [('a3', 'inbox'), ('a0', 'p0')])
+    self.assertEqual(Names(None), [])
+    lst.RemoveReferencesToContext(home_uid)
+    self.assertEqual(Names(home_uid), [])
+    self.assertEqual(sorted(a.name for a, _ in lst.ActionsInContext(None, ordered=False)), ['a0', 'a3'])
+
+  def testParentPointers(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    g = folder.Folder(name='g', items=[f])
+    lst.AddProjectOrFolder(g)
+    p = prj.Prj(name='p')
+    lst.AddProjectOrFolder(p, parent_folder_uid=f.uid)
+    a = action.Action(name='a')
+    p.items.append(a)
+    self.assertIs(a.parent, p)
+    self.assertEqual(a.Ancestors(), [p, f, g, lst.root])
+    self.assertIs(lst.ParentContainerOf(a), p)
+    self.assertIs(lst.ParentContainerOf(f), g)
+    self.assertIs(lst.ParentContainerOf(lst.inbox), lst.root)
+    with self.assertRaises(tdl.NoSuchParentFolderError):
+      lst.ParentContainerOf(lst.root)
+    lst.inbox.items.append(a)
+    del p.items[0]
+    self.assertIs(lst.ParentContainerOf(a), lst.inbox)
+    lst.TrulyDeleteByUid(uid=a.uid)
+    self.assertIsNone(a.parent)
+    with self.assertRaises(tdl.NoSuchParentFolderError):
+      lst.ParentContainerOf(a)
+
+  def testNameIndex(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p0 = prj.Prj(name='p')
+    p1 = prj.Prj(name='p')
+    lst.AddProjectOrFolder(p0, parent_folder_uid=f.uid)
+    lst.AddProjectOrFolder(p1, parent_folder_uid=f.uid)
+    self.assertEqual(f.ItemsNamed('p'), [p0, p1])
+    f.items.insert(0, f.items.pop())
+    self.assertEqual(f.ItemsNamed('p'), [p1, p0])
+    p1.name = 'q'
+    self.assertEqual(f.ItemsNamed('p'), [p0])
+    self.assertEqual(f.ItemsNamed('q'), [p1])
+    lst.root.items.append(p1)
+    del f.items[0]
+    self.assertEqual(f.ItemsNamed('q'), [])
+    self.assertEqual(lst.root.ItemsNamed('q'), [p1])
+
+    home_uid = lst.AddContext('@home')
+    with self.assertRaises(tdl.DuplicateContextError):
+      lst.AddContext('@home')
+    lst.ContextByUID(home_uid).name = '@house'
+    self.assertIsNone(lst.ContextByName('@home'))
+    self.assertEqual(lst.ContextByName('@house').uid, home_uid)
+    self.assertEqual(lst.ctx_list.ContextUIDFromName('@house'), home_uid)
+    lst.AddContext('@home')
+
+  def testDeepcopy(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='p')
+    lst.AddProjectOrFolder(p, parent_folder_uid=f.uid)
+    p.items.append(action.Action(name='a'))
+    for original in (prj.Prj(name='standalone', items=[action.Action(name='b')]), p, f):
+      the_copy = copy.deepcopy(original)
+      self.assertEqual(the_copy.AsProto().SerializeToString(), original.AsProto().SerializeToString())
+      for c, unused_path in the_copy.ContainersPreorder():
+        for item in c.items:
+          self.assertIs(item.parent, c)
+          self.assertEqual(c.ItemsNamed(item.name), [item])
+      the_copy.items.append(action.Action(name='c') if isinstance(the_copy, prj.Prj) else prj.Prj(name='c'))
+      self.assertEqual(the_copy.ItemsNamed('c'), [the_copy.items[-1]])
+      self.assertEqual(original.ItemsNamed('c'), [])
+    self.assertEqual([a.name for a, unused_p in lst.Actions()], ['a'])
+    lst_copy = copy.deepcopy(lst)
+    self.assertEqual(lst_copy.AsProto().SerializeToString(), lst.AsProto().SerializeToString())
+    lst_copy.inbox.items.append(action.Action(name='d'))
+    self.assertEqual([a.name for a, unused_p in lst_copy.Actions()], ['d', 'a'])
+    self.assertEqual([a.name for a, unused_p in lst.Actions()], ['a'])
+
+  def testFromProtobufMessageMatchesConstructors(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    lst.ctx_list.items[0].note = 'ctx note'
+    f = folder.Folder(name='f', note='folder note')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='p', note='prj note', is_active=False, default_context_uid=home_uid,
+                max_seconds_before_review=7.0, last_review_epoch_sec=3.0)
+    lst.AddProjectOrFolder(p, parent_folder_uid=f.uid)
+    a = action.Action(name='a', note='action note', ctx_uid=home_uid)
+    a.is_complete = True
+    p.items.append(a)
+    lst.inbox.items.append(action.Action(name='b'))
+    lst.note_list.notes[':x'] = 'y'
+    p.is_deleted = True
+    bytestring = lst.AsProto().SerializeToString()
+
+    timestamps = ('ctime', 'mtime', 'dtime')
+
+    def Vars(o):
+      return {k: v for k, v in o._Fields().items()
+              if k not in timestamps + ('items', '_items_by_name', 'parent', '_index', '_ctx_list')}
+
+    def AllObjects(t):
+      return ([t.inbox, t.root] + list(t.inbox.items) + [c for c, _ in t.ContainersPreorder()]
+              + [x for x, _ in t.Actions()] + list(t.ctx_list.items))
+
+    uid.ResetNotesOfExistingUIDs()
+    fast = tdl.ToDoList.DeserializedProtobuf(bytestring)
+    self.assertEqual(fast.AsProto().SerializeToString(), bytestring)
+    self.assertEqual(str(fast), str(lst))
+    for expected, actual in zip(AllObjects(lst), AllObjects(fast)):
+      self.assertIs(type(actual), type(expected))
+      self.assertEqual(Vars(actual), Vars(expected))
+      for k in timestamps:  # serialized as microseconds, so they survive only approximately
+        if getattr(expected, k) is None:
+          self.assertIsNone(getattr(actual, k))
+        else:
+          self.assertAlmostEqual(getattr(actual, k), getattr(expected, k), places=5)
+    self.assertEqual(fast.note_list.notes, lst.note_list.notes)
+    self.assertEqual(len(AllObjects(fast)), len(AllObjects(lst)))
+
+  def testLazyDeserialization(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    g = folder.Folder(name='g')
+    lst.AddProjectOrFolder(g, parent_folder_uid=f.uid)
+    p = prj.Prj(name='p', items=[action.Action(name='a0', ctx_uid=home_uid), action.Action(name='a1')])
+    lst.AddProjectOrFolder(p, parent_folder_uid=g.uid)
+    q = prj.Prj(name='q', items=[action.Action(name='a2', ctx_uid=home_uid)])
+    lst.AddProjectOrFolder(q)
+    lst.inbox.items.append(action.Action(name='a3'))
+    a0_uid, a1_uid, a2_uid = p.items[0].uid, p.items[1].uid, q.items[0].uid
+    bytestring = lst.AsProto().SerializeToString()
+
+    uid.ResetNotesOfExistingUIDs()
+    lazy = tdl.ToDoList.DeserializedProtobuf(bytestring, lazy=True)
+    self.assertFalse(lazy.root.IsMaterialized())
+    self.assertFalse(lazy.inbox.IsMaterialized())
+    self.assertEqual(lazy.AsProto().SerializeToString(), bytestring)
+    self.assertFalse(lazy.root.IsMaterialized())
+
+    # Looking up an action materializes only the path to it:
+    a1, lazy_p = lazy.ActionByUID(a1_uid)
+    self.assertEqual(a1.name, 'a1')
+    self.assertEqual([c.name for c in a1.Ancestors()], ['p', 'g', 'f', ''])
+    lazy_f = lazy.root.items[0]
+    lazy_q = lazy.root.items[1]
+    self.assertTrue(lazy_f.IsMaterialized())
+    self.assertFalse(lazy_q.IsMaterialized())
+    self.assertFalse(lazy.inbox.IsMaterialized())
+    self.assertEqual(lazy.AsProto().SerializeToString(), bytestring)
+    self.assertFalse(lazy_q.IsMaterialized())
+
+    # UIDs of unmaterialized objects are not reused:
+    new_action = action.Action(name='new')
+    self.assertNotIn(new_action.uid, (a0_uid, a1_uid, a2_uid))
+
+    a1.name = 'a1 renamed'
+    lazy_p.items.append(new_action)
+    self.assertEqual(lazy.CheckIsWellFormed()[a1_uid], a1.mtime)
+    self.assertEqual([a.name for a, _ in lazy.ActionsInContext(home_uid)], ['a0', 'a2'])
+    self.assertTrue(lazy_q.IsMaterialized())
+
+    uid.ResetNotesOfExistingUIDs()
+    eager = tdl.ToDoList.DeserializedProtobuf(lazy.AsProto().SerializeToString())
+    self.assertEqual(str(eager), str(lazy))
+    self.assertEqual([a.name for a, _ in eager.Actions()], ['a3', 'a0', 'a1 renamed', 'new', 'a2'])
+
+  def testLazyDeserializationOfMovedAndDeletedContainers(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='p', items=[action.Action(name='a0')])
+    lst.AddProjectOrFolder(p, parent_folder_uid=f.uid)
+    g = folder.Folder(name='g')
+    lst.AddProjectOrFolder(g)
+    f_uid, p_uid, a0_uid, g_uid = f.uid, p.uid, p.items[0].uid, g.uid
+    bytestring = lst.AsProto().SerializeToString()
+
+    uid.ResetNotesOfExistingUIDs()
+    lazy = tdl.ToDoList.DeserializedProtobuf(bytestring, lazy=True)
+    lazy_f = lazy.ObjectByUID(f_uid)
+    self.assertFalse(lazy_f.IsMaterialized())
+    lazy.ObjectByUID(g_uid).items.append(lazy_f)
+    lazy.root.DeleteItemByUid(f_uid)
+    self.assertFalse(lazy_f.IsMaterialized())
+    self.assertEqual(lazy.ProjectByUID(p_uid)[1], [lazy_f, lazy.ObjectByUID(g_uid), lazy.root])
+
+    uid.ResetNotesOfExistingUIDs()
+    lazy = tdl.ToDoList.DeserializedProtobuf(bytestring, lazy=True)
+    self.assertTrue(lazy.TrulyDeleteByUid(uid=f_uid))
+    self.assertIsNone(lazy.ObjectByUID(p_uid))
+    self.assertIsNone(lazy.ActionByUID(a0_uid))
+    self.assertEqual([a for a, _ in lazy.Actions()], [])
+
+    uid.ResetNotesOfExistingUIDs()
+    with self.assertRaisesRegex(errors.DataError, 'duplicated'):
+      # Concatenation merges the messages, duplicating every Folder:
+      tdl.ToDoList.DeserializedProtobuf(bytestring + bytestring, lazy=True)
+
+  def testSerializedProtobufReusesCachedBytes(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    g = folder.Folder(name='g')
+    lst.AddProjectOrFolder(g, parent_folder_uid=f.uid)
+    p = prj.Prj(name='p', items=[action.Action(name='a0', ctx_uid=home_uid)])
+    lst.AddProjectOrFolder(p, parent_folder_uid=g.uid)
+    q = prj.Prj(name='q')
+    lst.AddProjectOrFolder(q)
+    lst.note_list.notes[':x'] = 'y'
+
+    def Check():
+      self.assertEqual(lst.SerializedProtobuf(), lst.AsProto().SerializeToString())
+
+    Check()
+    self.assertIsNotNone(q.__dict__['_serialized'])
+    a0 = p.items[0]
+    a0.is_complete = True
+    self.assertIsNone(p.__dict__['_serialized'])
+    self.assertIsNone(lst.root.__dict__['_serialized'])
+    self.assertIsNotNone(q.__dict__['_serialized'])
+    Check()
+    a0.mtime = 0.0
+    Check()
+    g.name = 'g renamed'
+    self.assertIsNotNone(p.__dict__['_serialized'])
+    Check()
+    p.items.append(action.Action(name='a1'))
+    Check()
+    lst.root.items.append(p)
+    del g.items[0]
+    Check()
+    other = prj.Prj(name='other')
+    other.SerializedProtobuf()
+    q.items.append(action.Action(name='a2'))
+    merged = q.items[0].AsProto()
+    merged.common.metadata.name = 'a2 merged'
+    merged.common.timestamp.mtime += 10**6
+    q.items[0].MergeFromProto(merged)
+    self.assertEqual(q.items[0].name, 'a2 merged')
+    Check()
+    lst.ctx_list.items[0].name = '@house'
+    lst.note_list.notes[':x'] = 'z'
+    Check()
+
+    uid.ResetNotesOfExistingUIDs()
+    lazy = tdl.ToDoList.DeserializedProtobuf(lst.SerializedProtobuf(), lazy=True)
+    self.assertEqual(lazy.SerializedProtobuf(), lst.SerializedProtobuf())
+    lazy.ActionByUID(a0.uid)[0].name = 'a0 renamed'
+    self.assertEqual(lazy.SerializedProtobuf(), lazy.AsProto().SerializeToString())
+
+  def testReorderingItems(self):
+    lst = tdl.ToDoList()
+    lst.AddContext('@home')
+    lst.AddContext('@work')
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    for name in ('p', 'q'):
+      lst.AddProjectOrFolder(prj.Prj(name=name, items=[action.Action(name='a'), action.Action(name='b')]),
+                             parent_folder_uid=f.uid)
+
+    def Reordered(items, reorder):
+      before = lst.SerializedProtobuf()
+      lst.NoteChecksum('before')
+      reorder(items)
+      self.assertIsNone(lst.ChecksumIfUnmodified())
+      self.assertNotEqual(lst.SerializedProtobuf(), before)
+      self.assertEqual(lst.SerializedProtobuf(), lst.AsProto().SerializeToString())
+      return [x.name for x in items]
+
+    for items in (f.items, f.items[0].items, lst.ctx_list.items):
+      names = [x.name for x in items]
+      self.assertEqual(Reordered(items, lambda x: x.reverse()), names[::-1])
+      self.assertEqual(Reordered(items, lambda x: x.sort(key=lambda y: y.name)), names)
+    p = f.items[0]
+    p.items *= 2
+    self.assertEqual([a.name for a in p.items], ['a', 'b', 'a', 'b'])
+    self.assertEqual(lst.SerializedProtobuf(), lst.AsProto().SerializeToString())
+    p.items *= 0
+    self.assertEqual(lst.SerializedProtobuf(), lst.AsProto().SerializeToString())
+    self.assertEqual(list(lst.ActionsInContext(None)), [(a, q) for q in f.items for a in q.items])
+
+  def testAggregates(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    g = folder.Folder(name='g')
+    f.items.append(g)
+    p = prj.Prj(name='p', items=[action.Action(name='a0', ctx_uid=home_uid), action.Action(name='a1')])
+    g.items.append(p)
+    q = prj.Prj(name='q', items=[action.Action(name='a2', ctx_uid=home_uid)])
+    f.items.append(q)
+
+    def Recounted(c):
+      incomplete_actions = [a for d, _ in c.ContainersPreorder() for a in d.items
+                            if isinstance(a, action.Action) and not a.is_deleted and not a.is_complete]
+      return container.AggregateCounts(
+        live_items=sum(1 for i in c.items if not i.is_deleted),
+        incomplete_items=sum(1 for i in c.items if hasattr(i, 'is_complete') and not i.is_complete and not i.is_deleted),
+        incomplete_actions=len(incomplete_actions),
+        actionable_actions=sum(1 for a in incomplete_actions
+                               if a.ctx_uid is None or lst.ContextByUID(a.ctx_uid).is_active))
+
+    def Check():
+      for c in [lst.inbox, lst.root, f, g, p, q]:
+        self.assertEqual(c.Aggregates(), Recounted(c), c.name)
+
+    Check()
+    self.assertEqual(lst.root.Aggregates(), container.AggregateCounts(1, 0, 3, 3))
+    p.items[0].is_complete = True
+    Check()
+    self.assertEqual(p.Aggregates(), container.AggregateCounts(2, 1, 1, 1))
+    self.assertIsNotNone(q.__dict__['_aggregates'])
+    q.is_complete = True
+    Check()
+    lst.ContextByUID(home_uid).is_active = False
+    Check()
+    self.assertEqual(q.Aggregates().actionable_actions, 0)
+    q.items[0].ctx_uid = None
+    Check()
+    lst.root.items.append(p)  # a move
+    del g.items[0]
+    Check()
+    self.assertEqual(g.Aggregates(), container.AggregateCounts(0, 0, 0, 0))
+    self.assertFalse(f.HasLiveDescendant(g))
+    f.DeleteChild(g)
+    Check()
+    with self.assertRaisesRegex(container.IllegalOperationError, 'a descendant is not deleted'):
+      lst.root.DeleteChild(p)
+    merged = p.items[1].AsProto()
+    merged.common.is_deleted = True
+    merged.common.timestamp.mtime += 10**6
+    p.items[1].MergeFromProto(merged)
+    self.assertTrue(p.items[1].is_deleted)
+    Check()
+    lst.root.DeleteCompleted()
+    Check()
+    self.assertFalse(q.is_deleted)  # because a2 is incomplete
+    self.assertTrue(p.items[0].is_deleted)
+
+  def testAsTaskPaperWithPartition(self):
+    FLAGS.pyatdl_separator = '/'
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    for name, is_active in (('b', True), ('a', False)):
+      p = prj.Prj(name=name)
+      p.is_active = is_active
+      lst.AddProjectOrFolder(p)
+      for action_name, is_complete in (('x', False), ('y', True)):
+        a = action.Action(name=name + action_name, ctx_uid=home_uid)
+        a.is_complete = is_complete
+        p.items.append(a)
+    lst.inbox.items.append(action.Action(name='i'))
+
+    def ShowActionInSection(section):
+      return lambda a: not a.name.endswith('x') if section else not a.name.endswith('y')
+
+    expected = {}
+    for section in (False, True):
+      expected[section] = []
+      lst.AsTaskPaper(expected[section],
+                      show_project=lambda p: p.name != 'inbox',
+                      show_action=ShowActionInSection(section))
+    sections = {False: [], True: []}
+    lst.AsTaskPaper(sections,
+                    show_project=lambda p: p.name != 'inbox',
+                    partition=lambda p, a: None if a is None else a.is_complete)
+    self.assertEqual(sections, expected)
+    self.assertEqual(sections[True], ['', '@inactive a:', '\t- ay @home @done', '', 'b:', '\t- by @home @done'])
+    # A Prj without Actions in a section appears there only if partition(p, None) names it:
+    sections = {False: [], True: []}
+    lst.AsTaskPaper(sections,
+                    show_action=lambda a: a.name != 'i',
+                    partition=lambda p, a: (p.name == 'inbox') if a is None else False)
+    self.assertEqual(sections[True], ['', 'inbox:'])
+    self.assertEqual([x for x in sections[False] if x.endswith(':')], ['@inactive a:', 'b:'])
+
+  def testCheckChangesAreWellFormed(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    work_uid = lst.AddContext('@work')
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='p', default_context_uid=work_uid)
+    f.items.append(p)
+    a = action.Action(name='a', ctx_uid=home_uid)
+    p.items.append(a)
+    lst.CheckChangesAreWellFormed()
+    self.assertEqual(lst._index.Journal(), ([], set()))
+
+    def AssertBothRaise(exception_type, regex):
+      with self.assertRaisesRegex(exception_type, regex):
+        lst.CheckChangesAreWellFormed()
+      with self.assertRaisesRegex(exception_type, regex):
+        lst.CheckIsWellFormed()
+
+    a.ctx_uid = 424242
+    AssertBothRaise(errors.DataError, "^UID 424242 is an action's context UID but that context does not exist.$")
+    a.ctx_uid = home_uid
+    lst.CheckChangesAreWellFormed()
+
+    home = lst.ctx_list.items.pop(0)
+    AssertBothRaise(errors.DataError, "^UID %s is an action's context UID" % home_uid)
+    lst.ctx_list.items.append(home)
+    lst.CheckChangesAreWellFormed()
+
+    work = lst.ctx_list.items.pop(0)
+    AssertBothRaise(errors.DataError, '^UID %s is a default_context_uid but that UID does not exist.$' % work_uid)
+    lst.ctx_list.items.append(work)
+    lst.CheckChangesAreWellFormed()
+
+    lst.inbox.items.append(a)
+    AssertBothRaise(errors.DataError, '^UID %s was used for two different objects$' % a.uid)
+    del lst.inbox.items[-1]
+    lst.CheckChangesAreWellFormed()
+
+    p.items.append(folder.Folder(name='misplaced'))
+    AssertBothRaise(AssertionError, 'not an acceptable type')
+    del p.items[-1]
+    lst.CheckChangesAreWellFormed()
+
+    saved_interval = FLAGS.pyatdl_full_wellformedness_check_interval
+    try:
+      object.__setattr__(a, 'ctx_uid', 424242)  # bypasses the journal
+      FLAGS.pyatdl_full_wellformedness_check_interval = 0
+      lst.CheckChangesAreWellFormed()
+      object.__setattr__(a, 'ctx_uid', home_uid)
+      lst.CheckIsWellFormed()
+      object.__setattr__(a, 'ctx_uid', 424242)
+      FLAGS.pyatdl_full_wellformedness_check_interval = 2
+      lst.CheckChangesAreWellFormed()
+      with self.assertRaisesRegex(errors.DataError, '424242'):
+        lst.CheckChangesAreWellFormed()
+    finally:
+      FLAGS.pyatdl_full_wellformedness_check_interval = saved_interval
+
 
 if __name__ == '__main__':
   unitjest.main()
@@ -0,0 +1,156 @@
+"""Defines TextIndex, which finds the objects whose names or notes contain a query.
+
+SearchFilter matches a query against names and notes case-insensitively as a
+substring. Rather than lowercasing and scanning every name and note for every
+query, we keep two inverted indices:
+
+  token => the objects whose lowercased name or note contains that token
+  trigram => the tokens containing that trigram
+
+where a token is a maximal run of word characters (regex \\w+) and a trigram is
+three consecutive characters. If a name contains the query then each token of
+the query lies within some token of the name, so the objects having, for each
+token of the query, a token containing it are candidates. The trigram index
+finds those tokens without scanning the vocabulary. We then check each candidate.
+
+Many objects share tokens (e.g., 'buy' or 'milk'), so we store far fewer entries
+than an index of each object's trigrams would.
+
+The Index of a ToDoList builds a TextIndex on demand and keeps it up to date as
+objects come, go, and change (see Index.TextIndex).
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import re
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+
+_MAX_MEMOIZED_QUERIES = 100
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _Trigrams(token: str) -> Set[str]:
+  return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _Lowercased(name: Any, note: Any) -> Tuple[str, str]:
+  return (name or '').lower(), (note or '').lower()
+
+
+def _Tokens(name: Any, note: Any) -> Set[str]:
+  """Returns the tokens of the lowercased name and note."""
+  return set(_TOKEN_RE.findall(' '.join(_Lowercased(name, note))))
+
+
+class TextIndex(object):
+  """Maps tokens and trigrams of lowercased names and notes to the objects whose names or notes contain them.
+
+  We identify objects by id() because, unlike UIDs, ids are unique even while
+  the mergeprotobufs API allows two objects with the same UID.
+  """
+
+  def __init__(self) -> None:
+    # id(object) => (object, name, note) as of the last Add:
+    self._entry_by_id: Dict[int, Tuple[Any, Any, Any]] = {}
+    self._ids_by_token: Dict[str, Set[int]] = {}
+    self._tokens_by_trigram: Dict[str, Set[str]] = {}
+    # lowercased query => the result of Matching, forgotten whenever we change:
+    self._matches_by_query: Dict[str, FrozenSet[int]] = {}
+
+  def __len__(self) -> int:
+    return len(self._entry_by_id)
+
+  def Add(self, obj: Any) -> None:
+    """Indexes obj's name and note, replacing what we indexed for obj before, if anything.
+
+    This is cheap if neither changed, so call it after any modification of obj.
+    """
+    key = id(obj)
+    name, note = obj.name, obj.note
+    entry = self._entry_by_id.get(key)
+    if entry is not None:
+      if entry[0] is obj and entry[1] == name and entry[2] == note:
+        return
+      self.Remove(entry[0])
+    self._entry_by_id[key] = (obj, name, note)
+    ids_by_token = self._ids_by_token
+    for token in _Tokens(name, note):
+      ids = ids_by_token.get(token)
+      if ids is None:
+        ids = ids_by_token[token] = set()
+        for trigram in _Trigrams(token):
+          self._tokens_by_trigram.setdefault(trigram, set()).add(token)
+      ids.add(key)
+    self._matches_by_query.clear()
+
+  def Remove(self, obj: Any) -> None:
+    """Unindexes obj, if we indexed it."""
+    key = id(obj)
+    entry = self._entry_by_id.pop(key, None)
+    if entry is None:
+      return
+    for token in _Tokens(entry[1], entry[2]):
+      ids = self._ids_by_token[token]
+      ids.discard(key)
+      if not ids:
+        del self._ids_by_token[token]
+        for trigram in _Trigrams(token):
+          tokens = self._tokens_by_trigram[trigram]
+          tokens.discard(token)
+          if not tokens:
+            del self._tokens_by_trigram[trigram]
+    self._matches_by_query.clear()
+
+  def _TokensContaining(self, piece: str) -> List[str]:
+    """Returns the indexed tokens of which piece, itself a token, is a substring."""
+    if len(piece) < 3:
+      return [token for token in self._ids_by_token if piece in token]
+    candidates = sorted((self._tokens_by_trigram.get(t, set()) for t in _Trigrams(piece)), key=len)
+    return [token for token in candidates[0].intersection(*candidates[1:]) if piece in token]
+
+  def _Candidates(self, query: str) -> Iterable[int]:
+    """Returns the ids of a superset of the objects whose name or note contains the lowercased query."""
+    pieces = sorted(set(_TOKEN_RE.findall(query)), key=len, reverse=True)
+    if not pieces:
+      return self._entry_by_id
+    result: Optional[Set[int]] = None
+    for piece in pieces:
+      if result is not None and len(piece) < 3:
+        break  # a short piece matches so many objects that checking the candidates we have is cheaper
+      ids: Set[int] = set()
+      for token in self._TokensContaining(piece):
+        ids.update(self._ids_by_token[token])
+      result = ids if result is None else result & ids
+      if not result:
+        break
+    assert result is not None  # because pieces is not empty
+    return result
+
+  def Matching(self, query: str) -> FrozenSet[int]:
+    """Returns the ids of the indexed objects whose name or note contains query, ignoring case.
+
+    Args:
+      query: str
+    Returns:
+      frozenset(int)  # see id()
+    """
+    query = query.lower()
+    result = self._matches_by_query.get(query)
+    if result is not None:
+      return result
+    entry_by_id = self._entry_by_id
+    result = frozenset(
+      i for i in self._Candidates(query) if any(query in text for text in _Lowercased(*entry_by_id[i][1:])))
+    if len(self._matches_by_query) >= _MAX_MEMOIZED_QUERIES:
+      self._matches_by_query.clear()
+    self._matches_by_query[query] = result
+    return result
+
+  def Matches(self, query: str, obj: Any) -> bool:
+    """Returns True iff obj's name or note contains query, ignoring case. obj must be indexed."""
+    return id(obj) in self.Matching(query)
@@ -0,0 +1,80 @@
+"""Unittests for module 'text_index'."""
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import folder
+from pyatdllib.core import prj
+from pyatdllib.core import tdl
+from pyatdllib.core import text_index
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+
+
+FLAGS = flags.FLAGS
+
+
+class TextIndexTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+
+  def testMatching(self):
+    ti = text_index.TextIndex()
+    a = action.Action(name='Buy MILK', note='at the store')
+    b = action.Action(name='call mom', note=None)
+    for x in (a, b):
+      ti.Add(x)
+    self.assertEqual(len(ti), 2)
+    self.assertEqual(ti.Matching('milk'), {id(a)})
+    self.assertEqual(ti.Matching('M'), {id(a), id(b)})
+    self.assertEqual(ti.Matching('E ST'), {id(a)})
+    self.assertEqual(ti.Matching('milkshake'), set())
+    self.assertTrue(ti.Matches('mom', b))
+    b.name = 'call dad'
+    self.assertTrue(ti.Matches('mom', b))  # we have not heard about the change yet
+    ti.Add(b)
+    self.assertFalse(ti.Matches('mom', b))
+    self.assertTrue(ti.Matches('dad', b))
+    ti.Remove(a)
+    ti.Remove(a)
+    self.assertEqual(ti.Matching('milk'), set())
+    self.assertEqual(len(ti), 1)
+
+  def testToDoListKeepsTheIndexUpToDate(self):
+    lst = tdl.ToDoList()
+    home_uid = lst.AddContext('@home')
+    f = folder.Folder(name='garden', note='weeds')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='tomatoes')
+    f.items.append(p)
+    a = action.Action(name='water the tomatoes', ctx_uid=home_uid)
+    p.items.append(a)
+
+    def Matching(query):
+      return {id(o) for o in lst.Items() if any(query.lower() in (t or '').lower() for t in (o.name, o.note))}
+
+    def Check(*queries):
+      ti = lst._index.TextIndex()
+      for query in queries:
+        self.assertEqual(ti.Matching(query), Matching(query), query)
+
+    Check('tomato', 'WEED', '@ho', 'e', 'nothing')
+    a.note = 'and the weeds'
+    f.name = 'yard'
+    lst.ContextByUID(home_uid).name = '@house'
+    Check('weeds', 'garden', 'yard', '@hous')
+    del f.items[0]
+    Check('tomato')
+    lst.inbox.items.append(action.Action(name='new tomato'))
+    merged = lst.inbox.items[-1].AsProto()
+    merged.common.metadata.note = 'merged note'
+    merged.common.timestamp.mtime += 10**6
+    lst.inbox.items[-1].MergeFromProto(merged)
+    Check('tomato', 'merged')
+
+
+if __name__ == '__main__':
+  unitjest.main()
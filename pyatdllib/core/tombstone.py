@@ -0,0 +1,136 @@
+"""Defines TombstoneList, which remembers the Actions, Prjs, Folders, and Ctxs that are gone.
+
+Another device may still have an item that we have purged. If we forgot the
+item entirely, the next sync (see module 'mergeprotobufs') would resurrect it.
+So for each purged item we keep a tombstone: its UID, the time it died, and the
+UID of its parent. That is all we keep; the item itself leaves the live tree
+and therefore leaves every traversal, view, and serialization of it.
+
+A tombstone loses to a copy of its item modified after it died (see
+ToDoList.ApplyTombstones). A tombstone older than
+--pyatdl_tombstone_lifetime_days is forgotten (see ToDoList.PruneTombstones),
+so a device that has not synced for that long may resurrect the item.
+
+In the protocol buffer (pyatdl.Tombstones) the three fields are parallel packed
+arrays, so a tombstone costs a few bytes rather than a whole pyatdl.Action.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import six
+
+from google.protobuf import message
+from typing import Dict, Iterator, NamedTuple, Optional, Type, TypeVar
+
+from . import common
+from . import errors
+from . import pyatdl_pb2
+from . import uid
+
+
+class Tombstone(NamedTuple):
+  """What we remember about a purged item."""
+  uid: int
+  dtime: float  # seconds since the epoch
+  parent_uid: int  # uid.DEFAULT_PROTOBUF_VALUE_FOR_ABSENT_UID for a Ctx
+
+
+T = TypeVar('T', bound='TombstoneList')
+
+
+class TombstoneList(object):
+  """Tombstones keyed by UID, in the order in which we added them."""
+
+  def __init__(self) -> None:
+    self._tombstones: Dict[int, Tombstone] = {}
+
+  def __str__(self):
+    return self.__unicode__().encode('utf-8') if six.PY2 else self.__unicode__()
+
+  def __unicode__(self) -> str:
+    return six.text_type(list(self._tombstones.values()))
+
+  def __len__(self) -> int:
+    return len(self._tombstones)
+
+  def __iter__(self) -> Iterator[Tombstone]:
+    return iter(list(self._tombstones.values()))
+
+  def __contains__(self, the_uid: int) -> bool:
+    return the_uid in self._tombstones
+
+  def Get(self, the_uid: int) -> Optional[Tombstone]:
+    return self._tombstones.get(the_uid)
+
+  def Add(self, the_uid: int, dtime: float, parent_uid: Optional[int]) -> None:
+    """Notes the death of the specified item. If it died twice, the later death wins.
+
+    Args:
+      the_uid: int
+      dtime: float  # seconds since the epoch
+      parent_uid: None|int  # None for a Ctx
+    """
+    if parent_uid is None:
+      parent_uid = uid.DEFAULT_PROTOBUF_VALUE_FOR_ABSENT_UID
+    existing = self._tombstones.get(the_uid)
+    if existing is None or existing.dtime < dtime:
+      self._tombstones[the_uid] = Tombstone(the_uid, dtime, parent_uid)
+
+  def Remove(self, the_uid: int) -> None:
+    """Forgets the tombstone for the given UID, if any."""
+    self._tombstones.pop(the_uid, None)
+
+  def PruneDiedBefore(self, horizon: float) -> None:
+    """Forgets the tombstones of items that died before horizon, in seconds since the epoch."""
+    self._tombstones = {u: t for u, t in self._tombstones.items() if t.dtime >= horizon}
+
+  def MergeFromProto(self, other: pyatdl_pb2.Tombstones) -> None:
+    """Adds the tombstones in other (see Add)."""
+    if not isinstance(other, pyatdl_pb2.Tombstones):
+      raise TypeError
+    for t in _TombstonesOfPb(other):
+      self.Add(t.uid, t.dtime, t.parent_uid)
+
+  def AsProto(self, pb: message.Message = None) -> message.Message:
+    if pb is None:
+      pb = pyatdl_pb2.Tombstones()
+    if not isinstance(pb, pyatdl_pb2.Tombstones):
+      raise TypeError
+    tombstones = list(self._tombstones.values())
+    pb.uid.extend(t.uid for t in tombstones)
+    # The same conversion as AuditableObject.AsProto, so that a tombstone and its item compare alike after a round trip:
+    pb.dtime.extend(int(t.dtime * 1e6) for t in tombstones)
+    pb.parent_uid.extend(t.parent_uid for t in tombstones)
+    return pb
+
+  @classmethod
+  def DeserializedProtobuf(cls: Type[T], bytestring: bytes) -> T:
+    """Deserializes a TombstoneList from the given protocol buffer.
+
+    Args:
+      bytestring: str
+    Returns:
+      TombstoneList
+    """
+    return cls.FromProtobufMessage(pyatdl_pb2.Tombstones.FromString(bytestring))  # pylint: disable=no-member
+
+  @classmethod
+  def FromProtobufMessage(cls: Type[T], pb: pyatdl_pb2.Tombstones) -> T:
+    """Like DeserializedProtobuf but starts from a parsed message.
+
+    Raises:
+      errors.DataError: The parallel arrays have different lengths.
+    """
+    tl = cls()
+    tl.MergeFromProto(pb)
+    return tl
+
+
+def _TombstonesOfPb(pb: pyatdl_pb2.Tombstones) -> Iterator[Tombstone]:
+  if not len(pb.uid) == len(pb.dtime) == len(pb.parent_uid):
+    raise errors.DataError(
+      f'pyatdl.Tombstones has {len(pb.uid)} UIDs, {len(pb.dtime)} dtimes, and {len(pb.parent_uid)} parent UIDs')
+  for the_uid, dtime, parent_uid in zip(pb.uid, pb.dtime, pb.parent_uid):
+    yield Tombstone(the_uid, common.FloatingPointTimestamp(dtime, zero_value=0.0), parent_uid)
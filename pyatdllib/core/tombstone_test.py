@@ -0,0 +1,125 @@
+"""Unittests for module 'tombstone'."""
+
+import time
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import errors
+from pyatdllib.core import folder
+from pyatdllib.core import prj
+from pyatdllib.core import pyatdl_pb2
+from pyatdllib.core import tdl
+from pyatdllib.core import tombstone
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+
+
+FLAGS = flags.FLAGS
+
+
+class TombstoneTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+
+  def testTombstoneList(self):
+    tl = tombstone.TombstoneList()
+    tl.Add(7, 100.5, 1)
+    tl.Add(-8, 200.0, None)
+    tl.Add(7, 50.0, 3)  # the earlier death loses
+    self.assertEqual(len(tl), 2)
+    self.assertIn(7, tl)
+    self.assertEqual(tl.Get(7), tombstone.Tombstone(7, 100.5, 1))
+    self.assertEqual(tl.Get(-8).parent_uid, uid.DEFAULT_PROTOBUF_VALUE_FOR_ABSENT_UID)
+    pb = tl.AsProto()
+    self.assertEqual(list(pb.uid), [7, -8])
+    self.assertEqual(list(pb.dtime), [100500000, 200000000])
+    self.assertEqual(list(tombstone.TombstoneList.DeserializedProtobuf(pb.SerializeToString())), list(tl))
+    tl.Remove(7)
+    tl.Remove(7)
+    self.assertEqual([t.uid for t in tl], [-8])
+
+  def testPruneDiedBefore(self):
+    tl = tombstone.TombstoneList()
+    tl.Add(7, 100.0, 1)
+    tl.Add(8, 200.0, 1)
+    tl.Add(9, 300.0, 1)
+    tl.PruneDiedBefore(200.0)
+    self.assertEqual([t.uid for t in tl], [8, 9])
+    tl.PruneDiedBefore(1000.0)
+    self.assertEqual(len(tl), 0)
+
+  def testPruneTombstones(self):
+    saved_time = time.time
+    self.assertEqual(FLAGS.pyatdl_tombstone_lifetime_days, 365)
+    day = 24 * 60 * 60
+    try:
+      time.time = lambda: 1000.0 * day
+      lst = tdl.ToDoList()
+      lst.tombstones.Add(7, 1000.0 * day - 366 * day, 1)
+      lst.tombstones.Add(8, 1000.0 * day - 364 * day, 1)
+      a = action.Action(name='a')
+      a.is_deleted = True
+      lst.inbox.items.append(a)
+      lst.PurgeDeleted()
+      self.assertEqual([t.uid for t in lst.tombstones], [8, a.uid])
+      FLAGS.pyatdl_tombstone_lifetime_days = 0
+      lst.tombstones.Add(7, 0.0, 1)
+      lst.PurgeDeleted()
+      self.assertEqual([t.uid for t in lst.tombstones], [8, a.uid, 7])
+      FLAGS.pyatdl_tombstone_lifetime_days = 1
+      lst.PruneTombstones()
+      self.assertEqual([t.uid for t in lst.tombstones], [a.uid])
+    finally:
+      time.time = saved_time
+      FLAGS.pyatdl_tombstone_lifetime_days = 365
+
+  def testParallelArraysMustMatch(self):
+    pb = pyatdl_pb2.Tombstones()
+    pb.uid.extend([3, 4])
+    pb.dtime.append(1)
+    pb.parent_uid.extend([1, 1])
+    with self.assertRaisesRegex(errors.DataError, '2 UIDs, 1 dtimes'):
+      tombstone.TombstoneList.FromProtobufMessage(pb)
+
+  def testToDoList(self):
+    lst = tdl.ToDoList()
+    f = folder.Folder(name='f')
+    lst.AddProjectOrFolder(f)
+    p = prj.Prj(name='p')
+    f.items.append(p)
+    a0 = action.Action(name='a0')
+    a1 = action.Action(name='a1')
+    p.items.extend([a0, a1])
+    a2 = action.Action(name='a2')
+    lst.inbox.items.append(a2)
+    lst.AlmostPurge(a2)
+    self.assertEqual([a.uid for a, _ in lst.Actions()], [a0.uid, a1.uid])
+    self.assertEqual(lst.tombstones.Get(a2.uid).parent_uid, uid.INBOX_UID)
+    a0.is_deleted = True
+    a1.is_deleted = True
+    p.is_deleted = True
+    f.is_deleted = True
+    lst.PurgeDeleted()
+    self.assertEqual(list(lst.Items()), [lst.inbox, lst.root])
+    self.assertEqual({t.uid: t.parent_uid for t in lst.tombstones},
+                     {a2.uid: uid.INBOX_UID, f.uid: uid.ROOT_FOLDER_UID, p.uid: f.uid, a0.uid: p.uid, a1.uid: p.uid})
+
+    uid.ResetNotesOfExistingUIDs()
+    lst2 = tdl.ToDoList.DeserializedProtobuf(lst.SerializedProtobuf())
+    self.assertEqual([(t.uid, t.parent_uid) for t in lst2.tombstones], [(t.uid, t.parent_uid) for t in lst.tombstones])
+    self.assertEqual(lst2.AsProto().SerializeToString(), lst.SerializedProtobuf())
+    self.assertNotIn(lst2.AddContext('@new'), lst.tombstones)  # dead UIDs stay dead
+    with self.assertRaisesRegex(errors.DataError, 'duplicated'):
+      action.Action(name='a0 again', the_uid=a0.uid)
+    uid.ResetNotesOfExistingUIDs(allow_duplication=True)
+    lst2.inbox.items.append(action.Action(name='a0 again', the_uid=a0.uid))
+    with self.assertRaisesRegex(errors.DataError, 'has a tombstone but is not dead'):
+      lst2.CheckIsWellFormed()
+
+
+if __name__ == '__main__':
+  unitjest.main()
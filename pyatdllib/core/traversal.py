@@ -0,0 +1,98 @@
+"""Defines Preorder, an iterative tree traversal, and PathView, the paths it yields.
+
+Folders may be nested tens of thousands deep (see 'loadtest --deep'), which is
+too deep for recursive generators. Preorder uses an explicit stack, and every
+PathView shares structure with the PathView of its parent, so yielding a node
+costs O(1) regardless of depth.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import collections.abc
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+class PathView(collections.abc.Sequence):
+  """An immutable path, leaf first, e.g. [parent, grandparent, ..., root].
+
+  Compares equal to a list with the same elements. Indexing near the leaf (e.g.,
+  path[0]) is O(1); the length is O(1).
+  """
+
+  __slots__ = ('_leaf', '_rest', '_len')
+  _len: int
+
+  def __init__(self, leaf: Any = None, rest: Optional['PathView'] = None) -> None:
+    self._leaf = leaf
+    self._rest = rest
+    self._len = 0 if rest is None else rest._len + 1
+
+  def Pushed(self, leaf: Any) -> 'PathView':
+    """Returns the path with a new leaf, e.g. the path of a child of leaf."""
+    return PathView(leaf, self)
+
+  def __len__(self) -> int:
+    return self._len
+
+  def __iter__(self) -> Iterator[Any]:
+    node = self
+    while node._rest is not None:
+      yield node._leaf
+      node = node._rest
+
+  def __reversed__(self) -> Iterator[Any]:
+    return reversed(list(self))
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return list(self)[index]
+    if index < 0:
+      index += self._len
+    if not 0 <= index < self._len:
+      raise IndexError('PathView index out of range')
+    node = self
+    for _ in range(index):
+      node = node._rest
+    return node._leaf
+
+  def __eq__(self, other: Any) -> bool:
+    if isinstance(other, (PathView, list, tuple)):
+      return len(self) == len(other) and all(a is b or a == b for a, b in zip(self, other))
+    return NotImplemented
+
+  def __ne__(self, other: Any) -> bool:
+    result = self.__eq__(other)
+    return result if result is NotImplemented else not result
+
+  __hash__ = None  # type: ignore
+
+  def __repr__(self) -> str:
+    return 'PathView(%r)' % (list(self),)
+
+
+EMPTY_PATH = PathView()
+
+
+def Preorder(root: Any, children: Callable[[Any], Iterable[Any]]) -> Iterator[Tuple[Any, PathView]]:
+  """Yields (node, path to node) for every node, parents before children, without recursion.
+
+  children(node) is evaluated only after the caller has seen node, so the
+  caller may mutate node's children before the traversal descends.
+
+  Args:
+    root: object
+    children: lambda object: [object]
+  Yields:
+    (object, PathView)  # the path is leaf first and does not contain the node itself
+  """
+  stack: List[Tuple[Any, PathView]] = [(root, EMPTY_PATH)]
+  while stack:
+    node, path = stack.pop()
+    yield node, path
+    kids = list(children(node))
+    if kids:
+      child_path = path.Pushed(node)
+      stack.extend((kid, child_path) for kid in reversed(kids))
@@ -10,12 +10,16 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
-from typing import Callable, Dict, Tuple, Union
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
 from . import action
+from . import action_columns
 from . import ctx
 from . import folder
 from . import prj
+from . import query as query_module
+
+Item = Union[action.Action, ctx.Ctx, folder.Folder, prj.Prj]
 
 
 class ViewFilter(object):
@@ -23,6 +27,9 @@ class ViewFilter(object):
 
   __pychecker__ = 'unusednames=cls'
 
+  # While Evaluate runs, id(item) => whether to show item, for the items decided so far:
+  _memo: Optional[Dict[int, bool]] = None
+
   @classmethod
   def ViewFilterUINames(cls) -> Tuple[str, ...]:
     """Returns all the different aliases of this view filter.
@@ -46,7 +53,12 @@ class ViewFilter(object):
     self.action_to_context = action_to_context
 
   def FolderContainsShownProject(self, a_folder: folder.Folder) -> bool:
+    memo = self._memo
     for item in a_folder.items:
+      if memo is not None and id(item) in memo:
+        if memo[id(item)]:
+          return True
+        continue
       if isinstance(item, prj.Prj) and self.ShowProject(item):
         return True
       if isinstance(item, folder.Folder) and self.ShowFolder(item):
@@ -54,12 +66,43 @@ class ViewFilter(object):
     return False
 
   def ProjectContainsShownAction(self, project: prj.Prj) -> bool:
+    memo = self._memo
     for item in project.items:
+      if memo is not None and id(item) in memo:
+        if memo[id(item)]:
+          return True
+        continue
       if self.ShowAction(item):
         return True
     return False
 
-  def Show(self, item: Union[action.Action, ctx.Ctx, folder.Folder, prj.Prj]) -> bool:
+  def Evaluate(self, todolist: Any) -> 'Evaluation':
+    """Decides whether to show each item of the given ToDoList, visiting each item once.
+
+    Asking ShowFolder about each Folder of a tree may ask about each descendant again and again. This instead decides
+    about every Action a column at a time (see ActionMask) and then about each Container after its children, so the
+    cost is proportional to the size of the ToDoList whatever its shape.
+
+    Args:
+      todolist: ToDoList
+    Returns:
+      Evaluation  # valid until the ToDoList changes
+    """
+    columns = todolist.ActionColumns()
+    memo = dict.fromkeys(map(id, columns.actions), False)
+    memo.update(dict.fromkeys(map(id, columns.Actions(self.ActionMask(columns))), True))
+    containers = [c for c, unused_path in todolist.ContainersPreorder()]
+    self._memo = memo
+    try:
+      for c in reversed(containers):  # children before parents
+        memo[id(c)] = bool(self.Show(c))
+    finally:
+      self._memo = None
+    for c in todolist.ctx_list.items:
+      memo[id(c)] = bool(self.ShowContext(c))
+    return Evaluation(self, memo)
+
+  def Show(self, item: Item) -> bool:
     """Returns True iff item should be displayed.
 
     Args:
@@ -86,6 +129,30 @@ class ViewFilter(object):
     """
     raise NotImplementedError
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    """Returns the bitset of the Actions in columns that ShowAction would show.
+
+    Subclasses override this to compute the answer a column at a time.
+
+    Args:
+      columns: ActionColumns
+    Returns:
+      int  # see module 'action_columns'
+    """
+    return columns.Mask(self.ShowAction)
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    """Returns the number of the Prj's Actions that ShowAction would show.
+
+    Subclasses override this to answer in O(1) time from the Prj's Aggregates.
+
+    Args:
+      project: Prj
+    Returns:
+      int
+    """
+    return sum(1 for an_action in project.items if self.ShowAction(an_action))
+
   def ShowProject(self, project: prj.Prj) -> bool:
     """Returns True iff the Prj should be displayed.
 
@@ -117,11 +184,49 @@ class ViewFilter(object):
     raise NotImplementedError
 
 
+class Evaluation(object):
+  """Answers the questions a ViewFilter answers, from the memo computed by ViewFilter.Evaluate.
+
+  Asked about an item that did not exist at the time of Evaluate, we ask the ViewFilter.
+  """
+
+  def __init__(self, view_filter: ViewFilter, memo: Dict[int, bool]) -> None:
+    self.view_filter = view_filter
+    self._memo = memo
+
+  def ViewFilterUINames(self) -> Tuple[str, ...]:
+    return self.view_filter.ViewFilterUINames()
+
+  def Show(self, item: Item) -> bool:
+    shown = self._memo.get(id(item))
+    return self.view_filter.Show(item) if shown is None else shown
+
+  def ShowAction(self, an_action: action.Action) -> bool:
+    shown = self._memo.get(id(an_action))
+    return self.view_filter.ShowAction(an_action) if shown is None else shown
+
+  def ShowProject(self, project: prj.Prj) -> bool:
+    shown = self._memo.get(id(project))
+    return self.view_filter.ShowProject(project) if shown is None else shown
+
+  def ShowFolder(self, a_folder: folder.Folder) -> bool:
+    shown = self._memo.get(id(a_folder))
+    return self.view_filter.ShowFolder(a_folder) if shown is None else shown
+
+  def ShowContext(self, context: ctx.Ctx) -> bool:
+    shown = self._memo.get(id(context))
+    return self.view_filter.ShowContext(context) if shown is None else shown
+
+
 class SearchFilter(ViewFilter):
   """Views only items matching the given search query or projects/folders
   containing matched items.
 
-  TODO(chandler37): support "/f[^:]+b/" as "case-insensitive regex r'f[^:]+b' where dot matches newline"
+  The query may use the query language of module 'query', e.g. "/f[^:]+b/" for
+  a case-insensitive regex where dot matches newline, but a query that does
+  not parse, e.g. '12" ruler', matches as one phrase. A query that is only
+  about text (see Query.IsOnlyAboutText) also matches Folders, Prjs, and Ctxs
+  by name or note.
   """
 
   @classmethod
@@ -138,18 +243,30 @@ class SearchFilter(ViewFilter):
     super().__init__(action_to_project, action_to_context)
     assert query
     self.query = query
+    self.compiled_query = query_module.CompileOrLiteral(query)
     self.show_done = show_done
     self.show_active = show_active
 
+  def _MatchesQuery(self, item: Item) -> bool:
+    """Returns True iff item matches our query, ignoring show_active and show_done."""
+    if isinstance(item, action.Action):
+      return self.compiled_query.Matches(item, self.action_to_project, self.action_to_context)
+    return self.compiled_query.MatchesText(item)
+
   def ShowAction(self, an_action: action.Action) -> bool:
     containing_context = self.action_to_context(an_action)
     if bool(self.show_active) is not bool(containing_context is None or containing_context.is_active):
       return False
     if bool(self.show_done) is not bool(an_action.IsDone()):
       return False
-    if self.query.lower() in (an_action.name or '').lower():
-      return True
-    return bool(an_action.note and self.query.lower() in an_action.note.lower())
+    return self._MatchesQuery(an_action)
+
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    shown = self.compiled_query.Mask(columns, checksum=_ChecksumOf(columns))
+    done = columns.is_complete | columns.is_deleted
+    shown &= done if self.show_done else columns.Not(done)
+    shown &= columns.Not(columns.in_inactive_ctx) if self.show_active else columns.in_inactive_ctx
+    return shown
 
   # TODO(chandler37): needs ShowNote as well -- we should not show notes that do not match the query. Further TODO: For
   # 'hypertext' commands without a search query, we should do better UI to elide notes in HTML collapsed divs if they
@@ -161,16 +278,12 @@ class SearchFilter(ViewFilter):
       return False
     if bool(self.show_done) is not bool(project.IsDone()):
       return False
-    if self.query.lower() in (project.name or '').lower():
-      return True
-    return bool(project.note and self.query.lower() in project.note.lower())
+    return self._MatchesQuery(project)
 
   def ShowFolder(self, a_folder: folder.Folder) -> bool:
     if bool(self.show_done) is not bool(a_folder.IsDone()):
       return False
-    return bool(self.FolderContainsShownProject(a_folder)
-                or self.query.lower() in (a_folder.name or '').lower()
-                or (a_folder.note and self.query.lower() in a_folder.note.lower()))
+    return self.FolderContainsShownProject(a_folder) or self._MatchesQuery(a_folder)
 
   def ShowContext(self, context: ctx.Ctx) -> bool:
     """Override. You could argue that we should show the context if any action
@@ -180,8 +293,55 @@ class SearchFilter(ViewFilter):
       return False
     if bool(self.show_done) is not bool(context.IsDone()):
       return False
-    return bool(self.query.lower() in context.name.lower()
-                or (context.note and self.query.lower() in context.note.lower()))
+    return self._MatchesQuery(context)
+
+
+class QueryFilter(ViewFilter):
+  """Narrows another ViewFilter to the Actions matching a query (see module 'query').
+
+  Shows the Actions that both the other ViewFilter and the query show, and the
+  Prjs and Folders that the other ViewFilter shows if they contain such Actions
+  or, for a query only about text (see Query.IsOnlyAboutText), match it by name
+  or note. Shows the same Ctxs as the other ViewFilter.
+  """
+
+  def __init__(self,
+               action_to_project: Callable[[action.Action], prj.Prj],
+               action_to_context: Callable[[action.Action], ctx.Ctx],
+               *,
+               query: str,
+               base: ViewFilter) -> None:
+    """Raises query.QuerySyntaxError."""
+    super().__init__(action_to_project, action_to_context)
+    self.compiled_query = query_module.Compile(query)
+    self.base = base
+
+  def ViewFilterUINames(self) -> Tuple[str, ...]:  # type: ignore
+    return self.base.ViewFilterUINames()
+
+  def ShowAction(self, an_action: action.Action) -> bool:
+    return bool(self.base.ShowAction(an_action)
+                and self.compiled_query.Matches(an_action, self.action_to_project, self.action_to_context))
+
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return self.base.ActionMask(columns) & self.compiled_query.Mask(columns, checksum=_ChecksumOf(columns))
+
+  def ShowProject(self, project: prj.Prj) -> bool:
+    return bool(self.base.ShowProject(project)
+                and (self.ProjectContainsShownAction(project) or self.compiled_query.MatchesText(project)))
+
+  def ShowFolder(self, a_folder: folder.Folder) -> bool:
+    return bool(self.base.ShowFolder(a_folder)
+                and (self.FolderContainsShownProject(a_folder) or self.compiled_query.MatchesText(a_folder)))
+
+  def ShowContext(self, context: ctx.Ctx) -> bool:
+    return self.base.ShowContext(context)
+
+
+def _ChecksumOf(columns: action_columns.ActionColumns) -> Optional[str]:
+  """Returns the checksum of the unmodified ToDoList containing the Actions in columns, if known."""
+  the_index = columns.actions[0]._index if columns.actions else None
+  return None if the_index is None else the_index.ChecksumIfUnmodified()
 
 
 class ShowAll(ViewFilter):
@@ -194,6 +354,12 @@ class ShowAll(ViewFilter):
   def ShowAction(self, an_action: action.Action) -> bool:
     return True
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return columns.All()
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    return len(project.items)
+
   def ShowProject(self, project: prj.Prj) -> bool:
     return True
 
@@ -216,6 +382,12 @@ class ShowNotDeleted(ViewFilter):
   def ShowAction(self, an_action: action.Action) -> bool:
     return not an_action.is_deleted
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return columns.Not(columns.is_deleted)
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    return project.Aggregates().live_items
+
   def ShowProject(self, project: prj.Prj) -> bool:
     return not project.is_deleted
 
@@ -245,6 +417,12 @@ class ShowNotFinalized(ViewFilter):
             and not an_action.is_complete
             and not containing_project.is_complete)
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return columns.Not(columns.is_deleted | columns.is_complete | columns.in_complete_prj)
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    return 0 if project.is_complete else project.Aggregates().incomplete_actions
+
   def ShowProject(self, project: prj.Prj) -> bool:
     return (self.deleted_viewfilter.ShowProject(project)
             and not project.is_complete)
@@ -273,6 +451,16 @@ class ShowActionable(ViewFilter):
             and (containing_context is None or containing_context.is_active)
             and self.action_to_project(an_action).is_active)
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return (self.not_finalized_viewfilter.ActionMask(columns)
+            & ~columns.in_inactive_ctx
+            & columns.in_active_prj)
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    if project.is_complete or not project.is_active:
+      return 0
+    return project.Aggregates().actionable_actions
+
   def ShowProject(self, project: prj.Prj) -> bool:
     return (self.not_finalized_viewfilter.ShowProject(project)
             and project.is_active)
@@ -302,6 +490,12 @@ class ShowNeedingReview(ViewFilter):
   def ShowAction(self, an_action: action.Action) -> bool:
     return self.not_finalized_viewfilter.ShowAction(an_action)
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return self.not_finalized_viewfilter.ActionMask(columns)
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    return self.not_finalized_viewfilter.CountShownActions(project)
+
   def ShowProject(self, project: prj.Prj) -> bool:
     return (self.not_finalized_viewfilter.ShowProject(project)
             and project.NeedsReview() and project.is_active)
@@ -331,10 +525,22 @@ class ShowInactiveIncomplete(ViewFilter):
       not containing_project.is_active or (
         containing_context is not None and not containing_context.is_active))
 
+  def ActionMask(self, columns: action_columns.ActionColumns) -> int:
+    return self.not_finalized_viewfilter.ActionMask(columns) & (
+      columns.Not(columns.in_active_prj) | columns.in_inactive_ctx)
+
+  def CountShownActions(self, project: prj.Prj) -> int:
+    if project.is_complete:
+      return 0
+    counts = project.Aggregates()
+    if not project.is_active:
+      return counts.incomplete_actions
+    return counts.incomplete_actions - counts.actionable_actions
+
   def ShowProject(self, project: prj.Prj) -> bool:
     return (self.not_finalized_viewfilter.ShowProject(project)
             and (not project.is_active
-                 or self.ProjectContainsShownAction(project)))
+                 or self.CountShownActions(project) > 0))
 
   def ShowFolder(self, a_folder: folder.Folder) -> bool:
     # TODO(chandler): Show it only if a descendant is inactive and incomplete?
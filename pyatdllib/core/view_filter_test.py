@@ -0,0 +1,91 @@
+"""Unittests for module 'view_filter'."""
+
+from absl import flags  # type: ignore
+
+from pyatdllib.core import action
+from pyatdllib.core import folder
+from pyatdllib.core import prj
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
+from pyatdllib.core import unitjest
+from pyatdllib.core import view_filter
+
+
+FLAGS = flags.FLAGS
+
+
+class ViewFilterTestCase(unitjest.TestCase):  # pylint: disable=missing-docstring,too-many-public-methods
+
+  def setUp(self):
+    super().setUp()
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+
+  def _Filters(self, lst):
+    def ActionToProject(an_action):
+      return lst.ActionByUID(an_action.uid)[1]
+
+    def ActionToContext(an_action):
+      return None if an_action.ctx_uid is None else lst.ContextByUID(an_action.ctx_uid)
+
+    filters = [cls(ActionToProject, ActionToContext) for cls in view_filter._VIEW_FILTER_CLASSES]
+    for show_active in (True, False):
+      for show_done in (True, False):
+        filters.append(view_filter.SearchFilter(ActionToProject, ActionToContext, query='needle',
+                                                show_active=show_active, show_done=show_done))
+    return filters
+
+  def testEvaluateMatchesShow(self):
+    lst = tdl.ToDoList()
+    inactive_uid = lst.AddContext('@inactive')
+    lst.ContextByUID(inactive_uid).is_active = False
+    outer = folder.Folder(name='outer')
+    lst.AddProjectOrFolder(outer)
+    inner = folder.Folder(name='inner needle')
+    outer.items.append(inner)
+    deleted = folder.Folder(name='deleted')
+    deleted.is_deleted = True
+    outer.items.append(deleted)
+    for i, parent in enumerate([outer, inner, inner, deleted]):
+      p = prj.Prj(name='p%d' % i)
+      p.is_active = i != 1
+      p.is_complete = i == 2
+      parent.items.append(p)
+      for j in range(4):
+        a = action.Action(name='needle' if j == i else 'hay', ctx_uid=inactive_uid if j == 3 else None)
+        a.is_complete = j == 1
+        a.is_deleted = j == 2
+        p.items.append(a)
+    lst.inbox.items.append(action.Action(name='a needle in the inbox'))
+    for vf in self._Filters(lst):
+      evaluation = vf.Evaluate(lst)
+      for item in lst.Items():
+        self.assertEqual(evaluation.Show(item), bool(vf.Show(item)), (type(vf).__name__, str(item)))
+      for p, _ in lst.Projects():
+        self.assertEqual(vf.CountShownActions(p), sum(1 for a in p.items if vf.ShowAction(a)), type(vf).__name__)
+      self.assertEqual(evaluation.ShowFolder(outer), bool(vf.ShowFolder(outer)))
+      new_action = action.Action(name='needle')
+      lst.inbox.items.append(new_action)  # after Evaluate, so we fall back to the ViewFilter:
+      self.assertEqual(evaluation.ShowAction(new_action), vf.ShowAction(new_action))
+      del lst.inbox.items[-1]
+
+  def testEvaluateDeepTree(self):
+    lst = tdl.ToDoList()
+    parent = lst.root
+    for i in range(3000):
+      f = folder.Folder(name='f%d' % i)
+      parent.items.append(f)
+      parent = f
+    p = prj.Prj(name='p')
+    parent.items.append(p)
+    p.items.append(action.Action(name='the needle'))
+    search = self._Filters(lst)[-1]
+    self.assertFalse(search.show_active)
+    search.show_active = True
+    evaluation = search.Evaluate(lst)
+    self.assertTrue(evaluation.ShowFolder(lst.root.items[0]))
+    self.assertTrue(evaluation.ShowProject(p))
+
+
+if __name__ == '__main__':
+  unitjest.main()
@@ -244,13 +244,13 @@ class Namespace(object):
     try:
       if FLAGS.pyatdl_paranoia:
         try:
-          the_state.ToDoList().CheckIsWellFormed()
+          the_state.ToDoList().CheckChangesAreWellFormed()
         except AssertionError as e:
           raise AssertionError('precheck: argv=%s error=%s' % (argv, six.text_type(e))) from e
       self._RunCommand(the_state, cmd, argv)
       if FLAGS.pyatdl_paranoia:
         try:
-          the_state.ToDoList().CheckIsWellFormed()
+          the_state.ToDoList().CheckChangesAreWellFormed()
         except AssertionError as e:
           raise AssertionError('postcheck: %s' % six.text_type(e)) from e
     finally:
@@ -195,13 +195,14 @@ class Interactive(Cmd):  # pylint: disable=too-few-public-methods
 
 
 def ApplyBatchOfCommands(input_file, printer=None, reader=None, writer=None,
-                         html_escaper=None):
+                         html_escaper=None, lazy=False):
   """Reads commands, one per line, from the named file, and performs them.
 
   Args:
     input_file: file
     writer: None|object with 'write(bytes)' method
     html_escaper: lambda unicode: unicode
+    lazy: bool  # Load the to-do list lazily? (See tdl.ToDoList.DeserializedProtobuf.) Good for read-only commands.
   Returns:
     {'view': str,  # e.g., 'default'
      'cwc': str,  # current working Container
@@ -213,7 +214,8 @@ def ApplyBatchOfCommands(input_file, printer=None, reader=None, writer=None,
     printer = _Print
   if FLAGS.database_filename is None:
     tdl = serialization.DeserializeToDoList2(reader,
-                                             tdl_factory=uicmd.NewToDoList)
+                                             tdl_factory=uicmd.NewToDoList,
+                                             lazy=lazy)
   else:
     tdl = serialization.DeserializeToDoList(FLAGS.database_filename,
                                             tdl_factory=uicmd.NewToDoList)
@@ -233,7 +235,7 @@ def ApplyBatchOfCommands(input_file, printer=None, reader=None, writer=None,
       if not FLAGS.pyatdl_allow_exceptions_in_batch_mode:
         raise BadArgsForCommandError(str(e))
       continue
-  the_state.ToDoList().CheckIsWellFormed()
+  the_state.ToDoList().CheckChangesAreWellFormed()
   if FLAGS.database_filename is None:
     serialization.SerializeToDoList2(the_state.ToDoList(), writer)
   else:
@@ -3579,6 +3579,8 @@ The following timestamps are displayed when the '-l' argument is given:
 Flags for ls:
 
 pyatdllib.ui.uicmd:
+-q,--query: Shows only the Actions matching this query, and the Folders and Projects containing them. Terms: text, "a phrase", /regex/, @context, +project, is:done, is:complete,
+is:deleted, is:active, needs:review, ctime>2020-01-31 (also <, >=, <=, mtime, dtime), and -TERM to negate
 -R,--[no]recursive: Additionally lists subdirectories/subprojects recursively
 (default: 'false')
 -a,--[no]show_all: Additionally lists everything, even hidden objects, overriding the view filter
@@ -3673,6 +3675,62 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
     ]
     self.helpTest(inputs, golden_printed)
 
+  def testLsQuery(self):
+    inputs = [
+      'mkctx @home',
+      'mkprj /garden',
+      'cd /garden',
+      'touch "buy milk"',
+      'touch "buy seeds"',
+      'touch "water plants"',
+      'chctx @home "water plants"',
+      'complete "buy seeds"',
+      'cd /',
+      'echo ls -R -q buy:',
+      'ls -R -q buy',
+      'echo ls -R -q "buy -is:done":',
+      'ls -R -q "buy -is:done"',
+      'echo ls -R --query @home:',
+      'ls -R --query @home',
+      'echo ls -R -q /^b.*[sk]$/ --view_filter all:',
+      'ls -R -q /^b.*[sk]$/ --view_filter all',
+      'echo todo -q +gard:',
+      'todo -q +gard',
+      'echo ls -q is:bogus:',
+      'ls -q is:bogus',
+    ]
+    golden_printed = [
+      'ls -R -q buy:',
+      '--project-- --incomplete-- ---active--- garden',
+      '',
+      './garden:',
+      '--action--- --incomplete-- \'buy milk\' --in-context-- \'<none>\'',
+      '--action--- ---COMPLETE--- \'buy seeds\' --in-context-- \'<none>\'',
+      'ls -R -q buy -is:done:',
+      '--project-- --incomplete-- ---active--- garden',
+      '',
+      './garden:',
+      '--action--- --incomplete-- \'buy milk\' --in-context-- \'<none>\'',
+      'ls -R --query @home:',
+      '--project-- --incomplete-- ---active--- garden',
+      '',
+      './garden:',
+      '--action--- --incomplete-- \'water plants\' --in-context-- @home',
+      'ls -R -q /^b.*[sk]$/ --view_filter all:',
+      '--project-- --incomplete-- ---active--- garden',
+      '',
+      './garden:',
+      '--action--- --incomplete-- \'buy milk\' --in-context-- \'<none>\'',
+      '--action--- ---COMPLETE--- \'buy seeds\' --in-context-- \'<none>\'',
+      'todo -q +gard:',
+      'garden:',
+      '\t- buy milk',
+      '\t- water plants @home',
+      'ls -q is:bogus:',
+      'Unknown term is:bogus; try is:done, is:complete, is:deleted, or is:active',
+    ]
+    self.helpTest(inputs, golden_printed)
+
   def testVarious2(self):
     inputs = [
       'chclock 1137999',
@@ -4899,7 +4957,7 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
       'ls after load2:',
       '--project-- uid=1 --incomplete-- ---active--- inbox',
       '--folder--- uid=11 dalive',
-      '--folder--- uid=14 dnew',
+      '--folder--- uid=15 dnew',
       '--project-- uid=7 --incomplete-- ---active--- palive',
       '',
       '/inbox:',
@@ -4915,7 +4973,7 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
       'lsctx after load2:',
       "--context-- uid=0 ---active--- '<none>'",
       '--context-- uid=13 ---active--- @home',
-      '--context-- uid=15 ---active--- @new',
+      '--context-- uid=16 ---active--- @new',
     ]
     self.helpTest(inputs, golden_printed)
 
@@ -5424,8 +5482,8 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
               'save %s' % pipes.quote(save_path),
               'load %s' % pipes.quote(save_path),
               'mkctx @higherstilluid',
-              # Reusing UIDs is questionable, but unimportant -- in production we generate random UIDs.
-              'echo uid=15 reused for @higherstilluid:',
+              # The tombstone of @highestuid keeps its UID from being reused:
+              'echo uid=16 for @higherstilluid:',
               'lsctx -l',
               ]
     golden_printed = [
@@ -5490,10 +5548,10 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
       "--context-- uid=15 mtime=1969/12/31-19:18:57 ctime=1969/12/31-19:18:57 ---active--- @highestuid",
       "Save complete.",
       "Load complete.",
-      "uid=15 reused for @higherstilluid:",
+      "uid=16 for @higherstilluid:",
       "--context-- uid=0 mtime=1969/12/31-19:00:00 ctime=1969/12/31-19:00:00 ---active--- '<none>'",
       "--context-- uid=14 mtime=1969/12/31-19:18:57 ctime=1969/12/31-19:18:57 ---active--- @foobar",
-      "--context-- uid=15 mtime=1969/12/31-19:18:57 ctime=1969/12/31-19:18:57 ---active--- @higherstilluid",
+      "--context-- uid=16 mtime=1969/12/31-19:18:57 ctime=1969/12/31-19:18:57 ---active--- @higherstilluid",
     ]
     self.helpTest(inputs, golden_printed)
 
@@ -6401,7 +6459,7 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
               'echo dumpprotobuf after purgedeleted:',
               'dumpprotobuf',
               ]
-    # TODO(chandler37): we could shrink the size of the proto quite a bit, leaving just the UID in place.
+    # Only tombstones remain of the purged actions:
     dumped = [
       'inbox {\n'
       '  common {\n'
@@ -6420,30 +6478,6 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
       '  is_active: true\n'
       '  actions {\n'
       '    common {\n'
-      '      is_deleted: true\n'
-      '      timestamp {\n'
-      '        ctime: 1137000000\n'
-      '        dtime: 2222000000\n'
-      '        mtime: 2222000000\n'
-      '      }\n'
-      '      uid: 8923216991658685487\n'
-      '    }\n'
-      '    is_complete: false\n'
-      '  }\n'
-      '  actions {\n'
-      '    common {\n'
-      '      is_deleted: true\n'
-      '      timestamp {\n'
-      '        ctime: 1137000000\n'
-      '        dtime: 2222000000\n'
-      '        mtime: 2222000000\n'
-      '      }\n'
-      '      uid: 7844860928174339221\n'
-      '    }\n'
-      '    is_complete: false\n'
-      '  }\n'
-      '  actions {\n'
-      '    common {\n'
       '      is_deleted: false\n'
       '      timestamp {\n'
       '        ctime: 2222000000\n'
@@ -6487,6 +6521,14 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
       '    is_active: true\n'
       '  }\n'
       '}\n'
+      'tombstones {\n'
+      '  uid: 8923216991658685487\n'
+      '  uid: 7844860928174339221\n'
+      '  dtime: 2222000000\n'
+      '  dtime: 2222000000\n'
+      '  parent_uid: 1\n'
+      '  parent_uid: 1\n'
+      '}\n'
     ]
     dumped_after_purgedeleted = (
       'inbox {\n'
@@ -6549,9 +6591,17 @@ it and use this view filter. Note: this is ignored in --show_all mode""",
       '    is_active: true\n'
       '  }\n'
       '}\n'
+      'tombstones {\n'
+      '  uid: 8923216991658685487\n'
+      '  uid: 7844860928174339221\n'
+      '  dtime: 2222000000\n'
+      '  dtime: 2222000000\n'
+      '  parent_uid: 1\n'
+      '  parent_uid: 1\n'
+      '}\n'
     )
-    self.assertFalse('8923216991658685487' in dumped_after_purgedeleted)
-    self.assertFalse('7844860928174339221' in dumped_after_purgedeleted)
+    self.assertEqual(dumped_after_purgedeleted.count('8923216991658685487'), 1)
+    self.assertEqual(dumped_after_purgedeleted.count('7844860928174339221'), 1)
     golden_printed = [
       'Reset complete.',
       'ls /inbox:',
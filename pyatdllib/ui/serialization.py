@@ -4,7 +4,9 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import functools
 import hashlib
+import lzma
 import os
 import zlib
 
@@ -19,14 +21,52 @@ FLAGS = flags.FLAGS
 
 flags.DEFINE_integer(
   'pyatdl_zlib_compression_level',
-  2,  # CPU usage matters more than how many packets go across the wire
-      # when we serialize.
-  'Regarding compression of the to-do list: If zero, zlib compression is'
-  ' not used. If 1-9, that level of zlib compression is used. 1'
-  ' decompresses quickly; 6 is zlib\'s default; 9 compresses most'
-  ' thoroughly and most slowly.',
-  lower_bound=0,
+  -1,
+  'Regarding compression of the to-do list: If zero, compression is'
+  ' not used. If 1-9, that level of compression is used. 1'
+  ' compresses quickly; 6 is zlib\'s default; 9 compresses most'
+  ' thoroughly and most slowly. If -1, the level depends on the size of'
+  ' the to-do list: small ones get 9, large ones 2 because CPU usage'
+  ' matters more than how many bytes we store. Decompression is about as'
+  ' fast regardless. With --pyatdl_compression_codec=lzma, this is the'
+  ' preset, but never more than 6, above which lzma needs hundreds of MiB'
+  ' of memory.',
+  lower_bound=-1,
   upper_bound=9)
+flags.DEFINE_enum(
+  'pyatdl_compression_codec',
+  'zlib',
+  ['none', 'zlib', 'zlib_with_dictionary', 'lzma'],
+  'How we compress a to-do list when saving it (see pyatdl.CompressionCodec). We load a to-do list saved with any of '
+  'them. "zlib_with_dictionary" uses the newest preset dictionary (see train_zlib_dictionary.py), which makes small '
+  'to-do lists about half the size; see benchmarks/compression_codecs.py. Code predating pyatdl.CompressionCodec '
+  'reads only "none" and "zlib", so choose another only once every server and client that reads your to-do lists '
+  'understands it.')
+flags.DEFINE_enum(
+  'pyatdl_checksum_algorithm',
+  'sha1',  # Faster than BLAKE2b where OpenSSL uses the CPU's SHA extensions; see benchmarks/checksum_algorithms.py.
+  ['sha1', 'blake2b_160', 'blake2b_256'],
+  'How we checksum a to-do list when saving it (see pyatdl.ChecksumAlgorithm). We load a to-do list saved with any '
+  'of them, so you may change this at any time.')
+flags.DEFINE_enum(
+  'pyatdl_verification_level',
+  'paranoid',
+  ['paranoid', 'standard', 'trusted'],
+  'How thoroughly we check a to-do list after loading it and verifying its checksum. "paranoid" checks that the '
+  'list is well-formed and also renders it as text and as a protocol buffer in text format to see if anything '
+  'raises. "standard" checks only that it is well-formed. "trusted" skips even that, relying on the check done '
+  'before it was saved; duplicated UIDs are still caught.')
+flags.DEFINE_bool(
+  'pyatdl_paranoid_about_saving',
+  False,
+  'Before saving a to-do list, parse what we are about to save, verifying its checksum, to be sure that we can load '
+  'it back. Otherwise we only compare its size and how deeply its messages nest with the limits of the protobuf '
+  'library.')
+
+# The protobuf library's limits unless FLAGS.pyatdl_allow_infinite_memory_for_protobuf (see
+# tdl.ToDoList.DeserializedProtobuf):
+_MAX_PROTOBUF_BYTES = 64 << 20
+_MAX_PROTOBUF_NESTING_DEPTH = 100
 
 
 class Error(Exception):
@@ -45,35 +85,173 @@ class TooBigToSaveError(Error):
   """
 
 
-def Sha1Checksum(payload):
-  """Returns the SHA1 checksum of the given byte sequence.
+# (maximum payload length, compression level) for --pyatdl_zlib_compression_level=-1, in order:
+_AUTO_COMPRESSION_LEVELS = ((64 << 10, 9), (1 << 20, 6), (float('inf'), 2))
+
+# FLAGS.pyatdl_compression_codec => pyatdl_pb2.CompressionCodec:
+_CODECS = {
+  'none': pyatdl_pb2.UNCOMPRESSED,
+  'zlib': pyatdl_pb2.ZLIB,
+  'zlib_with_dictionary': pyatdl_pb2.ZLIB_WITH_DICTIONARY_1,
+  'lzma': pyatdl_pb2.LZMA,
+}
+
+# pyatdl_pb2.CompressionCodec => the file beside this one holding its zlib preset dictionary:
+_ZLIB_DICTIONARY_FILES = {
+  pyatdl_pb2.ZLIB_WITH_DICTIONARY_1: 'zlib_dictionary_1.bin',
+}
+
+# The most memory-hungry lzma preset we use; see FLAGS.pyatdl_zlib_compression_level:
+_MAX_LZMA_PRESET = 6
+
+# pyatdl_pb2.ChecksumAlgorithm => constructor of a hashlib object:
+_HASHERS = {
+  pyatdl_pb2.SHA1: hashlib.sha1,
+  pyatdl_pb2.BLAKE2B_160: functools.partial(hashlib.blake2b, digest_size=20),
+  pyatdl_pb2.BLAKE2B_256: functools.partial(hashlib.blake2b, digest_size=32),
+}
+
+
+def ChecksumAlgorithm(name=None):
+  """Returns the pyatdl_pb2.ChecksumAlgorithm with the given name.
+
+  Args:
+    name: None|str  # e.g., 'blake2b_160'; FLAGS.pyatdl_checksum_algorithm if None
+  Returns:
+    int
+  """
+  return pyatdl_pb2.ChecksumAlgorithm.Value((name or FLAGS.pyatdl_checksum_algorithm).upper())
+
+
+def ChecksumHexLength(algorithm):
+  """Returns the length of the strings that Checksum(_, algorithm) returns."""
+  return 2 * _HASHERS[algorithm]().digest_size
+
+
+def Checksum(payload, algorithm):
+  """Returns the checksum of the given byte sequence in lowercase hexadecimal.
 
   Args:
     payload: bytes
+    algorithm: int  # pyatdl_pb2.ChecksumAlgorithm
   Returns:
     str
   """
-  m = hashlib.sha1()
+  m = _HASHERS[algorithm]()
   m.update(payload)
   return m.hexdigest()
 
 
-def _GetPayloadAfterVerifyingChecksum(file_contents, path, sha1_checksum_list=None):
+def Sha1Checksum(payload):
+  """Returns the SHA1 checksum of the given byte sequence.
+
+  Args:
+    payload: bytes
+  Returns:
+    str
+  """
+  return Checksum(payload, pyatdl_pb2.SHA1)
+
+
+@functools.lru_cache(maxsize=None)
+def ZlibDictionary(codec):
+  """Returns the preset dictionary of the given pyatdl_pb2.CompressionCodec, one of the ZLIB_WITH_DICTIONARY_*."""
+  with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), _ZLIB_DICTIONARY_FILES[codec]), 'rb') as f:
+    return f.read()
+
+
+def _CompressionLevel(payload_length):
+  """Returns the compression level, 0-9, that FLAGS.pyatdl_zlib_compression_level calls for."""
+  if FLAGS.pyatdl_zlib_compression_level >= 0:
+    return FLAGS.pyatdl_zlib_compression_level
+  return next(level for max_length, level in _AUTO_COMPRESSION_LEVELS if payload_length <= max_length)
+
+
+def _Compressed(payload, codec, level):
+  """Returns payload compressed by the given pyatdl_pb2.CompressionCodec at the given level, 1-9."""
+  if codec == pyatdl_pb2.ZLIB:
+    return zlib.compress(payload, level)
+  if codec in _ZLIB_DICTIONARY_FILES:
+    compressor = zlib.compressobj(level, zdict=ZlibDictionary(codec))
+    return compressor.compress(payload) + compressor.flush()
+  if codec == pyatdl_pb2.LZMA:
+    return lzma.compress(payload, preset=min(level, _MAX_LZMA_PRESET))
+  assert codec == pyatdl_pb2.UNCOMPRESSED, codec
+  return payload
+
+
+def _Codec(pb):
+  """Returns the pyatdl_pb2.CompressionCodec of the given pyatdl_pb2.ChecksumAndData."""
+  if pb.HasField('codec'):
+    return pb.codec
+  return pyatdl_pb2.ZLIB if pb.payload_is_zlib_compressed else pyatdl_pb2.UNCOMPRESSED
+
+
+def _Decompressed(pb):
+  """Returns the payload of the given pyatdl_pb2.ChecksumAndData, decompressed."""
+  codec = _Codec(pb)
+  if codec == pyatdl_pb2.ZLIB:
+    return zlib.decompress(pb.payload)
+  if codec in _ZLIB_DICTIONARY_FILES:
+    decompressor = zlib.decompressobj(zdict=ZlibDictionary(codec))
+    return decompressor.decompress(pb.payload) + decompressor.flush()
+  if codec == pyatdl_pb2.LZMA:
+    return lzma.decompress(pb.payload)
+  assert codec == pyatdl_pb2.UNCOMPRESSED, codec
+  return pb.payload
+
+
+def _ParsedChecksumAndData(file_contents, path):
+  """Returns the parsed pyatdl_pb2.ChecksumAndData; raises DeserializationError."""
+  try:
+    return pyatdl_pb2.ChecksumAndData.FromString(file_contents)  # pylint: disable=no-member
+  except message.DecodeError:
+    raise DeserializationError('Data corruption: Cannot load from %s' % path)
+
+
+def UncompressedChecksum(file_contents, path, algorithm):
+  """Returns the checksum of the uncompressed pyatdl_pb2.ToDoList inside file_contents without decompressing it.
+
+  We neither decompress nor verify the payload, so this is cheap.
+
+  Args:
+    file_contents: bytes  # serialized form of ChecksumAndData
+    path: str  # save file location used only in error messages
+    algorithm: int  # pyatdl_pb2.ChecksumAlgorithm
+  Returns:
+    None|str  # None if file_contents predates ChecksumAndData.uncompressed_sha1_checksum or uses another algorithm
+  Raises:
+    DeserializationError
+  """
+  pb = _ParsedChecksumAndData(file_contents, path)
+  if pb.checksum_algorithm != algorithm:
+    return None
+  if _Codec(pb) == pyatdl_pb2.UNCOMPRESSED:
+    return pb.sha1_checksum
+  if pb.HasField('uncompressed_sha1_checksum'):
+    return pb.uncompressed_sha1_checksum
+  return None
+
+
+def _GetPayloadAfterVerifyingChecksum(file_contents, path, sha1_checksum_list=None, payload_checksum_list=None,
+                                      backfilled_list=None, checksum_algorithm=None):
   """Verifies the checksum of the payload; returns the payload.
 
   Args:
     file_contents: bytes  # serialized form of ChecksumAndData
     path: str  # save file location used only in error messages
-    sha1_checksum_list: None|list to which we append the SHA1 checksum of the uncompressed pyatdl_pb2.ToDoList serialization
+    sha1_checksum_list: None|list to which we append the checksum, by checksum_algorithm, of the uncompressed
+                        pyatdl_pb2.ToDoList serialization
+    payload_checksum_list: None|list to which we append the verified checksum of the (possibly compressed) payload
+    backfilled_list: None|list to which we append file_contents with uncompressed_sha1_checksum filled in if
+                     file_contents lacked it. Save that in place of file_contents and later reads will be cheaper.
+    checksum_algorithm: None|int  # pyatdl_pb2.ChecksumAlgorithm; SHA1 if None
   Returns:
     bytes
   Raises:
     DeserializationError
   """
-  try:
-    pb = pyatdl_pb2.ChecksumAndData.FromString(file_contents)  # pylint: disable=no-member
-  except message.DecodeError:
-    raise DeserializationError('Data corruption: Cannot load from %s' % path)
+  pb = _ParsedChecksumAndData(file_contents, path)
   if pb.payload_length < 1:
     raise DeserializationError(
       'Invalid save file %s: payload_length=%s' % (path, pb.payload_length))
@@ -81,46 +259,71 @@ def _GetPayloadAfterVerifyingChecksum(file_contents, path, sha1_checksum_list=No
     raise DeserializationError(
       'Invalid save file %s: payload_length=%s but len(payload)=%s'
       % (path, pb.payload_length, len(pb.payload)))
-  if Sha1Checksum(pb.payload) != pb.sha1_checksum:
+  if Checksum(pb.payload, pb.checksum_algorithm) != pb.sha1_checksum:
     raise DeserializationError(
       'Invalid save file %s: Checksum mismatch' % (path,))
-  if pb.payload_is_zlib_compressed:
-    uncompressed_payload = zlib.decompress(pb.payload)
+  if payload_checksum_list is not None:
+    payload_checksum_list.append(pb.sha1_checksum)
+  uncompressed_payload = _Decompressed(pb)
+  if sha1_checksum_list is not None or backfilled_list is not None:
+    if _Codec(pb) == pyatdl_pb2.UNCOMPRESSED:
+      uncompressed_checksum = pb.sha1_checksum
+    elif pb.HasField('uncompressed_sha1_checksum'):
+      uncompressed_checksum = pb.uncompressed_sha1_checksum
+    else:  # an old save file
+      uncompressed_checksum = Checksum(uncompressed_payload, pb.checksum_algorithm)
+      if backfilled_list is not None:
+        pb.uncompressed_sha1_checksum = uncompressed_checksum
+        backfilled_list.append(pb.SerializeToString())
     if sha1_checksum_list is not None:
-      # TODO(chandler37): As a performance optimization, store this sha1_checksum inside ChecksumAndData in addition to
-      # the current payload checksum. But for mergeprotobufs to be fastest, we'll need to also/instead store it outside
-      # of todo_todolist.encrypted_contents2.
-      sha1_checksum_list.append(Sha1Checksum(uncompressed_payload))
-  else:
-    uncompressed_payload = pb.payload
-    if sha1_checksum_list is not None:
-      sha1_checksum_list.append(pb.sha1_checksum)
+      if checksum_algorithm is None:
+        checksum_algorithm = pyatdl_pb2.SHA1
+      if checksum_algorithm != pb.checksum_algorithm:
+        uncompressed_checksum = Checksum(uncompressed_payload, checksum_algorithm)
+      sha1_checksum_list.append(uncompressed_checksum)
   return uncompressed_payload
 
 
-def SerializedWithChecksum(payload):
+def SerializedWithChecksum(payload, uncompressed_checksum=None, nesting_depth=None, algorithm=None):
   """Returns a serialized ChecksumAndData wrapping the given byte sequence.
 
   Args:
     payload: bytes  # from pyatdl_pb2.ToDoList().SerializeToString()
+    uncompressed_checksum: None|str  # Checksum(payload, algorithm) if the caller already knows it
+    nesting_depth: None|int  # tdl.ToDoList.ProtobufNestingDepth() if the caller knows it; if None, we parse the
+                             # result to see if we can load it back, as FLAGS.pyatdl_paranoid_about_saving does
+    algorithm: None|int  # pyatdl_pb2.ChecksumAlgorithm; ChecksumAlgorithm() if None
   Returns:
     bytes  # from pyatdl_pb2.ChecksumAndData().SerializeToString()
+  Raises:
+    TooBigToSaveError
   """
+  uncompressed_length = len(payload)
+  if algorithm is None:
+    algorithm = ChecksumAlgorithm()
   pb = pyatdl_pb2.ChecksumAndData()
-  pb.payload_is_zlib_compressed = False
-  assert 0 <= FLAGS.pyatdl_zlib_compression_level <= 9
-  if FLAGS.pyatdl_zlib_compression_level:
-    pb.payload_is_zlib_compressed = True
-    payload = zlib.compress(
-      payload, FLAGS.pyatdl_zlib_compression_level)
+  pb.checksum_algorithm = algorithm
+  level = _CompressionLevel(uncompressed_length)
+  pb.codec = _CODECS[FLAGS.pyatdl_compression_codec] if level else pyatdl_pb2.UNCOMPRESSED
+  pb.payload_is_zlib_compressed = pb.codec == pyatdl_pb2.ZLIB
+  if pb.codec != pyatdl_pb2.UNCOMPRESSED:
+    pb.uncompressed_sha1_checksum = (
+      Checksum(payload, algorithm) if uncompressed_checksum is None else uncompressed_checksum)
+    payload = _Compressed(payload, pb.codec, level)
   pb.payload = payload
   pb.payload_length = len(payload)
-  cksum = Sha1Checksum(payload)
+  cksum = Checksum(payload, algorithm)
   pb.sha1_checksum = cksum
   assert payload
-  result = pb.SerializeToString()
-  _TestDeserializationOfChecksumWithData(result, cksum)
-  return result
+  if FLAGS.pyatdl_paranoid_about_saving or nesting_depth is None:
+    result = pb.SerializeToString()
+    _TestDeserializationOfChecksumWithData(result, cksum)
+    return result
+  if not FLAGS.pyatdl_allow_infinite_memory_for_protobuf:
+    if (max(uncompressed_length, pb.ByteSize()) > _MAX_PROTOBUF_BYTES
+            or nesting_depth > _MAX_PROTOBUF_NESTING_DEPTH):
+      raise TooBigToSaveError
+  return pb.SerializeToString()
 
 
 def _TestDeserializationOfChecksumWithData(bytestring, cksum):
@@ -145,17 +348,14 @@ def _TestDeserializationOfChecksumWithData(bytestring, cksum):
         'this should never happen even if the to-do list is too big. '
         'pb.payload_length=%s and pb.payload actual length=%s'
         % (pb.payload_length, len(pb.payload)))
-  real_sum = Sha1Checksum(pb.payload)  # TODO(chandler37): this is expensive, make it optional?
+  real_sum = Checksum(pb.payload, pb.checksum_algorithm)
   if real_sum != cksum:
     raise AssertionError(
         'this should never happen even if the to-do list is too big. '
-        'SHA1(pb.payload)=%s and pb.sha1_checksum=%s'
+        'checksum(pb.payload)=%s and pb.sha1_checksum=%s'
         % (real_sum, pb.sha1_checksum))
-  uncompressed_payload = pb.payload
-  if pb.payload_is_zlib_compressed:
-    uncompressed_payload = zlib.decompress(pb.payload)
   try:
-    pyatdl_pb2.ToDoList.FromString(uncompressed_payload)
+    pyatdl_pb2.ToDoList.FromString(_Decompressed(pb))
   except message.DecodeError:
     raise TooBigToSaveError
 
@@ -169,8 +369,8 @@ def SerializeToDoList2(todolist, writer):
   Returns:
     None
   """
-  todolist.CheckIsWellFormed()
-  writer.write(SerializedWithChecksum(todolist.AsProto().SerializeToString()))
+  todolist.CheckChangesAreWellFormed()
+  writer.write(SerializedWithChecksum(todolist.SerializedProtobuf(), nesting_depth=todolist.ProtobufNestingDepth()))
 
 
 def SerializeToDoList(todolist, path):
@@ -203,18 +403,45 @@ def SerializeToDoList(todolist, path):
   os.rename(tmp_path, path)
 
 
-def DeserializeToDoList2(reader, tdl_factory, sha1_checksum_list=None):
+def _CheckDeserialized(todolist, verification_level, lazy=False):
+  """Performs the checks that FLAGS.pyatdl_verification_level calls for after deserialization.
+
+  tdl.ToDoList.DeserializedProtobuf did the well-formedness check already unless verification_level is 'trusted'.
+
+  Args:
+    todolist: tdl.ToDoList
+    verification_level: str  # see FLAGS.pyatdl_verification_level
+    lazy: bool  # see tdl.ToDoList.DeserializedProtobuf; skips the renderings that would materialize everything
+  Raises:
+    errors.DataError
+  """
+  if verification_level == 'paranoid' and not lazy:
+    str(todolist)  # calls todolist.__unicode__
+    str(todolist.AsProto())
+  if verification_level != 'trusted':
+    todolist.CheckChangesAreWellFormed()
+
+
+def DeserializeToDoList2(reader, tdl_factory, sha1_checksum_list=None, lazy=False, verification_level=None,
+                         backfilled_list=None, checksum_algorithm=None):
   """Deserializes a to-do list from the given file.
 
   Args:
     reader: object with 'read(self)' method and 'name' attribute
     tdl_factory: None|callable function ()->tdl.ToDoList
-    sha1_checksum_list: None|list to which we append the SHA1 checksum of the uncompressed pyatdl_pb2.ToDoList serialization
+    sha1_checksum_list: None|list to which we append the checksum, by checksum_algorithm, of the uncompressed
+                        pyatdl_pb2.ToDoList serialization
+    backfilled_list: None|list  # see _GetPayloadAfterVerifyingChecksum
+    checksum_algorithm: None|int  # pyatdl_pb2.ChecksumAlgorithm for sha1_checksum_list; SHA1 if None
+    lazy: bool  # see tdl.ToDoList.DeserializedProtobuf; skips the sanity checks that would materialize everything
+    verification_level: None|str  # see FLAGS.pyatdl_verification_level, the default
   Returns:
     None|tdl.ToDoList  # None only if tdl_factory is None and would have been used
   Raises:
     DeserializationError
   """
+  if verification_level is None:
+    verification_level = FLAGS.pyatdl_verification_level
   uid.ResetNotesOfExistingUIDs()
   try:
     file_contents = reader.read()
@@ -223,8 +450,15 @@ def DeserializeToDoList2(reader, tdl_factory, sha1_checksum_list=None):
         return None
       todolist = tdl_factory()
     else:
+      payload_checksum_list = []
       todolist = tdl.ToDoList.DeserializedProtobuf(
-        _GetPayloadAfterVerifyingChecksum(file_contents, reader.name, sha1_checksum_list=sha1_checksum_list))
+        _GetPayloadAfterVerifyingChecksum(file_contents, reader.name, sha1_checksum_list=sha1_checksum_list,
+                                          payload_checksum_list=payload_checksum_list,
+                                          backfilled_list=backfilled_list,
+                                          checksum_algorithm=checksum_algorithm),
+        lazy=lazy,
+        check=verification_level != 'trusted')
+      todolist.NoteChecksum(payload_checksum_list[0])
   except IOError as e:
     raise DeserializationError(
       'Cannot deserialize to-do list from %s. See the "reset_database" command '
@@ -235,10 +469,7 @@ def DeserializeToDoList2(reader, tdl_factory, sha1_checksum_list=None):
       return None
     todolist = tdl_factory()
   try:
-    # TODO(chandler37): make this optional based on a FLAG for performance reasons.
-    str(todolist)  # calls todolist.__unicode__
-    str(todolist.AsProto())
-    todolist.CheckIsWellFormed()
+    _CheckDeserialized(todolist, verification_level, lazy=lazy)
   except:  # noqa: E722
     print('Serialization error?  Reset by rerunning with the "reset_database" '
           'command.\nHere is the exception:\n')
@@ -268,7 +499,8 @@ def DeserializeToDoList(path, tdl_factory):
           todolist = tdl_factory()
         else:
           todolist = tdl.ToDoList.DeserializedProtobuf(
-            _GetPayloadAfterVerifyingChecksum(file_contents, path))
+            _GetPayloadAfterVerifyingChecksum(file_contents, path),
+            check=FLAGS.pyatdl_verification_level != 'trusted')
     except IOError as e:
       raise DeserializationError(
         'Cannot deserialize to-do list from %s. See the "reset_database" command '
@@ -277,9 +509,7 @@ def DeserializeToDoList(path, tdl_factory):
     except EOFError:
       todolist = tdl_factory()
   try:
-    str(todolist)
-    str(todolist.AsProto())
-    todolist.CheckIsWellFormed()
+    _CheckDeserialized(todolist, FLAGS.pyatdl_verification_level)
   except:  # noqa: E722
     print('Serialization error?  Reset by rerunning with the "reset_database" '
           'command, i.e. deleting\n  %s\nHere is the exception:\n'
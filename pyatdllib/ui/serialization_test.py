@@ -4,10 +4,19 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 from __future__ import print_function
 
+import zlib
+
 from absl import flags  # type: ignore
 
 from google.protobuf import text_format  # type: ignore
 
+from pyatdllib.core import action
+from pyatdllib.core import errors
+from pyatdllib.core import folder
+from pyatdllib.core import prj
+from pyatdllib.core import pyatdl_pb2
+from pyatdllib.core import tdl
+from pyatdllib.core import uid
 from pyatdllib.core import unitjest
 from pyatdllib.ui import serialization
 from pyatdllib.ui import uicmd
@@ -277,6 +286,180 @@ ctx_list {
 """.lstrip()
     self.assertEqual(text_format.MessageToString(a_tdl.AsProto()), expected)
 
+  def testUncompressedChecksum(self):
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    payload = tdl.ToDoList().AsProto().SerializeToString()
+    for algorithm in (pyatdl_pb2.SHA1, pyatdl_pb2.BLAKE2B_160):
+      for level in (0, 2):
+        FLAGS.pyatdl_zlib_compression_level = level
+        try:
+          saved = serialization.SerializedWithChecksum(payload, algorithm=algorithm)
+        finally:
+          FLAGS.pyatdl_zlib_compression_level = -1
+        expected = serialization.Checksum(payload, algorithm)
+        self.assertEqual(serialization.UncompressedChecksum(saved, 'test', algorithm), expected)
+        self.assertIsNone(serialization.UncompressedChecksum(saved, 'test', pyatdl_pb2.BLAKE2B_256))
+        sha1_checksum_list = []
+        backfilled_list = []
+        self.assertEqual(
+          serialization._GetPayloadAfterVerifyingChecksum(saved, 'test', sha1_checksum_list=sha1_checksum_list,
+                                                          backfilled_list=backfilled_list, checksum_algorithm=algorithm),
+          payload)
+        self.assertEqual(sha1_checksum_list, [expected])
+        self.assertEqual(backfilled_list, [])
+
+  def testChecksumAlgorithms(self):
+    self.assertEqual(serialization.ChecksumAlgorithm(), pyatdl_pb2.SHA1)
+    self.assertEqual(serialization.ChecksumAlgorithm('blake2b_160'), pyatdl_pb2.BLAKE2B_160)
+    self.assertEqual(serialization.Checksum(b'abc', pyatdl_pb2.SHA1), 'a9993e364706816aba3e25717850c26c9cd0d89d')
+    self.assertEqual(serialization.Checksum(b'abc', pyatdl_pb2.BLAKE2B_160), '384264f676f39536840523f284921cdc68b6846b')
+    for algorithm in (pyatdl_pb2.SHA1, pyatdl_pb2.BLAKE2B_160, pyatdl_pb2.BLAKE2B_256):
+      self.assertEqual(len(serialization.Checksum(b'', algorithm)), serialization.ChecksumHexLength(algorithm))
+    # A save file from before pyatdl.ChecksumAlgorithm existed uses SHA1, and we can ask for another algorithm:
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    payload = tdl.ToDoList().AsProto().SerializeToString()
+    old = pyatdl_pb2.ChecksumAndData.FromString(serialization.SerializedWithChecksum(payload, algorithm=pyatdl_pb2.SHA1))
+    old.ClearField('checksum_algorithm')
+    old.ClearField('uncompressed_sha1_checksum')
+    for algorithm in (pyatdl_pb2.SHA1, pyatdl_pb2.BLAKE2B_256):
+      sha1_checksum_list = []
+      uid.ResetNotesOfExistingUIDs()
+      a_tdl = serialization.DeserializeToDoList2(MockReader(old.SerializeToString()), tdl_factory=None,
+                                                 sha1_checksum_list=sha1_checksum_list, checksum_algorithm=algorithm)
+      self.assertEqual(a_tdl.AsProto().SerializeToString(), payload)
+      self.assertEqual(sha1_checksum_list, [serialization.Checksum(payload, algorithm)])
+    old.sha1_checksum = serialization.Checksum(old.payload, pyatdl_pb2.BLAKE2B_160)
+    with self.assertRaisesRegex(serialization.DeserializationError, 'Checksum mismatch'):
+      serialization.DeserializeToDoList2(MockReader(old.SerializeToString()), tdl_factory=None)
+
+  def testCompressionCodecs(self):
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    lst = tdl.ToDoList()
+    lst.AddContext('@home')
+    for i in range(5):
+      lst.inbox.items.append(action.Action(name='Action %d' % i))
+    payload = lst.AsProto().SerializeToString()
+    stored_bytes = {}
+    try:
+      for name, codec in [('none', pyatdl_pb2.UNCOMPRESSED), ('zlib', pyatdl_pb2.ZLIB),
+                          ('zlib_with_dictionary', pyatdl_pb2.ZLIB_WITH_DICTIONARY_1), ('lzma', pyatdl_pb2.LZMA)]:
+        FLAGS.pyatdl_compression_codec = name
+        for level in (-1, 0, 1, 9):
+          FLAGS.pyatdl_zlib_compression_level = level
+          saved = serialization.SerializedWithChecksum(payload)
+          pb = pyatdl_pb2.ChecksumAndData.FromString(saved)
+          self.assertEqual(pb.codec, codec if level else pyatdl_pb2.UNCOMPRESSED)
+          self.assertEqual(pb.payload_is_zlib_compressed, pb.codec == pyatdl_pb2.ZLIB)
+          self.assertEqual(serialization.UncompressedChecksum(saved, 'test', pyatdl_pb2.SHA1),
+                           serialization.Sha1Checksum(payload))
+          self.assertEqual(
+            serialization._GetPayloadAfterVerifyingChecksum(saved, 'test', sha1_checksum_list=[], backfilled_list=[],
+                                                            checksum_algorithm=pyatdl_pb2.SHA1),
+            payload)
+          if level == -1:
+            stored_bytes[name] = len(pb.payload)
+    finally:
+      FLAGS.pyatdl_compression_codec = 'zlib'
+      FLAGS.pyatdl_zlib_compression_level = -1
+    self.assertEqual(stored_bytes['none'], len(payload))
+    self.assertLess(stored_bytes['zlib_with_dictionary'], stored_bytes['zlib'])
+
+  def testLegacyZlibRows(self):
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    payload = tdl.ToDoList().AsProto().SerializeToString()
+    pb = pyatdl_pb2.ChecksumAndData()
+    pb.payload = zlib.compress(payload)
+    pb.payload_is_zlib_compressed = True
+    pb.payload_length = len(pb.payload)
+    pb.sha1_checksum = serialization.Sha1Checksum(pb.payload)
+    self.assertFalse(pb.HasField('codec'))
+    uid.ResetNotesOfExistingUIDs()
+    self.assertEqual(
+      serialization.DeserializeToDoList2(MockReader(pb.SerializeToString()), tdl_factory=None).AsProto().SerializeToString(),
+      payload)
+
+  def testAutomaticCompressionLevel(self):
+    self.assertEqual(serialization._CompressionLevel(1000), 9)
+    self.assertEqual(serialization._CompressionLevel(64 << 10), 9)
+    self.assertEqual(serialization._CompressionLevel((64 << 10) + 1), 6)
+    self.assertEqual(serialization._CompressionLevel(60 << 20), 2)
+    FLAGS.pyatdl_zlib_compression_level = 4
+    try:
+      self.assertEqual(serialization._CompressionLevel(1000), 4)
+    finally:
+      FLAGS.pyatdl_zlib_compression_level = -1
+
+  def testZlibDictionariesNeverChange(self):
+    # Rows saved with a dictionary cannot be loaded without that very dictionary. See train_zlib_dictionary.py.
+    self.assertEqual(zlib.adler32(serialization.ZlibDictionary(pyatdl_pb2.ZLIB_WITH_DICTIONARY_1)), 3255221677)
+
+  def testVerificationLevels(self):
+    FLAGS.pyatdl_randomize_uids = False
+    uid.ResetNotesOfExistingUIDs()
+    lst = tdl.ToDoList()
+    lst.AddContext('@home')
+    lst.inbox.items.append(action.Action(name='a'))
+    good = serialization.SerializedWithChecksum(lst.SerializedProtobuf())
+    pb = lst.AsProto()
+    pb.inbox.actions[0].ctx_uid = 37  # no such Ctx
+    bad = serialization.SerializedWithChecksum(pb.SerializeToString())
+    for level in ('paranoid', 'standard', 'trusted'):
+      loaded = serialization.DeserializeToDoList2(MockReader(good), tdl_factory=None, verification_level=level)
+      self.assertEqual(loaded.AsProto(), lst.AsProto())
+      if level == 'trusted':
+        self.assertEqual(
+          serialization.DeserializeToDoList2(MockReader(bad), tdl_factory=None, verification_level=level).AsProto(), pb)
+      else:
+        with self.assertRaisesRegex(errors.DataError, "UID 37 is an action's context UID"):
+          serialization.DeserializeToDoList2(MockReader(bad), tdl_factory=None, verification_level=level)
+
+  def testSizeGuardAgreesWithParsing(self):
+    class MockWriter(object):
+      def __init__(self):
+        self.written = []
+
+      def write(self, b):
+        self.written.append(b)
+
+    for with_project in (False, True):
+      for num_folders in range(94, 99):
+        FLAGS.pyatdl_randomize_uids = False
+        uid.ResetNotesOfExistingUIDs()
+        lst = tdl.ToDoList()
+        parent_uid = None
+        for i in range(num_folders):
+          f = folder.Folder(name='f%d' % i)
+          lst.AddProjectOrFolder(f, parent_folder_uid=parent_uid)
+          parent_uid = f.uid
+        if with_project:
+          p = prj.Prj(name='p')
+          p.items.append(action.Action(name='a'))
+          lst.AddProjectOrFolder(p, parent_folder_uid=parent_uid)
+        self.assertEqual(lst.ProtobufNestingDepth(), num_folders + (5 if with_project else 3))
+        if lst.ProtobufNestingDepth() <= 100:
+          serialized = lst.SerializedProtobuf()
+          uid.ResetNotesOfExistingUIDs()
+          lazy_lst = tdl.ToDoList.DeserializedProtobuf(serialized, lazy=True)
+          self.assertEqual(lazy_lst.ProtobufNestingDepth(), lst.ProtobufNestingDepth())
+        results = []
+        for paranoid in (True, False):
+          FLAGS.pyatdl_paranoid_about_saving = paranoid
+          writer = MockWriter()
+          try:
+            serialization.SerializeToDoList2(lst, writer)
+          except serialization.TooBigToSaveError:
+            results.append(None)
+          else:
+            results.append(writer.written)
+          finally:
+            FLAGS.pyatdl_paranoid_about_saving = False
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0] is None, lst.ProtobufNestingDepth() > 100)
+
 
 if __name__ == '__main__':
   unitjest.main()
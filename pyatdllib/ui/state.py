@@ -176,16 +176,17 @@ class State(object):  # pylint: disable=too-many-instance-attributes,too-many-pu
       else:
         return State.SlashEscaped(x)
 
-    for f, path in self.ToDoList().ContainersPreorder():
-      if f.uid == containr.uid:
-        if f is self.ToDoList().root or f is self.ToDoList().inbox:
-          return '%s%s' % ('' if display else FLAGS.pyatdl_separator,
-                           Escaped(f.name))
-        z = FLAGS.pyatdl_separator.join(Escaped(x.name) for x in reversed(path))
-        r = '%s%s%s' % (z,
-                        FLAGS.pyatdl_separator,
-                        Escaped(f.name))
-        return r.lstrip(FLAGS.pyatdl_separator) if display else r
+    f = self.ToDoList().ObjectByUID(containr.uid)
+    if not isinstance(f, container.Container):
+      return None
+    if f is self.ToDoList().root or f is self.ToDoList().inbox:
+      return '%s%s' % ('' if display else FLAGS.pyatdl_separator,
+                       Escaped(f.name))
+    z = FLAGS.pyatdl_separator.join(Escaped(x.name) for x in reversed(f.Ancestors()))
+    r = '%s%s%s' % (z,
+                    FLAGS.pyatdl_separator,
+                    Escaped(f.name))
+    return r.lstrip(FLAGS.pyatdl_separator) if display else r
 
   def CurrentWorkingContainerString(self):
     """Prettyprinted path to the current working Container.
@@ -281,16 +282,10 @@ class State(object):  # pylint: disable=too-many-instance-attributes,too-many-pu
     except lexer.Error as e:
       raise InvalidPathError(e)
     if the_uid:
-      for context in self.ToDoList().ctx_list.items:
-        if context.uid == the_uid:
-          return context
-      for f, unused_path in self.ToDoList().ContainersPreorder():
-        if f.uid == the_uid:
-          return f
-        for item in f.items:
-          if item.uid == the_uid:
-            return item
-      raise InvalidPathError('UID %s not found' % the_uid)
+      obj = self.ToDoList().ObjectByUID(the_uid)
+      if obj is None:
+        raise InvalidPathError('UID %s not found' % the_uid)
+      return obj
     if include_contexts:
       for context in self.ToDoList().ctx_list.items:
         if context.name == path:
@@ -337,13 +332,12 @@ class State(object):  # pylint: disable=too-many-instance-attributes,too-many-pu
     """
     if cwc.uid == 1:
       return self.ToDoList().root
-    names_seen = set()
-    for f, path in self.ToDoList().ContainersPreorder():
-      names_seen.add(f.name)
-      if f.uid == cwc.uid:
-        if not path:
-          raise InvalidPathError('Already at the root Folder; cannot ascend.')
-        return path[0]
+    f = self.ToDoList().ObjectByUID(cwc.uid)
+    if isinstance(f, container.Container):
+      if f.parent is None:
+        raise InvalidPathError('Already at the root Folder; cannot ascend.')
+      return f.parent
+    names_seen = set(f.name for f, unused_path in self.ToDoList().ContainersPreorder())
     raise InvalidPathError(
       'No such folder. All folders:\n%s'
       % (common.Indented('\n'.join(sorted(names_seen)))))
@@ -377,12 +371,16 @@ class State(object):  # pylint: disable=too-many-instance-attributes,too-many-pu
       if name == FLAGS.inbox_project_name or the_uid == self.ToDoList().inbox.uid:
         return self.ToDoList().inbox
     # TODO(chandler): Does this mean we can stop renaming Contexts '%s-deleted-at-14999999999'?
-    for item in cwc.items:
-      if item.uid == the_uid or (not item.is_deleted and item.name == name):
+    if the_uid is not None:
+      item = self.ToDoList().ObjectByUID(the_uid)
+      if item is not None and item.parent is cwc:
         return item
-    for item in cwc.items:
-      if item.is_deleted and item.name == name:
+    named = cwc.ItemsNamed(name)
+    for item in named:
+      if not item.is_deleted:
         return item
+    for item in named:
+      return item
     raise InvalidPathError(
       'With current working Folder/Project "%s", there is no such child "%s".  Choices:\n%s\n%s'
       % (self.CurrentWorkingContainerString(),
@@ -403,6 +401,20 @@ class State(object):  # pylint: disable=too-many-instance-attributes,too-many-pu
       show_active=show_active,
       show_done=show_done)
 
+  def QueryFilter(self, *, query, base):
+    """Creates a ViewFilter that narrows base, another ViewFilter, to the Actions matching a query.
+
+    Returns:
+      ViewFilter
+    Raises:
+      query.QuerySyntaxError
+    """
+    return view_filter.QueryFilter(
+      lambda a: self._ActionToProject(a),
+      lambda a: self._ActionToContext(a),
+      query=query,
+      base=base)
+
   def ViewFilter(self):
     """Returns the current ViewFilter.
 
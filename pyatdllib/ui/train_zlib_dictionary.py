@@ -0,0 +1,90 @@
+"""Writes a zlib preset dictionary for a ZLIB_WITH_DICTIONARY_* pyatdl.CompressionCodec.
+
+A preset dictionary is a byte sequence that zlib acts as if it had just seen
+before the payload, so the payload can refer back to it from its very first
+byte. Small to-do lists, which are most of them, lack the repetition that zlib
+needs to get going; with a dictionary full of the protobuf tags, field values,
+and names that serialized to-do lists share, they compress to about half the
+size (see benchmarks/compression_codecs.py).
+
+So we build the dictionary from representative serialized pyatdl.ToDoLists,
+putting what the most lists share nearest the end, where references to it
+are shortest. The starter template that every new to-do list begins as (see
+the "seed" command) comes last. zlib looks back at most 32KiB, so we keep only
+the last 32KiB.
+
+Rows saved with a dictionary need that very dictionary to load, so never
+change a dictionary file once it ships. Instead, write a new file, add a new
+pyatdl.CompressionCodec, and point serialization._ZLIB_DICTIONARY_FILES and
+FLAGS.pyatdl_compression_codec at it:
+
+  python -m pyatdllib.ui.train_zlib_dictionary --output=pyatdllib/ui/zlib_dictionary_2.bin
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import os
+
+from absl import flags  # type: ignore
+
+from third_party.google.apputils.google.apputils import app
+
+from ..core import uid
+from . import uicmd
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('output', None, 'Where to write the dictionary')
+flags.DEFINE_multi_string(
+  'training_file',
+  [os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'example_serialized_binary_protobufs',
+                'pyatdl.ToDoList.sample.with.note.binaryproto')],
+  'Serialized pyatdl.ToDoLists (not ChecksumAndData) representative of what users store, e.g. from the "Download '
+  'Your Data" page of the Django app, the most representative last')
+
+_ZLIB_WINDOW_BYTES = 1 << 15
+
+
+def StarterTemplate():
+  """Returns the serialization of the to-do list that a new user of the Django app starts with."""
+  saved = FLAGS.seed_upon_creation
+  FLAGS.seed_upon_creation = True
+  try:
+    uid.ResetNotesOfExistingUIDs()
+    return uicmd.NewToDoList().AsProto().SerializeToString()
+  finally:
+    FLAGS.seed_upon_creation = saved
+
+
+def Dictionary(training_data):
+  """Returns a zlib preset dictionary built from the given serialized pyatdl.ToDoLists, the most representative last.
+
+  Args:
+    training_data: [bytes]
+  Returns:
+    bytes
+  """
+  return b''.join(training_data)[-_ZLIB_WINDOW_BYTES:]
+
+
+def main(argv):
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  if not FLAGS.output:
+    raise app.UsageError('--output is required')
+  uicmd.RegisterAppcommands(False, uicmd.APP_NAMESPACE)
+  training_data = []
+  for path in FLAGS.training_file:
+    with open(path, 'rb') as f:
+      training_data.append(f.read())
+  training_data.append(StarterTemplate())
+  zdict = Dictionary(training_data)
+  with open(FLAGS.output, 'wb') as f:
+    f.write(zdict)
+  print(f'Wrote {len(zdict)} bytes to {FLAGS.output}')
+
+
+if __name__ == '__main__':
+  app.run()
@@ -25,7 +25,7 @@ from absl import flags  # type: ignore
 from google.protobuf import text_format  # type: ignore
 from third_party.google.apputils.google.apputils import app
 from third_party.google.apputils.google.apputils import appcommands
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from ..core import action
 from ..core import auditable_object
@@ -33,7 +33,9 @@ from ..core import common
 from ..core import container
 from ..core import ctx
 from ..core import folder
+from ..core import fragment_cache
 from ..core import prj
+from ..core import query
 from ..core import tdl
 from ..core import uid
 from ..core import view_filter
@@ -167,6 +169,8 @@ def _JsonForOneItem(item: Optional[Union[folder.Folder, prj.Prj, action.Action,
                     in_prj: str = None) -> Dict[str, Any]:
   """Returns a JSON-friendly object representing the given item.
 
+  We reuse the object from fragment_cache.FRAGMENTS if nothing it shows has changed.
+
   Args:
     item: Folder|Prj|Action|Ctx|None  # None is 'Actions Without Context'
     name_override: str  # overrides item.name if not None
@@ -175,6 +179,43 @@ def _JsonForOneItem(item: Optional[Union[folder.Folder, prj.Prj, action.Action,
   Returns:
     dict  # not JSON, but ready to be
   """
+  in_context = None
+  if isinstance(item, action.Action):
+    if item.ctx_uid is None:
+      in_context = FLAGS.no_context_display_string
+    else:
+      context = to_do_list.ContextByUID(item.ctx_uid)
+      if context is not None:
+        in_context = context.name
+      else:
+        raise AssertionError(
+          "The protobuf has a bad Context association with an Action. item.ctx_uid=%s item.uid=%s"
+          % (item.ctx_uid, item.uid))
+  path_names = None if path_leaf_first is None else tuple(x.name for x in reversed(path_leaf_first))
+  if item is None:
+    return _UncachedJsonForOneItem(None, number_of_items, name_override, in_context_override, None, path_names,
+                                   in_prj)
+  key: Tuple[Any, ...] = (
+    'json', type(item), item.uid, item.mtime, item.ctime, item.dtime, item.is_deleted,
+    getattr(item, 'is_complete', None), getattr(item, 'is_active', None), item.name, bool(item.note),
+    number_of_items, name_override, in_context_override, in_context, path_names, FLAGS.pyatdl_separator, in_prj)
+  if isinstance(item, prj.Prj):
+    key += (bool(item.NeedsReview()), item.default_context_uid)
+  fragment = fragment_cache.FRAGMENTS.Get(
+    key,
+    lambda: _UncachedJsonForOneItem(item, number_of_items, name_override, in_context_override, in_context,
+                                    path_names, in_prj))
+  return dict(fragment)
+
+
+def _UncachedJsonForOneItem(item: Optional[Union[folder.Folder, prj.Prj, action.Action, ctx.Ctx]],
+                            number_of_items: int,
+                            name_override: Optional[str],
+                            in_context_override: Optional[str],
+                            in_context: Optional[str],
+                            path_names: Optional[Tuple[Optional[str], ...]],
+                            in_prj: Optional[str]) -> Dict[str, Any]:
+  """Does the work of _JsonForOneItem given the name of the Action's Ctx and the names along the item's path."""
   name = FLAGS.no_context_display_string if item is None else item.name
   rv = {
     'is_deleted': False if item is None else item.is_deleted,
@@ -196,16 +237,6 @@ def _JsonForOneItem(item: Optional[Union[folder.Folder, prj.Prj, action.Action,
     # https://developer.mozilla.org/en-US/docs/Web/JavaScript/Reference/Global_Objects/Number/MAX_SAFE_INTEGER
     rv['default_context_uid'] = str(0 if item.default_context_uid is None else item.default_context_uid)
   if isinstance(item, action.Action):
-    if item.ctx_uid is None:
-      in_context = FLAGS.no_context_display_string
-    else:
-      context = to_do_list.ContextByUID(item.ctx_uid)
-      if context is not None:
-        in_context = context.name
-      else:
-        raise AssertionError(
-          "The protobuf has a bad Context association with an Action. item.ctx_uid=%s item.uid=%s"
-          % (item.ctx_uid, item.uid))
     rv['in_context'] = in_context_override if in_context_override is not None else in_context
     rv['in_context_uid'] = str(item.ctx_uid) if item.ctx_uid is not None else None
   if item is None:
@@ -214,9 +245,8 @@ def _JsonForOneItem(item: Optional[Union[folder.Folder, prj.Prj, action.Action,
     rv['is_active'] = item.is_active
   if item is not None:
     rv['has_note'] = bool(item.note)
-  if path_leaf_first is not None:
-    rv['path'] = FLAGS.pyatdl_separator.join(
-      state_module.State.SlashEscaped(x.name) for x in reversed(path_leaf_first))
+  if path_names is not None:
+    rv['path'] = FLAGS.pyatdl_separator.join(state_module.State.SlashEscaped(x) for x in path_names)
     if not rv['path']:
       rv['path'] = FLAGS.pyatdl_separator
   return rv
@@ -354,17 +384,13 @@ def _LookupProject(state, argument):  # pylint: disable=too-many-branches
   containr = state.GetContainerFromPath(dirname)
   if containr is state.ToDoList().root and basename == FLAGS.inbox_project_name:
     return state.ToDoList().inbox, None
-  project_names = []
-  for item in containr.items:
-    if isinstance(item, prj.Prj):
-      if not item.is_deleted:
-        project_names.append(item.name)
-        if the_uid == item.uid or item.name == basename:
-          return item, containr
-  for item in containr.items:
-    if isinstance(item, prj.Prj):
-      if item.is_deleted and item.name == basename:
-          return item, containr
+  named_projects = [item for item in containr.ItemsNamed(basename) if isinstance(item, prj.Prj)]
+  for item in named_projects:
+    if not item.is_deleted:
+      return item, containr
+  for item in named_projects:
+    return item, containr
+  project_names = [item.name for item in containr.items if isinstance(item, prj.Prj) and not item.is_deleted]
   if project_names:
     raise BadArgsError(
       'No such Project "%s". Choices: %s'
@@ -407,12 +433,10 @@ def _LookupFolder(state, argument):
   except state_module.InvalidPathError as e:
     raise BadArgsError(e)
   containr = state.GetContainerFromPath(dirname)
-  folder_names = []
-  for item in containr.items:
+  for item in containr.ItemsNamed(basename):
     if isinstance(item, folder.Folder):
-      folder_names.append(item.name)
-      if item.name == basename:
-        return item
+      return item
+  folder_names = [item.name for item in containr.items if isinstance(item, folder.Folder)]
   if folder_names:
     raise NoSuchContainerError(
       'No such Folder "%s". Choices: %s'
@@ -633,6 +657,25 @@ class UICmdChclock(UICmd):
       time.time = AbsoluteNewTime
 
 
+_QUERY_SYNTAX_HELP = (
+  'Terms: text, "a phrase", /regex/, @context, +project, is:done, is:complete, is:deleted, is:active, '
+  'needs:review, ctime>2020-01-31 (also <, >=, <=, mtime, dtime), and -TERM to negate')
+
+_QUERY_FLAG_HELP = 'Shows only the Actions matching this query, and the Folders and Projects containing them. ' + _QUERY_SYNTAX_HELP
+
+
+def _QueryFilter(state, base):
+  """Returns a ViewFilter narrowing base to the Actions matching FLAGS.query.
+
+  Raises:
+    BadArgsError
+  """
+  try:
+    return state.QueryFilter(query=FLAGS.query, base=base)
+  except query.QuerySyntaxError as e:
+    raise BadArgsError(e)
+
+
 class UICmdLs(UICmd):
   """Lists immediate contents of the current working Folder/Project (see "help pwd").
 
@@ -663,6 +706,7 @@ class UICmdLs(UICmd):
                       'view"), override it and use this view filter. Note: '
                       'this is ignored in --show_all mode',
                       short_name='v', flag_values=flag_values)
+    flags.DEFINE_string('query', None, _QUERY_FLAG_HELP, short_name='q', flag_values=flag_values)
 
   def Run(self, args):  # pylint: disable=missing-docstring,no-self-use
     state = FLAGS.pyatdl_internal_state
@@ -670,6 +714,8 @@ class UICmdLs(UICmd):
     if FLAGS.view_filter:
       override = state.NewViewFilter(
         filter_cls=view_filter.CLS_BY_UI_NAME[FLAGS.view_filter])
+    if FLAGS.query:
+      override = _QueryFilter(state, override if override is not None else state.ViewFilter())
 
     def DoIt(obj, location):  # pylint: disable=missing-docstring
       _PerformLs(obj, location, state,
@@ -707,28 +753,15 @@ def _FindParentOf(state, obj):
   Returns:
     Container
   """
-  item = None
   if isinstance(obj, ctx.Ctx):
     return state.ToDoList().root
-  for (c, path) in state.ToDoList().ContainersPreorder():
-    if c.uid == obj.uid:
-      if path:
-        item = path[0]
-      else:
-        item = state.ToDoList().root
-      break
-    for subitem in c.items:
-      if subitem.uid == obj.uid:
-        item = c
-        break
-    if item is not None:
-      break
-  else:
+  item = state.ToDoList().ObjectByUID(obj.uid)
+  if item is None or isinstance(item, ctx.Ctx):
     raise AssertionError(
       'Cannot happen.  %s %s %s'
       % (state.CurrentWorkingContainer().name, str(state.ToDoList().root),
          obj.uid))
-  return item
+  return item.parent if item.parent is not None else state.ToDoList().root
 
 
 def _PerformLs(current_obj, location, state, recursive, show_uid, show_all,  # pylint: disable=too-many-arguments
@@ -743,7 +776,7 @@ def _PerformLs(current_obj, location, state, recursive, show_uid, show_all,  # p
     show_uid: bool
     show_all: bool
     show_timestamps: bool
-    view_filter_override: None|ViewFilter
+    view_filter_override: None|ViewFilter|view_filter.Evaluation
   """
   if show_all and isinstance(current_obj, container.Container):
     state.Print(_ListingForOneItem(
@@ -769,8 +802,11 @@ def _PerformLs(current_obj, location, state, recursive, show_uid, show_all,  # p
     items.sort(key=lambda x: '' if x.uid == 1 else x.name)
   items.sort(key=lambda x: 0 if isinstance(x, folder.Folder) or x.uid == 1 else 1)
   to_recurse = []
+  the_view_filter = view_filter_override if view_filter_override is not None else state.ViewFilter()
+  if recursive and not show_all and not isinstance(the_view_filter, view_filter.Evaluation):
+    # We will ask about every descendant, so decide about them all at once:
+    the_view_filter = the_view_filter.Evaluate(state.ToDoList())
   for item in items:
-    the_view_filter = view_filter_override if view_filter_override is not None else state.ViewFilter()
     if show_all or the_view_filter.Show(item):
       q = _ListingForOneItem(show_uid, show_timestamps, item, state.ToDoList())
       state.Print(q)
@@ -789,7 +825,7 @@ def _PerformLs(current_obj, location, state, recursive, show_uid, show_all,  # p
                % (loc if loc != FLAGS.pyatdl_separator else '',
                   FLAGS.pyatdl_separator, obj.name),
                state, recursive, show_uid, show_all, show_timestamps,
-               view_filter_override)
+               the_view_filter)
 
 
 class UICmdLsctx(UICmd):
@@ -811,6 +847,13 @@ class UICmdLsctx(UICmd):
   def Run(self, args):  # pylint: disable=missing-docstring,no-self-use
     state = FLAGS.pyatdl_internal_state
     to_be_json = []
+    if FLAGS.json:
+      columns = state.ToDoList().ActionColumns()
+      shown = state.ViewFilter().ActionMask(columns)
+
+      def NumShownActions(ctx_uid):
+        return columns.Count(shown & columns.InContext(ctx_uid))
+
     if len(args) == 2:
       context = _LookupContext(state, args[-1])
       if context is None:
@@ -819,8 +862,7 @@ class UICmdLsctx(UICmd):
         to_be_json = _JsonForOneItem(  # pylint: disable=redefined-variable-type
           context,
           state.ToDoList(),
-          sum(1 for a, _ in state.ToDoList().ActionsInContext(context.uid)
-              if state.ViewFilter().ShowAction(a)))
+          NumShownActions(context.uid))
       else:
         state.Print(
             _ListingForContext(FLAGS.pyatdl_show_uid, FLAGS.show_timestamps, context))
@@ -832,8 +874,7 @@ class UICmdLsctx(UICmd):
         to_be_json.append(_JsonForOneItem(
           None,
           state.ToDoList(),
-          sum(1 for a, _ in state.ToDoList().ActionsInContext(None)
-              if state.ViewFilter().ShowAction(a))))
+          NumShownActions(None)))
       else:
         state.Print(
             _ListingForContext(FLAGS.pyatdl_show_uid, FLAGS.show_timestamps, None))
@@ -846,8 +887,7 @@ class UICmdLsctx(UICmd):
             to_be_json.append(_JsonForOneItem(
               c,
               state.ToDoList(),
-              sum(1 for a, _ in state.ToDoList().ActionsInContext(c.uid)
-                  if state.ViewFilter().ShowAction(a))))
+              NumShownActions(c.uid)))
           else:
             state.Print(
                 _ListingForContext(FLAGS.pyatdl_show_uid, FLAGS.show_timestamps, c))
@@ -874,7 +914,7 @@ class UICmdLsprj(UICmd):
       to_be_json = _JsonForOneItem(
         the_project,
         state.ToDoList(),
-        sum(1 for a in the_project.items if state.ViewFilter().ShowAction(a)))
+        state.ViewFilter().CountShownActions(the_project))
       to_be_json['max_seconds_before_review'] = the_project.max_seconds_before_review
       if parent_container is None:
         # /inbox is weird:
@@ -917,7 +957,7 @@ class UICmdLsprj(UICmd):
             to_be_json.append(_JsonForOneItem(
                 project,
                 state.ToDoList(),
-                sum(1 for a in project.items if state.ViewFilter().ShowAction(a)),
+                state.ViewFilter().CountShownActions(project),
                 path_leaf_first=path_leaf_first))
           else:
             state.Print(_ProjectString(project, path_leaf_first))
@@ -1114,9 +1154,11 @@ class UICmdAsTaskPaper(UICmd):  # astaskpaper a.k.a. txt
     state = FLAGS.pyatdl_internal_state
     self.RaiseIfAnyArgumentsGiven(args)
     lines = []
+    evaluation = state.ViewFilter().Evaluate(state.ToDoList())
     state.ToDoList().AsTaskPaper(lines,
-                                 show_project=state.ViewFilter().ShowProject,
-                                 show_action=state.ViewFilter().ShowAction)
+                                 show_project=evaluation.ShowProject,
+                                 show_action=evaluation.ShowAction,
+                                 cache_key='all notes')
     for i, line in enumerate(lines):
       if i != 0 or line:  # skips blank first line
         state.Print(line)
@@ -1127,60 +1169,63 @@ class UICmdHypertext(UICmd):
   def __init__(self, name, flag_values, **kargs):
     super().__init__(name, flag_values, **kargs)
     flags.DEFINE_string('search_query', None,
-                        'Search query, case-insensitive',
+                        'Search query, case-insensitive. A query that does not parse matches as one phrase. '
+                        + _QUERY_SYNTAX_HELP,
                         short_name='q', flag_values=flag_values)
 
   def Run(self, args):  # pylint: disable=missing-docstring,no-self-use
-    lines = []
-
-    def DoIt(*, show_active, show_done):
-      the_view_filter = state.ViewFilter()
-      if FLAGS.search_query:
-        the_view_filter = state.SearchFilter(
-          query=FLAGS.search_query, show_active=show_active, show_done=show_done)
-
-      def ShowProject(p):
-        if not the_view_filter.ShowProject(p):
-          return False
-        if FLAGS.search_query:
-          return True
-        if bool(p.is_active) is not bool(show_active):
-          return False
-        if bool(p.is_complete or p.is_deleted) is not bool(show_done):
-          return False
-        return True
-
-      def ShowNote(n):
-        if not FLAGS.search_query:
-          return True
-        if not n:
-          return False
-        return FLAGS.search_query.lower() in n.lower()
-
-      state.ToDoList().AsTaskPaper(lines,
-                                   show_project=ShowProject,
-                                   show_action=the_view_filter.ShowAction,
-                                   show_note=ShowNote,
-                                   hypertext_prefix=args[-1],
-                                   html_escaper=state.HTMLEscaper())
-
     state = FLAGS.pyatdl_internal_state
     self.RaiseUnlessNArgumentsGiven(1, args)
+    todolist = state.ToDoList()
+    headers = {
+      (True, False): 'Active and not yet done items:',
+      (False, False): 'Inactive and not yet done items:',
+      (True, True): 'Active, already done items:',
+      (False, True): 'Inactive, already done items:',
+    }
+    sections = {quadrant: [] for quadrant in headers}  # (is active, is done) => lines
+    if FLAGS.search_query:
+      compiled_query = query.CompileOrLiteral(FLAGS.search_query)
+      columns = todolist.ActionColumns()
+      show_action = columns.Predicate(compiled_query.Mask(columns, checksum=todolist.ChecksumIfUnmodified()))
+      inactive_ctx_uids = frozenset(c.uid for c in todolist.ctx_list.items if not c.is_active)
+
+      def SearchPartition(project, an_action):
+        if an_action is None:
+          if not compiled_query.MatchesText(project):
+            return None
+          return (bool(project.is_active), bool(project.IsDone()))
+        return (an_action.ctx_uid not in inactive_ctx_uids, bool(an_action.IsDone()))
 
-    def Header(s):
-      lines.append(f'<h2>{s}</h2>')
-
-    Header('Active and not yet done items:')
-    DoIt(show_active=True, show_done=False)
-    Header('Inactive and not yet done items:')
-    DoIt(show_active=False, show_done=False)
-    Header('Active, already done items:')
-    DoIt(show_active=True, show_done=True)
-    Header('Inactive, already done items:')
-    DoIt(show_active=False, show_done=True)
-    for i, line in enumerate(lines):
-      if i != 0 or line:  # skips blank first line
-        state.Print('%s<br>' % line)
+      def ShowNote(n):
+        return bool(n) and compiled_query.Highlights(n)
+
+      todolist.AsTaskPaper(sections,
+                           show_action=show_action,
+                           show_note=ShowNote,
+                           hypertext_prefix=args[-1],
+                           html_escaper=state.HTMLEscaper(),
+                           partition=SearchPartition,
+                           cache_key=('notes matching', FLAGS.search_query))
+    else:
+      the_view_filter = state.ViewFilter().Evaluate(todolist)
+
+      def Partition(project, unused_action):
+        return (bool(project.is_active), bool(project.is_complete or project.is_deleted))
+
+      todolist.AsTaskPaper(sections,
+                           show_project=the_view_filter.ShowProject,
+                           show_action=the_view_filter.ShowAction,
+                           hypertext_prefix=args[-1],
+                           html_escaper=state.HTMLEscaper(),
+                           partition=Partition,
+                           cache_key='all notes')
+    lines = []
+    for quadrant, header in headers.items():
+      lines.append(f'<h2>{header}</h2>')
+      lines.extend(sections[quadrant])
+    for line in lines:
+      state.Print('%s<br>' % line)
 
 
 class UICmdDumpprotobuf(UICmd):
@@ -1318,7 +1363,7 @@ def _PerformComplete(state, item_name, mark_complete, force):
       for a in c.items:
         if isinstance(a, action.Action):
           a.is_complete = False
-  if mark_complete and isinstance(item, container.Container):
+  if mark_complete and isinstance(item, container.Container) and (force or item.Aggregates().incomplete_actions):
     for c, unused_path in item.ContainersPreorder():
       for a in c.items:
         if isinstance(a, action.Action) and not a.is_complete:
@@ -1410,6 +1455,7 @@ class UICmdTodo(UICmd):
     flags.DEFINE_enum('view_filter', None, sorted(view_filter.CLS_BY_UI_NAME),
                       'View filter',
                       short_name='v', flag_values=flag_values)
+    flags.DEFINE_string('query', None, _QUERY_FLAG_HELP, short_name='q', flag_values=flag_values)
 
   def Run(self, args):  # pylint: disable=missing-docstring,no-self-use
     state = FLAGS.pyatdl_internal_state
@@ -1428,9 +1474,14 @@ class UICmdTodo(UICmd):
     _SetViewFilterByName(filter_name, state)
     try:
       lines = []
+      the_view_filter = state.ViewFilter()
+      if FLAGS.query:
+        the_view_filter = _QueryFilter(state, the_view_filter)
+      evaluation = the_view_filter.Evaluate(state.ToDoList())
       state.ToDoList().AsTaskPaper(lines,
-                                   show_project=state.ViewFilter().ShowProject,
-                                   show_action=state.ViewFilter().ShowAction)
+                                   show_project=evaluation.ShowProject,
+                                   show_action=evaluation.ShowAction,
+                                   cache_key='all notes')
       for i, line in enumerate(lines):
         if i != 0 or line:  # skips blank first line
           state.Print(line)
@@ -1877,8 +1928,9 @@ class UICmdAlmostPurgeAllActionsInContext(UICmd):
         raise BadArgsError(e)
     if ctx_uid is None:
       raise BadArgsError(errmsg)
-    for a, p in state.ToDoList().ActionsInContext(ctx_uid):
-      a.AlmostPurge()
+    todolist = state.ToDoList()
+    for a, unused_project in list(todolist.ActionsInContext(ctx_uid)):
+      todolist.AlmostPurge(a)
 
 
 def _PerformActivatectx(state, ctx_name, is_active):
@@ -2163,7 +2215,7 @@ class UICmdMv(UICmd):
     else:
       raise BadArgsError('First argument must be an Action, Project, or Folder')
     _Reparent(old_item, new_item, state.ToDoList())
-    state.ToDoList().CheckIsWellFormed()
+    state.ToDoList().CheckChangesAreWellFormed()
 
 
 class UICmdRename(UICmd):
@@ -2199,7 +2251,7 @@ class UICmdRename(UICmd):
       except auditable_object.IllegalNameError as e:
         raise BadArgsError('Bad syntax for right-hand side: %s' % str(e))
       try:
-        state.ToDoList().CheckIsWellFormed()
+        state.ToDoList().CheckChangesAreWellFormed()
       except AssertionError:
         item.name = old
         raise BadArgsError('The new name, "%s", is not well-formed.' % new)
@@ -2269,7 +2321,7 @@ class UICmdRenamectx(UICmd):
         % (old, ' '.join(i.name for i in state.ToDoList().ctx_list.items)))
     c.name = new
     try:
-      state.ToDoList().CheckIsWellFormed()
+      state.ToDoList().CheckChangesAreWellFormed()
     except AssertionError:
       c.name = old
       raise BadArgsError(
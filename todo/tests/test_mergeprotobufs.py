@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 import base64
 import random
 import time
+import zlib
 
 import pytest
 
@@ -108,13 +109,17 @@ root {
 """.lstrip()
         return pb
 
-    def _cksum(self, pb=None):
+    def _cksum(self, pb=None, algorithm=None):
         if pb is None:
             pb = self._existing_todolist_protobuf()
         cksum = pyatdl_pb2.ChecksumAndData()
         cksum.payload = pb.SerializeToString()
         cksum.payload_length = len(cksum.payload)
-        cksum.sha1_checksum = serialization.Sha1Checksum(cksum.payload)
+        if algorithm is None:
+            cksum.sha1_checksum = serialization.Sha1Checksum(cksum.payload)
+        else:
+            cksum.checksum_algorithm = algorithm
+            cksum.sha1_checksum = serialization.Checksum(cksum.payload, algorithm)
         return cksum
 
     def _encrypted_contents_of_known_existing_protobuf(self):
@@ -250,6 +255,80 @@ root {
                                     b'\xd5\x02\x10\xff\xff\xff\xff\xff\xff\xff\xff\xff\x01\x18\x80\x80'
                                     b'\xa7\xb9\xdf\x87\xd5\x02 \x02y\xde\xc0\xfe\xca\xce\xfa\xed\xfe')
 
+    def test_post_in_sync_returns_204(self):
+        self._populate_todolist()
+        req = pyatdl_pb2.MergeToDoListRequest()
+        req.sanity_check = views.MERGETODOLISTREQUEST_SANITY_CHECK
+        req.latest.CopyFrom(self._cksum())
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 204
+
+    def test_compressed_latest_returns_409(self):
+        self._populate_todolist()
+        req = pyatdl_pb2.MergeToDoListRequest()
+        req.sanity_check = views.MERGETODOLISTREQUEST_SANITY_CHECK
+        req.latest.CopyFrom(self._cksum())
+        req.latest.codec = pyatdl_pb2.ZLIB_WITH_DICTIONARY_1
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 409
+        assert b'req.latest.codec is not UNCOMPRESSED' in response.content
+
+    def test_old_compressed_row_is_backfilled(self):
+        self._populate_todolist()
+        old_row = self._cksum()
+        uncompressed_sha1 = old_row.sha1_checksum
+        old_row.payload_is_zlib_compressed = True
+        old_row.payload = zlib.compress(old_row.payload)
+        old_row.payload_length = len(old_row.payload)
+        old_row.sha1_checksum = serialization.Sha1Checksum(old_row.payload)
+        self.tdl_model.encrypted_contents2 = views._encrypted_todolist_protobuf(old_row.SerializeToString())
+        self.tdl_model.save()
+        assert serialization.UncompressedChecksum(old_row.SerializeToString(), 'old row', pyatdl_pb2.SHA1) is None
+        req = pyatdl_pb2.MergeToDoListRequest()
+        req.sanity_check = views.MERGETODOLISTREQUEST_SANITY_CHECK
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 200
+        assert pyatdl_pb2.MergeToDoListResponse.FromString(response.content).sha1_checksum == uncompressed_sha1
+        backfilled = views.SerializationReader(self.user).read()
+        assert serialization.UncompressedChecksum(backfilled, 'backfilled row', pyatdl_pb2.SHA1) == uncompressed_sha1
+        req.latest.CopyFrom(self._cksum())
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 204
+
+    def test_blake2b_client(self):
+        self._populate_todolist()  # saved with SHA1
+        req = pyatdl_pb2.MergeToDoListRequest()
+        req.sanity_check = views.MERGETODOLISTREQUEST_SANITY_CHECK
+        req.checksum_algorithm = pyatdl_pb2.BLAKE2B_160
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 200
+        pbresp = pyatdl_pb2.MergeToDoListResponse.FromString(response.content)
+        assert pbresp.checksum_algorithm == pyatdl_pb2.BLAKE2B_160
+        assert pbresp.sha1_checksum == self._cksum(algorithm=pyatdl_pb2.BLAKE2B_160).sha1_checksum
+
+        pb = self._existing_todolist_protobuf()
+        a = pb.inbox.actions.add()
+        a.common.metadata.name = "testing10013"
+        a.common.uid = 373737
+        self._fill_in_timestamps(a)
+        req.previous_sha1_checksum = pbresp.sha1_checksum
+        req.latest.CopyFrom(self._cksum(pb))
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 422
+        assert response.content == b'{"error": "latest.checksum_algorithm must equal checksum_algorithm"}'
+
+        req.latest.CopyFrom(self._cksum(pb, algorithm=pyatdl_pb2.BLAKE2B_160))
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 200
+        pbresp = pyatdl_pb2.MergeToDoListResponse.FromString(response.content)
+        assert pbresp.sha1_checksum == req.latest.sha1_checksum
+        row = views.SerializationReader(self.user).read()
+        assert serialization.UncompressedChecksum(row, 'row', pyatdl_pb2.BLAKE2B_160) == req.latest.sha1_checksum
+
+        req.ClearField('previous_sha1_checksum')
+        response = self._happy_post(req.SerializeToString())
+        assert response.status_code == 204
+
     def test_ill_formed_input(self):
         self._populate_todolist()
         req = pyatdl_pb2.MergeToDoListRequest()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.test.client import Client
+from todo import views
+
+
+@pytest.mark.django_db
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class Search(TestCase):
+    def setUp(self):
+        self.username = 'foo'
+        self.password = 'password'
+        self.user = User.objects.create_user(self.username, 'foo@example.com', self.password)
+        self.client = Client()
+        assert self.client.login(username=self.username, password=self.password)
+        views._apply_batch_of_commands(
+            self.user, ["do 'buy a 12\" ruler'", "do 'buy milk'"], read_only=False)
+
+    def _search(self, q):
+        response = self.client.get('/todo/search', {'q': q})
+        assert response.status_code == 200
+        assert response.context['Title'] == 'Search', response.content
+        return response.context['Hypertext']
+
+    def test_query(self):
+        hypertext = self._search('buy -milk')
+        assert 'ruler' in hypertext
+        assert 'milk' not in hypertext
+
+    def test_query_that_does_not_parse_is_a_phrase(self):
+        hypertext = self._search('12" ruler')
+        assert 'ruler' in hypertext
+        assert 'milk' not in hypertext
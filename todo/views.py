@@ -70,6 +70,8 @@ FLAGS.pyatdl_show_uid = True
 FLAGS.database_filename = None
 FLAGS.seed_upon_creation = True
 FLAGS.no_context_display_string = 'Actions Without Context'
+# Every page load deserializes the to-do list; the renderings that 'paranoid' adds cost more than they catch:
+FLAGS.pyatdl_verification_level = 'standard'
 
 _COOKIE_NAME = 'VISITOR_INFO0'
 _SANITY_CHECK = 37
@@ -472,7 +474,7 @@ def _apply_batch_of_commands(user, batch, read_only, saved_read=None, cookie=Non
       user,
       place_to_save_read)
     result_dict = immaculater.ApplyBatchOfCommands(
-      wrapper, Print, reader, writer, html_escaper=escape)
+      wrapper, Print, reader, writer, html_escaper=escape, lazy=read_only)
   finally:
     wrapper.close()
   return {'pwd': result_dict['cwc'],
@@ -1535,8 +1537,8 @@ def create_jwt(request):
   return JsonResponse({"token": token}, status=201)
 
 
-def _is_valid_sha1_checksum(s):
-  return re.match(r'^[0-9a-f]{40}$', s)
+def _is_valid_checksum(s, algorithm):
+  return re.match(r'^[0-9a-f]{%d}$' % serialization.ChecksumHexLength(algorithm), s)
 
 
 def _parse_mergeprotobufs_request(request):
@@ -1578,11 +1580,20 @@ def _parse_mergeprotobufs_request(request):
         "error": "req.latest.payload_is_zlib_compressed is true which is unsupported because we have HTTP compression available to us."
       },
       status=409)
+  if req.latest.codec != pyatdl_pb2.UNCOMPRESSED:
+    return None, JsonResponse(
+      {
+        "error": "req.latest.codec is not UNCOMPRESSED which is unsupported because we have HTTP compression available to us."
+      },
+      status=409)
+  if req.HasField('latest') and req.latest.checksum_algorithm != req.checksum_algorithm:
+    return None, JsonResponse({"error": "latest.checksum_algorithm must equal checksum_algorithm"},
+                              status=422)
   sha1_format_error = "is the wrong length or not hexadecimal"
-  if req.previous_sha1_checksum and not _is_valid_sha1_checksum(req.previous_sha1_checksum):
+  if req.previous_sha1_checksum and not _is_valid_checksum(req.previous_sha1_checksum, req.checksum_algorithm):
     return None, JsonResponse({"error": "previous_sha1 %s" % sha1_format_error},
                               status=422)
-  if req.latest.sha1_checksum and not _is_valid_sha1_checksum(req.latest.sha1_checksum):
+  if req.latest.sha1_checksum and not _is_valid_checksum(req.latest.sha1_checksum, req.checksum_algorithm):
     return None, JsonResponse({"error": "latest.sha1_checksum %s" % sha1_format_error},
                               status=422)
   if req.latest.payload and not req.latest.sha1_checksum:
@@ -1602,11 +1613,12 @@ def _parse_mergeprotobufs_request(request):
         },
         status=422)
     # TODO(chandler37): verify req.latest.sha1_checksum optionally to save a few CPU cycles?
-    real_sum = serialization.Sha1Checksum(req.latest.payload)
+    real_sum = serialization.Checksum(req.latest.payload, req.checksum_algorithm)
     if real_sum != req.latest.sha1_checksum:
       return None, JsonResponse(
         {
-          "error": "SHA1(latest.payload)=%s mismatches with latest.sha1_checksum=%s" % (real_sum, req.latest.sha1_checksum)
+          "error": "%s(latest.payload)=%s mismatches with latest.sha1_checksum=%s" % (
+            pyatdl_pb2.ChecksumAlgorithm.Name(req.checksum_algorithm), real_sum, req.latest.sha1_checksum)
         },
         status=422)
   return req, None
@@ -1620,18 +1632,32 @@ def _write_database(user, some_bytes, sha1_checksum):
   SerializationWriter('write', user, None).write(some_bytes)
 
 
-def _read_database(user, sha1_checksum):
-  """Returns {"tdl":None|tdl.ToDoList, "sha1":None|str, "they_have_the_latest":bool}; raises serialization.DeserializationError"""
+def _read_database(user, sha1_checksum, checksum_algorithm):
+  """Returns {"tdl":None|tdl.ToDoList, "sha1":None|str, "they_have_the_latest":bool}; raises serialization.DeserializationError
+
+  sha1_checksum and "sha1" are checksums by checksum_algorithm, a pyatdl_pb2.ChecksumAlgorithm. If
+  they_have_the_latest, we skip deserialization and "tdl" is None.
+  """
   # TODO(chandler37): After making the "huge performance optimization" in
-  # _write_database, change this function too. Stop reading the ToDoList data
-  # from the database if sha1_checksum is present and matches the database.
-  reader = SerializationReader(user)
+  # _write_database, change this function too. We still read and decrypt the
+  # whole row just to learn that sha1_checksum matches the database.
+  file_contents = SerializationReader(user).read()
+  if file_contents and sha1_checksum:
+    # ChecksumAndData knows the checksum of the pyatdl.ToDoList inside it, so we need not decompress it:
+    if serialization.UncompressedChecksum(file_contents, 'DB entity for %s' % user.email,
+                                          checksum_algorithm) == sha1_checksum:
+      return {"tdl": None, "sha1": sha1_checksum, "they_have_the_latest": True}
   sha1_checksum_list = []
+  backfilled_list = []
   a_tdl = serialization.DeserializeToDoList2(
-      reader,
+      SavedSerializationReader(file_contents),
       tdl_factory=None,
-      sha1_checksum_list=sha1_checksum_list)
+      sha1_checksum_list=sha1_checksum_list,
+      backfilled_list=backfilled_list,
+      checksum_algorithm=checksum_algorithm)
   assert len(sha1_checksum_list) <= 1, sha1_checksum_list
+  if backfilled_list:  # an old row lacking ChecksumAndData.uncompressed_sha1_checksum
+    SerializationWriter('write', user, None).write(backfilled_list[0])
   result = {
     "tdl": a_tdl,
     "sha1": sha1_checksum_list[0] if sha1_checksum_list else None,
@@ -1689,14 +1715,12 @@ def mergeprotobufs(request):
   TODO(chandler37): check length too and even check byte by byte in paranoid
   mode.
 
-  TODO(chandler37): talk about SHA1's brokenness -- soon it won't be that
-  expensive to construct artificial collisions (even with the same length, I
-  assume). Then explain how our threat model means that we don't care (because
-  only you, authenticated by username and password or a JWT that came from
-  username and password, can modify your data). Since we don't care, we should
-  be using something faster.  TODO(chandler37): Use a cheaper hash/PRF
-  e.g. SipHash or HighwayHash (https://arxiv.org/abs/1612.06257) or crc32 or
-  md5 or ...
+  SHA1's brokenness does not worry us because only you, authenticated by
+  username and password or a JWT that came from username and password, can
+  modify your data. If SHA1 is slow on your platform, set
+  MergeToDoListRequest.checksum_algorithm to BLAKE2B_160 (just as long) or
+  BLAKE2B_256. Every checksum in your request must use it, and so will every
+  checksum in our response. Older clients that do not set it get SHA1.
 
   Imagine you write a Flutter smartphone app. Flutter uses Dart. Dart has
   protocol messages a.k.a. protocol buffers a.k.a. protobufs. See here:
@@ -1784,13 +1808,13 @@ def mergeprotobufs(request):
     return error_response
 
   if pbreq.HasField('latest'):
-    actual_cksum = serialization.Sha1Checksum(pbreq.latest.payload)
+    actual_cksum = serialization.Checksum(pbreq.latest.payload, pbreq.checksum_algorithm)
     if actual_cksum != pbreq.latest.sha1_checksum:
       return JsonResponse({"error": f"request.latest.sha1_checksum={pbreq.latest.sha1_checksum} mismatches with {actual_cksum}"},
                           status=422)
 
   try:
-    read_result = _read_database(user, pbreq.latest.sha1_checksum)
+    read_result = _read_database(user, pbreq.latest.sha1_checksum, pbreq.checksum_algorithm)
   except serialization.DeserializationError:
     return JsonResponse(
         {"error": "Cannot read existing to-do list from the database!"},
@@ -1810,6 +1834,8 @@ def mergeprotobufs(request):
 
   pbresponse = pyatdl_pb2.MergeToDoListResponse()
   pbresponse.sanity_check = 18369614221190021342
+  if pbreq.HasField('checksum_algorithm'):  # else an older client ignorant of the field
+    pbresponse.checksum_algorithm = pbreq.checksum_algorithm
 
   def protobuf_response():
     serialized_result = pbresponse.SerializeToString()
@@ -1822,19 +1848,22 @@ def mergeprotobufs(request):
     return hr
 
   def write_db(bytes_of_pyatdl_todolist):
-    """Returns sha1_checksum of (uncompressed) pyatdl.ToDoList. Raises ReserializationError."""
+    """Returns the checksum, by pbreq.checksum_algorithm, of (uncompressed) pyatdl.ToDoList. Raises ReserializationError."""
     # First, make sure it's valid input and not so large that we run out of memory (MemoryError).
     # NOTE: exception_middleware deals with any pyatdllib.core.errors.DataError gracefully. This is *not* dead code:
     uid.ResetNotesOfExistingUIDs(raise_data_error_upon_next_uid=True)  # let the error propagate
     deserialized_tdl = tdl.ToDoList.DeserializedProtobuf(bytes_of_pyatdl_todolist)
-    deserialized_tdl.CheckIsWellFormed()
+    deserialized_tdl.CheckChangesAreWellFormed()
     deserialized_tdl.AsProto().SerializeToString()
 
     # No exception was raised, so let's proceed:
-    cksum = serialization.Sha1Checksum(bytes_of_pyatdl_todolist)
+    cksum = serialization.Checksum(bytes_of_pyatdl_todolist, pbreq.checksum_algorithm)
+    # We save with the client's algorithm so that its next sync can compare checksums without decompressing:
     _write_database(
       user,
-      serialization.SerializedWithChecksum(bytes_of_pyatdl_todolist),
+      serialization.SerializedWithChecksum(bytes_of_pyatdl_todolist, uncompressed_checksum=cksum,
+                                           nesting_depth=deserialized_tdl.ProtobufNestingDepth(),
+                                           algorithm=pbreq.checksum_algorithm),
       cksum)
     return cksum
 
@@ -1860,12 +1889,12 @@ def mergeprotobufs(request):
         status=409)
     assert not pbreq.new_data
     new_tdl = uicmd.NewToDoList()
-    new_tdl.CheckIsWellFormed()
+    new_tdl.CheckChangesAreWellFormed()
     pbresponse.starter_template = True
     serialized_tdl = new_tdl.AsProto(pb=pbresponse.to_do_list).SerializeToString()  # AsProto returns its argument
     uid.ResetNotesOfExistingUIDs(raise_data_error_upon_next_uid=True)
     deserialized_tdl = tdl.ToDoList.DeserializedProtobuf(serialized_tdl)
-    deserialized_tdl.CheckIsWellFormed()
+    deserialized_tdl.CheckChangesAreWellFormed()
     reserialized_tdl = deserialized_tdl.AsProto().SerializeToString()
     if serialized_tdl != reserialized_tdl:
       raise AssertionError(
@@ -1915,15 +1944,15 @@ The server needs to merge, but you set abort_if_merge_is_required to true, so we
     # TODO(chandler37): run code coverage for mergeprotobufs.
     merged_tdl_pb = Merge(read_result["tdl"], deserialized_latest)
     pbresponse.sha1_checksum = write_db(merged_tdl_pb.SerializeToString())
-    assert pbresponse.sha1_checksum and len(pbresponse.sha1_checksum) == 40, f'pbresponse.sha1_checksum={pbresponse.sha1_checksum}'
-    assert len(pbresponse.sha1_checksum) == 40, pbresponse.sha1_checksum
+    assert pbresponse.sha1_checksum and _is_valid_checksum(pbresponse.sha1_checksum, pbreq.checksum_algorithm), (
+      f'pbresponse.sha1_checksum={pbresponse.sha1_checksum}')
     # TODO(chandler37): DLC:
     #   if checksums match, then we must preserve their version of the checksum because we don't serialize the same
     #   necessarily across Dart (or some other hypothetical, future langauge) and python. Also, we should say
     #   'pbresponse.to_do_list.CopyFrom(merged_tdl_pb)' only if it differs.
     pbresponse.to_do_list.CopyFrom(merged_tdl_pb)
     return protobuf_response()
-  assert len(read_result["sha1"]) == 40, read_result["sha1"]
+  assert _is_valid_checksum(read_result["sha1"], pbreq.checksum_algorithm), read_result["sha1"]
   pbresponse.sha1_checksum = read_result["sha1"]
   read_result["tdl"].AsProto(pb=pbresponse.to_do_list)
   return protobuf_response()